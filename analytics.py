@@ -0,0 +1,226 @@
+import re
+import time
+
+try:
+    import numpy
+except ImportError:  # optional: the analytics endpoints answer 501 without it
+    numpy = None
+
+
+# Ways of grouping songs, each with the query giving one (song row, group
+# key) pair per membership; a song has one album, category and year but
+# any number of tags. Song rows are positions in song_id order.
+DIMENSIONS = {
+    "album": "SELECT song_id, album_id FROM Musicas ORDER BY song_id",
+    "category": """
+        SELECT m.song_id, a.category FROM Musicas m LEFT JOIN Albuns a ON a.album_id = m.album_id
+        ORDER BY m.song_id
+    """,
+    "year": "SELECT song_id, CAST(substr(release_date, 1, 4) AS INTEGER) FROM Musicas ORDER BY song_id",
+    "tag": "SELECT song_id, tag_id FROM Descricoes ORDER BY song_id",
+}
+
+# Names shown for the group keys of a dimension (the key itself when absent)
+LABELS = {
+    "album": "SELECT album_id, album_title FROM Albuns",
+    "tag": "SELECT tag_id, tag FROM Tags",
+}
+
+SONGS_QUERY = "SELECT song_id, song_title, views FROM Musicas ORDER BY song_id"
+
+# Aggregates computed per group besides the 'p<N>' percentiles
+AGGREGATES = ("count", "sum", "mean", "min", "max", "median")
+
+# Aggregates whose values are whole numbers of views or songs
+WHOLE_AGGREGATES = ("count", "sum", "min", "max")
+
+# Percentiles of a view distribution when none are asked for
+DEFAULT_PERCENTILES = (0, 25, 50, 75, 100)
+
+# A percentile as written in a request: 0 to 100, in plain decimal notation
+_PERCENTILE = re.compile(r"(?:100(?:\.0*)?|\d{1,2}(?:\.\d*)?)")
+
+
+def available():
+    """
+    Tells whether NumPy is installed.
+    """
+    return numpy is not None
+
+
+def parse_percentile(text):
+    """
+    Returns the percentile written as 'text' (0 to 100, e.g. "95" or
+    "99.9"), or raises ValueError.
+    """
+    if not _PERCENTILE.fullmatch(text):
+        raise ValueError(f"Invalid percentile {text!r}: use a number from 0 to 100")
+    return float(text)
+
+
+def parse_aggregate(name):
+    """
+    Returns the percentile asked for by 'p<N>' (0 to 100), the name of
+    another aggregate as is, or raises ValueError.
+    """
+    if name in AGGREGATES:
+        return name
+    if name.startswith("p") and _PERCENTILE.fullmatch(name[1:]):
+        return float(name[1:])
+    raise ValueError(f"Unknown aggregate {name!r}: use {', '.join(AGGREGATES)} or p0 to p100")
+
+
+class Grouping:
+    """
+    The songs' views grouped along one dimension, sorted by group and then
+    by views, so every group is a contiguous run: group i holds
+    values[starts[i]:starts[i] + counts[i]].
+    """
+
+    def __init__(self, keys, labels, codes, views):
+        self.keys = keys
+        self.labels = labels
+        order = numpy.lexsort((views, codes))
+        self.values = views[order]
+        self.counts = numpy.bincount(codes, minlength=len(keys))
+        self.starts = numpy.concatenate(([0], numpy.cumsum(self.counts)[:-1]))
+        self.sums = numpy.bincount(codes, weights=views, minlength=len(keys))
+
+    def aggregate(self, name):
+        """
+        One value per group (NaN for empty groups) for an aggregate name
+        or a percentile.
+        """
+        if name == "count":
+            return self.counts.astype(float)
+        if name == "sum":
+            return self.sums
+        if name == "mean":
+            result = numpy.full(len(self.keys), numpy.nan)
+            numpy.divide(self.sums, self.counts, out=result, where=self.counts > 0)
+            return result
+        if name == "min":
+            name = 0.0
+        elif name == "max":
+            name = 100.0
+        elif name == "median":
+            name = 50.0
+        return self.percentile(name)
+
+    def percentile(self, percentile):
+        """
+        The 'percentile' of every group's views, interpolated linearly
+        between the closest ranks like numpy.percentile (NaN for empty
+        groups).
+        """
+        present = self.counts > 0
+        result = numpy.full(len(self.keys), numpy.nan)
+        rank = (self.counts[present] - 1) * (percentile / 100)
+        low = numpy.floor(rank).astype(numpy.int64)
+        high = numpy.ceil(rank).astype(numpy.int64)
+        starts = self.starts[present]
+        below, above = self.values[starts + low], self.values[starts + high]
+        result[present] = below + (above - below) * (rank - low)
+        return result
+
+
+class AnalyticsSnapshot:
+    """
+    Columnar copy of the song views and their groupings, for answering
+    group-by, top-N and percentile questions with vectorized NumPy
+    operations instead of SQL. Like the title index, the snapshot is
+    tagged with the database version it was built from.
+    """
+
+    def __init__(self, song_ids, titles, views, groupings, version=None, build_seconds=0.0):
+        self.version = version
+        self.build_seconds = build_seconds
+        self.song_ids = song_ids
+        self.titles = titles
+        self.views = views
+        self.groupings = groupings
+
+    @classmethod
+    def build(cls, db, version=None):
+        """
+        Reads the views of every song and the group keys of every
+        dimension from the database.
+        """
+        start = time.perf_counter()
+        rows = db.execute(SONGS_QUERY).fetchall()
+        song_ids = numpy.fromiter((row[0] for row in rows), numpy.int64, len(rows))
+        titles = [row[1] for row in rows]
+        views = numpy.fromiter((row[2] or 0 for row in rows), numpy.float64, len(rows))
+
+        groupings = {}
+        for dimension, query in DIMENSIONS.items():
+            pairs = db.execute(query).fetchall()
+            # Rows of the songs in each pair, skipping pairs whose song is gone
+            ids = numpy.fromiter((row[0] for row in pairs), numpy.int64, len(pairs))
+            members = numpy.searchsorted(song_ids, ids)
+            found = members < len(song_ids)
+            found[found] = song_ids[members[found]] == ids[found]
+            # Keys are numbered in sorted order, with missing ones (None) last
+            raw_keys = [row[1] for row in pairs]
+            keys = sorted(set(raw_keys), key=lambda key: (key is None, key if key is not None else 0))
+            numbers = {key: number for number, key in enumerate(keys)}
+            codes = numpy.fromiter((numbers[key] for key in raw_keys), numpy.int64, len(pairs))
+            names = dict(db.execute(LABELS[dimension])) if dimension in LABELS else {}
+            labels = [names.get(key, key) for key in keys]
+            groupings[dimension] = Grouping(keys, labels, codes[found], views[members[found]])
+        return cls(song_ids, titles, views, groupings, version, time.perf_counter() - start)
+
+    def group_by(self, dimension, aggregate="sum", limit=None):
+        """
+        Groups of a dimension with their song count and one aggregate of
+        their views, highest value first. Raises KeyError for an unknown
+        dimension and ValueError for an unknown aggregate.
+        """
+        grouping = self.groupings[dimension]
+        values = grouping.aggregate(parse_aggregate(aggregate))
+        convert = int if aggregate in WHOLE_AGGREGATES else float
+        present = numpy.flatnonzero(grouping.counts > 0)
+        # Stable sort on the negated value keeps ties in key order
+        ranked = present[numpy.argsort(-values[present], kind="stable")][:limit]
+        return [{"key": grouping.keys[i], "group": grouping.labels[i], "songs": songs, "value": convert(value)}
+                for i, songs, value in zip(ranked.tolist(), grouping.counts[ranked].tolist(),
+                                           values[ranked].tolist())]
+
+    def distribution(self, dimension, percentiles=DEFAULT_PERCENTILES, limit=None):
+        """
+        The view percentiles of every group of a dimension, in key order
+        (e.g. year by year). Raises KeyError for an unknown dimension.
+        """
+        grouping = self.groupings[dimension]
+        present = numpy.flatnonzero(grouping.counts > 0)[:limit]
+        columns = {f"p{percentile:g}": grouping.percentile(percentile)[present].tolist() for percentile in percentiles}
+        rows = [{"key": grouping.keys[i], "group": grouping.labels[i], "songs": songs}
+                for i, songs in zip(present.tolist(), grouping.counts[present].tolist())]
+        for name, column in columns.items():
+            for row, value in zip(rows, column):
+                row[name] = value
+        return rows
+
+    def top_songs(self, limit):
+        """
+        The 'limit' most viewed songs, most first.
+        """
+        limit = min(limit, len(self.views))
+        if limit <= 0:
+            return []
+        best = numpy.argpartition(-self.views, limit - 1)[:limit]
+        best = best[numpy.lexsort((self.song_ids[best], -self.views[best]))]
+        return [{"song_id": int(self.song_ids[i]), "song_title": self.titles[i], "views": int(self.views[i])}
+                for i in best]
+
+    def stats(self):
+        """
+        Size of the snapshot and how long it took to build.
+        """
+        return {
+            "songs": len(self.song_ids),
+            "bytes": int(self.views.nbytes + self.song_ids.nbytes
+                         + sum(g.values.nbytes + g.counts.nbytes + g.starts.nbytes + g.sums.nbytes
+                               for g in self.groupings.values())),
+            "build_seconds": round(self.build_seconds, 6),
+        }
@@ -0,0 +1,45 @@
+import hashlib
+import sqlite3
+
+import lyrics_index
+from pagination import Page
+
+
+API_PREFIX = "/api/v1"
+
+
+def to_json(value):
+    """
+    Converts the data behind a page into JSON-ready values. Pages become
+    {"items": [...], "next_cursor": ...}, rows become objects without the
+    internal sort-key columns, and lyric snippets are highlighted HTML.
+    """
+    if isinstance(value, Page):
+        return {"items": [to_json(row) for row in value.rows], "next_cursor": value.next_cursor}
+    if isinstance(value, sqlite3.Row):
+        row = {}
+        for column in value.keys():
+            if column.startswith("_key"):
+                continue
+            if column == "snippet":
+                row[column] = str(lyrics_index.highlight(value[column]))
+            else:
+                row[column] = value[column]
+        return row
+    if isinstance(value, dict):
+        # Lyrics search rows are dicts when the lyrics are compressed
+        return {name: str(lyrics_index.highlight(item)) if name == "snippet" else to_json(item)
+                for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return value
+
+
+def make_etag(data_version, path, args):
+    """
+    Builds a strong ETag for a response from the database version and the
+    exact request (path and every query argument, in order). The same
+    request against an unchanged database always gets the same tag.
+    """
+    request_key = (data_version, path, sorted(args.items(multi=True)))
+    return hashlib.sha256(repr(request_key).encode()).hexdigest()[:32]
@@ -1,646 +1,1405 @@
-from flask import Flask, g, request
-from flask import render_template_string
-import sqlite3
-
-
-# Configure Flask
-app = Flask(__name__)
-
-# Database configuration
-# Ensure 'dbfinal.db' is in the same folder as this script
-DATABASE = 'dbfinal.db'
-
-def connect_db():
-    """
-    Connects to the SQLite database.
-    """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def get_db():
-    """
-    Retrieves the database connection for the current request.
-    """
-    if 'db' not in g:
-        g.db = connect_db()
-    return g.db
-
-@app.teardown_appcontext
-def close_db(exception):
-    """
-    Closes the database connection when the request ends.
-    """
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
-
-@app.route("/")
-def main_page():
-    """
-    Home page with basic database statistics.
-    """
-    db = get_db()
-    stats = {
-        "albums": db.execute("SELECT COUNT(*) AS total FROM Albuns").fetchone()["total"],
-        "songs": db.execute("SELECT COUNT(*) AS total FROM Musicas").fetchone()["total"],
-        "n_produtores": db.execute("SELECT COUNT(*) FROM (SELECT DISTINCT producer_id FROM Produtores)").fetchone()[0],
-        "n_artistas": db.execute("SELECT COUNT(*) FROM (SELECT DISTINCT artist_id FROM Artistas)").fetchone()[0],
-        "n_escritores": db.execute("SELECT COUNT(*) FROM (SELECT DISTINCT writer_id FROM Escritores)").fetchone()[0],
-        "tags": db.execute("SELECT COUNT(*) FROM Tags").fetchone()[0],
-    }
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Statistics</title>
-            <style>
-                body {
-                    background-color: #FFD6CC; /* Light salmon background */
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Database Statistics</h1>
-            <ul class="list-group mt-3">
-                <li class="list-group-item">Albums: {{ stats['albums'] }}</li>
-                <li class="list-group-item">Songs: {{ stats['songs'] }}</li>
-                <li class="list-group-item">Producers: {{ stats['n_produtores'] }}</li>
-                <li class="list-group-item">Artists: {{ stats['n_artistas'] }}</li>
-                <li class="list-group-item">Writers: {{ stats['n_escritores'] }}</li>
-                <li class="list-group-item">Tags: {{ stats['tags'] }}</li>
-            </ul>
-            <a href="/albums" class="btn" style="background-color: #9370DB; color: white;">View Albums</a>
-            <a href="/songs" class="btn" style="background-color: #9370DB; color: white;">View Songs</a>
-            <a href="/search" class="btn" style="background-color: #9370DB; color: white;">Search Albums & Songs</a>
-            <a href="/person_search" class="btn" style="background-color: #9370DB; color: white;">Search People</a>
-            <a href="/lyrics_search" class="btn" style="background-color: #9370DB; color: white;">Search Lyrics</a>
-            <a href="/questions" class="btn" style="background-color: #9370DB; color: white;">Q&A</a>
-
-            <div class="mt-5 text-center">
-                <img src="{{ url_for('static', filename='taytay.jpg') }}" alt="Taytay Image" class="img-fluid">
-            </div>
-        </body>
-        </html>
-        """, stats=stats
-    )
-
-
-@app.route("/albums")
-def list_albums():
-    """
-    Lists all albums with links for more details, excluding "No Album" entries.
-    """
-    db = get_db()
-    albums = db.execute("""
-        SELECT album_title, album_url 
-        FROM Albuns 
-        WHERE album_title != "Sem Album"
-        ORDER BY album_title
-    """).fetchall()
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Albums</title>
-            <style>
-                body {
-                    background-color: #FFD6CC; 
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Albums</h1>
-            <ul class="list-group mt-3">
-                {% for album in albums %}
-                    <li class="list-group-item">
-                        <a href="{{ album['album_url'] }}" target="_blank">{{ album['album_title'] }}</a>
-                    </li>
-                {% endfor %}
-            </ul>
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-        </body>
-        </html>
-        """, albums=albums
-    )
-
-
-@app.route("/songs")
-def list_songs():
-    """
-    Lists all songs organized by date (ascending) with links for details.
-    """
-    db = get_db()
-    # Convert date to standard ISO format during sorting
-    songs = db.execute("""
-        SELECT song_title, song_url, date 
-        FROM Musicas 
-        ORDER BY STRFTIME('%Y-%m-%d', SUBSTR(date, 7, 4) || '-' || SUBSTR(date, 4, 2) || '-' || SUBSTR(date, 1, 2)) ASC
-    """).fetchall()
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Songs</title>
-            <style>
-                body {
-                    background-color: #FFD6CC;
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Songs</h1>
-            <ul class="list-group mt-3">
-                {% for song in songs %}
-                    <li class="list-group-item">
-                        <a href="{{ song['song_url'] }}" target="_blank">{{ song['song_title'] }}</a>
-                        <small class="text-muted">({{ song['date'] }})</small>
-                    </li>
-                {% endfor %}
-            </ul>
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-        </body>
-        </html>
-        """, songs=songs
-    )
-
-
-@app.route("/search")
-def search():
-    """
-    Allows searching for songs or albums by title.
-    """
-    query = request.args.get("q", "").strip()
-    db = get_db()
-    songs = db.execute("SELECT song_title, song_url FROM Musicas WHERE song_title LIKE ?", (f"%{query}%",)).fetchall() if query else []
-    albums = db.execute("SELECT album_title, album_url FROM Albuns WHERE album_title LIKE ?", (f"%{query}%",)).fetchall() if query else []
-
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Search Albums & Songs</title>
-            <style>
-                 body {
-                    background-color: #FFD6CC;
-                }
-                .btn-purple {
-                    background-color: #9370DB;
-                    color: white;
-                    border-color: #9370DB;
-                }
-                .btn-purple:hover {
-                    background-color: #7A5DC7;
-                    border-color: #7A5DC7;
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Search Albums & Songs</h1>
-            <form method="get" action="/search" class="mt-3">
-                <input type="text" name="q" class="form-control" placeholder="Enter title..." value="{{ query }}">
-                <button type="submit" class="btn btn-purple mt-3">Search</button>
-            </form>
-            {% if query %}
-                <h3 class="mt-4">Results for "{{ query }}"</h3>
-                <h4>Albums</h4>
-                <ul class="list-group">
-                    {% for album in albums %}
-                        <li class="list-group-item">
-                            <a href="{{ album['album_url'] }}" target="_blank">{{ album['album_title'] }}</a>
-                        </li>
-                    {% endfor %}
-                </ul>
-                <h4 class="mt-4">Songs</h4>
-                <ul class="list-group">
-                    {% for song in songs %}
-                        <li class="list-group-item">
-                            <a href="{{ song['song_url'] }}" target="_blank">{{ song['song_title'] }}</a>
-                        </li>
-                    {% endfor %}
-                </ul>
-            {% endif %}
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-        </body>
-        </html>
-        """, query=query, songs=songs, albums=albums
-    )
-
-
-@app.route("/person_search")
-def person_search():
-    """
-    Search for people and display tabs for songs where they worked as producers, artists, or writers.
-    """
-    query = request.args.get("q", "").strip()
-    db = get_db()
-    results = {"produtor": [], "artista": [], "escritor": []}
-    error_message = None
-
-    try:
-        if query:
-            # Function to fetch data by role
-            def get_songs_by_role(role_table, role_column):
-                return db.execute(f"""
-                    SELECT 
-                        Musicas.song_title AS song_title,
-                        Musicas.song_url AS song_url,
-                        GROUP_CONCAT(DISTINCT ArtistasPeople.person) AS artistas,
-                        GROUP_CONCAT(DISTINCT EscritoresPeople.person) AS escritores,
-                        GROUP_CONCAT(DISTINCT ProdutoresPeople.person) AS produtores
-                    FROM Pessoas
-                    JOIN {role_table} AS RoleTable ON Pessoas.person_id = RoleTable.{role_column}
-                    JOIN Musicas ON Musicas.song_id = RoleTable.song_id
-                    LEFT JOIN Artistas ON Artistas.song_id = Musicas.song_id
-                    LEFT JOIN Escritores ON Escritores.song_id = Musicas.song_id
-                    LEFT JOIN Produtores ON Produtores.song_id = Musicas.song_id
-                    LEFT JOIN Pessoas AS ArtistasPeople ON Artistas.artist_id = ArtistasPeople.person_id
-                    LEFT JOIN Pessoas AS EscritoresPeople ON Escritores.writer_id = EscritoresPeople.person_id
-                    LEFT JOIN Pessoas AS ProdutoresPeople ON Produtores.producer_id = ProdutoresPeople.person_id
-                    WHERE Pessoas.person LIKE ?
-                    GROUP BY Musicas.song_id
-                    ORDER BY Musicas.song_title
-                """, (f"%{query}%",)).fetchall()
-
-            # Retrieve data for each role
-            results["produtor"] = get_songs_by_role("Produtores", "producer_id")
-            results["artista"] = get_songs_by_role("Artistas", "artist_id")
-            results["escritor"] = get_songs_by_role("Escritores", "writer_id")
-
-    except sqlite3.Error as e:
-        error_message = f"Error accessing database: {e}"
-
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Search People</title>
-            <style>
-                 body {
-                    background-color: #FFD6CC;
-                }
-                .btn-purple {
-                    background-color: #9370DB;
-                    color: white;
-                    border-color: #9370DB;
-                }
-                .btn-purple:hover {
-                    background-color: #7A5DC7;
-                    border-color: #7A5DC7;
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Search People</h1>
-            <form method="get" action="/person_search" class="mt-3">
-                <input type="text" name="q" class="form-control" placeholder="Enter person's name..." value="{{ query }}">
-                <button type="submit" class="btn btn-purple mt-3">Search</button>
-            </form>
-            {% if error_message %}
-                <div class="alert alert-danger mt-4">{{ error_message }}</div>
-            {% endif %}
-            {% if query %}
-                <h3 class="mt-4">Results for "{{ query }}"</h3>
-                <ul class="nav nav-tabs" id="rolesTab" role="tablist">
-                    <li class="nav-item" role="presentation">
-                        <button class="nav-link active" id="produtor-tab" data-bs-toggle="tab" data-bs-target="#produtor" type="button" role="tab">Producer</button>
-                    </li>
-                    <li class="nav-item" role="presentation">
-                        <button class="nav-link" id="artista-tab" data-bs-toggle="tab" data-bs-target="#artista" type="button" role="tab">Artist</button>
-                    </li>
-                    <li class="nav-item" role="presentation">
-                        <button class="nav-link" id="escritor-tab" data-bs-toggle="tab" data-bs-target="#escritor" type="button" role="tab">Writer</button>
-                    </li>
-                </ul>
-                <div class="tab-content mt-3">
-                    {% for role, role_results in results.items() %}
-                        <div class="tab-pane fade {% if loop.first %}show active{% endif %}" id="{{ role }}" role="tabpanel">
-                            {% if role_results %}
-                                <ul class="list-group">
-                                    {% for result in role_results %}
-                                        <li class="list-group-item">
-                                            <strong>Song:</strong> <a href="{{ result['song_url'] }}" target="_blank">{{ result['song_title'] }}</a><br>
-                                            <strong>Producers:</strong> {{ result['produtores'] or 'None' }}<br>
-                                            <strong>Artists:</strong> {{ result['artistas'] or 'None' }}<br>
-                                            <strong>Writers:</strong> {{ result['escritores'] or 'None' }}
-                                        </li>
-                                    {% endfor %}
-                                </ul>
-                            {% else %}
-                                <p>No songs found for this role.</p>
-                            {% endif %}
-                        </div>
-                    {% endfor %}
-                </div>
-            {% endif %}
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-            <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-        </body>
-        </html>
-        """, query=query, results=results, error_message=error_message
-    )
-
-@app.route("/lyrics_search")
-def lyrics_search():
-    """
-    Search lyrics by content in the 'Letras' table.
-    """
-    query = request.args.get("q", "").strip()
-    db = get_db()
-    lyrics_results = []
-
-    if query:
-        try:
-            lyrics_results = db.execute("""
-                SELECT 
-                    Musicas.song_title, 
-                    Musicas.song_url, 
-                    Letras.song_lyrics 
-                FROM Musicas
-                JOIN Letras ON Musicas.song_id = Letras.lyrics_id
-                WHERE Letras.song_lyrics LIKE ?
-            """, (f"%{query}%",)).fetchall()
-        except sqlite3.Error as e:
-            return f"<p>Error accessing database: {e}</p>"
-
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Search Lyrics</title>
-            <style>
-                 body {
-                    background-color: #FFD6CC;
-                }
-                .btn-purple {
-                    background-color: #9370DB;
-                    color: white;
-                    border-color: #9370DB;
-                }
-                .btn-purple:hover {
-                    background-color: #7A5DC7;
-                    border-color: #7A5DC7;
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Search Lyrics</h1>
-            <form method="get" action="/lyrics_search" class="mt-3">
-                <input type="text" name="q" class="form-control" placeholder="Enter word or phrase..." value="{{ query }}">
-                <button type="submit" class="btn btn-purple mt-3">Search</button>
-            </form>
-            {% if query %}
-                <h3 class="mt-4">Results for "{{ query }}"</h3>
-                {% if lyrics_results %}
-                    <ul class="list-group mt-3">
-                        {% for lyric in lyrics_results %}
-                            <li class="list-group-item">
-                                <strong>Song:</strong> <a href="{{ lyric['song_url'] }}" target="_blank">{{ lyric['song_title'] }}</a><br>
-                                <strong>Lyric:</strong> {{ lyric['song_lyrics'] }}
-                            </li>
-                        {% endfor %}
-                    </ul>
-                {% else %}
-                    <p class="text-muted">No results found.</p>
-                {% endif %}
-            {% endif %}
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-        </body>
-        </html>
-        """, query=query, lyrics_results=lyrics_results
-    )
-
-@app.route("/questions")
-def questions():
-    """
-    Page with Questions and Answers.
-    """
-    db = get_db()
-    queries = [
-        # Question 1
-        {
-            "question": "Which song has the most views?",
-            "query": """
-                SELECT song_title as Title, views AS Views
-                FROM Musicas
-                WHERE views = (
-                    SELECT MAX(views)
-                    FROM Musicas
-                )
-            """
-        },
-        # Question 2
-        {
-            "question": "Which album has over 10 songs and more than 20 million combined views?",
-            "query": """
-                SELECT a.album_title as Title, SUM(m.views) AS Total_Views
-                FROM Albuns a
-                JOIN Musicas m ON a.album_id = m.album_id
-                GROUP BY a.album_id, Title
-                HAVING COUNT(m.song_id) > 10 
-                AND SUM(m.views) > 20000000
-            """
-        },
-        # Question 3
-        {
-            "question": "Which album has the highest average views per song?",
-            "query": """
-                SELECT Titulo as Title, avg_views AS Average_Views
-                FROM (
-                    SELECT a.album_title AS Titulo, AVG(m.views) AS avg_views
-                    FROM Albuns a
-                    JOIN Musicas m ON a.album_id = m.album_id
-                    GROUP BY a.album_id, a.album_title
-                ) AS AlbumAvg
-                WHERE avg_views = (
-                    SELECT MAX(avg_views)
-                    FROM (
-                        SELECT AVG(m.views) AS avg_views
-                        FROM Albuns a
-                        JOIN Musicas m ON a.album_id = m.album_id
-                        GROUP BY a.album_id
-                    ) AS AvgCalculation
-                )
-            """
-        },
-        # Question 4
-        {
-            "question": "Which songs have more than one writer?",
-            "query": """
-                SELECT m.song_title as Title, COUNT(e.writer_id) AS Writer_Count
-                FROM Musicas m
-                JOIN Escritores e ON m.song_id = e.song_id
-                GROUP BY m.song_id, Title
-                HAVING COUNT(e.writer_id) > 1
-            """
-        },
-        # Question 5
-        {
-            "question": "What are the most used tags?",
-            "query": """
-                SELECT Tag, Contagem as Count
-                FROM (
-                    SELECT t.tag AS Tag, COUNT(*) AS Contagem
-                    FROM Descricoes d
-                    JOIN Tags t ON d.tag_id = t.tag_id
-                    GROUP BY t.tag
-                ) AS TagCounts
-                WHERE Contagem = (
-                    SELECT MAX(Contagem)
-                    FROM (
-                        SELECT COUNT(*) AS Contagem
-                        FROM Descricoes d
-                        JOIN Tags t ON d.tag_id = t.tag_id
-                        GROUP BY t.tag
-                    ) AS MaxTagCounts
-                )
-            """
-        },
-        # Question 7
-        {
-            "question": "How many songs are in each album?",
-            "query": """
-                SELECT a.album_title as Title, COUNT(m.song_id) AS Count
-                FROM Albuns a
-                LEFT JOIN Musicas m ON a.album_id = m.album_id
-                GROUP BY a.album_id, a.album_title
-            """
-        },
-        # Question 8
-        {
-            "question": "Which albums have songs with over 1 million views?",
-            "query": """
-                SELECT DISTINCT a.album_title as Title
-                FROM Albuns a
-                JOIN Musicas m ON a.album_id = m.album_id
-                WHERE m.views > 1000000
-            """
-        },
-        # Question 9
-        {
-            "question": "What is the most popular album category (based on total views)?",
-            "query": """
-                SELECT Categoria as Category, total_views AS Views
-                FROM (
-                    SELECT a.category AS Categoria, SUM(m.views) AS total_views
-                    FROM Albuns a
-                    JOIN Musicas m ON a.album_id = m.album_id
-                    GROUP BY a.category
-                ) AS CategoriaViews
-                WHERE total_views = (
-                    SELECT MAX(total_views)
-                    FROM (
-                        SELECT SUM(m.views) AS total_views
-                        FROM Albuns a
-                        JOIN Musicas m ON a.album_id = m.album_id
-                        GROUP BY a.category
-                    ) AS MaxCategoriaViews
-                )
-            """
-        },
-        # Question 10
-        {
-            "question": "Which songs have more than one tag associated?",
-            "query": """
-                SELECT m.song_title as Title, COUNT(d.tag_id) AS Count
-                FROM Musicas m
-                JOIN Descricoes d ON m.song_id = d.song_id
-                GROUP BY m.song_id, Title
-                HAVING COUNT(d.tag_id) > 1
-            """
-        }
-    ]
-
-    results = []
-    for idx, q in enumerate(queries):
-        try:
-            result = db.execute(q["query"]).fetchall()
-            results.append({
-                "question_number": idx + 1, 
-                "question": q["question"],
-                "result": result
-            })
-        except sqlite3.Error as e:
-            results.append({
-                "question_number": idx + 1,
-                "question": q["question"],
-                "result": f"Error: {e}"
-            })
-
-    return render_template_string(
-        """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <title>Q&A</title>
-            <style>
-                body {
-                    background-color: #FFD6CC;
-                }
-            </style>
-        </head>
-        <body class="container">
-            <h1 class="mt-4">Questions & Answers</h1>
-            <ul class="list-group mt-3">
-                {% for q in results %}
-                    <li class="list-group-item">
-                        <strong>Question {{ q.question_number }}: {{ q.question }}</strong>
-                        <br>
-                        <table class="table table-bordered mt-3">
-                            <thead>
-                                <tr>
-                                    {% for column in q.result[0].keys() %}
-                                        <th>{{ column }}</th>
-                                    {% endfor %}
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {% for row in q.result %}
-                                    <tr>
-                                        {% for value in row %}
-                                            <td>{{ value }}</td>
-                                        {% endfor %}
-                                    </tr>
-                                {% endfor %}
-                            </tbody>
-                        </table>
-                    </li>
-                {% endfor %}
-            </ul>
-            <a href="/" class="btn btn-secondary mt-3">Back</a>
-        </body>
-        </html>
-        """, results=results
-    )
-
-
-if __name__ == "__main__":
-
-    app.run(debug=True)
+from flask import Flask, abort, g, jsonify, request, url_for
+from flask import render_template, send_file, stream_template
+import concurrent.futures
+from contextlib import contextmanager
+from datetime import date
+import hmac
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import click
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import BadRequest, GatewayTimeout, HTTPException, ServiceUnavailable
+
+import analytics
+import api
+import collaboration_graph
+import compression
+import db_pool
+import importer
+import lyrics_index
+import lyrics_storage
+import memory_snapshot
+import metrics
+import migrations
+from pagination import clamp_limit, decode_cursor, keyset_page
+import person_credits
+import question_registry
+import query_advisor
+import query_timeout
+import release_dates
+import search_guard
+import similar_songs
+import song_credits
+import song_writes
+import static_assets
+import summaries
+import title_index
+import write_queue
+from result_cache import ResultCache, cache_key
+
+
+# Configure Flask
+app = Flask(__name__)
+
+# Guards the one-time creation of the shared pool and cache
+_setup_lock = threading.Lock()
+# Guards rebuilds of the in-memory title index
+_title_index_lock = threading.Lock()
+# Guards rebuilds of the in-memory collaboration graph
+_graph_lock = threading.Lock()
+# Guards rebuilds of the columnar analytics snapshot
+_analytics_lock = threading.Lock()
+
+# Per-route request and SQL statistics, served at /metrics
+app.extensions["metrics"] = metrics.Metrics()
+
+# Database configuration
+# The app migrates its database and switches it to WAL, so by default it
+# works on a copy of the 'dbfinal.db' shipped next to this script, made
+# under instance/ on first start; the shipped file is never written to
+app.config["SEED_DATABASE"] = os.path.join(app.root_path, "dbfinal.db")
+app.config["DATABASE"] = os.environ.get("DATABASE", os.path.join(app.instance_path, "dbfinal.db"))
+# Maximum number of query results kept in memory (0 disables the cache)
+app.config["RESULT_CACHE_SIZE"] = int(os.environ.get("RESULT_CACHE_SIZE", 512))
+# Read-only connection pool (a size of 0 opens one connection per request)
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 8))
+app.config["DB_POOL_TIMEOUT"] = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+app.config["DB_HEALTH_CHECK_INTERVAL"] = float(os.environ.get("DB_HEALTH_CHECK_INTERVAL", 30))
+app.config["DB_MMAP_SIZE"] = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+app.config["DB_CACHE_SIZE"] = int(os.environ.get("DB_CACHE_SIZE", -64 * 1024))
+# Serve reads from an in-memory copy of the database, reloaded when the file changes
+app.config["IN_MEMORY"] = os.environ.get("IN_MEMORY", "0").lower() in ("1", "true", "yes")
+# Seconds between checks of the database file for changes in in-memory mode
+app.config["SNAPSHOT_POLL_INTERVAL"] = float(os.environ.get("SNAPSHOT_POLL_INTERVAL", 2))
+# Seconds clients and CDNs may reuse a JSON API response before revalidating it
+app.config["API_MAX_AGE"] = int(os.environ.get("API_MAX_AGE", 30))
+# Statements slower than this many milliseconds are logged (0 disables the log)
+app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 0))
+# File defining the Q&A questions, and how many of them may run at once
+app.config["QUESTIONS_FILE"] = os.environ.get(
+    "QUESTIONS_FILE", os.path.join(app.root_path, "questions.toml")
+)
+app.config["QUESTION_WORKERS"] = int(os.environ.get("QUESTION_WORKERS", 4))
+# Seconds a request's queries may run before they are interrupted (0 disables the limit)
+app.config["REQUEST_TIMEOUT"] = float(os.environ.get("REQUEST_TIMEOUT", 10))
+# Tighter budget, in seconds, for the statements of a search on user-supplied text
+app.config["SEARCH_TIMEOUT"] = float(os.environ.get("SEARCH_TIMEOUT", 2))
+# Compiled templates are kept on disk so restarted workers skip compiling them
+app.config["TEMPLATE_CACHE_DIR"] = os.environ.get(
+    "TEMPLATE_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache")
+)
+os.makedirs(app.config["TEMPLATE_CACHE_DIR"], exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["TEMPLATE_CACHE_DIR"])
+# Precompressed copies of the static files, named after their content hash
+app.config["STATIC_CACHE_DIR"] = os.environ.get(
+    "STATIC_CACHE_DIR", os.path.join(app.instance_path, "static_cache")
+)
+# Responses smaller than this many bytes are sent uncompressed (negative disables compression)
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+# Bearer token the write API asks for (the write API is off while it is empty)
+app.config["WRITE_API_TOKEN"] = os.environ.get("WRITE_API_TOKEN", "")
+# Writes that may wait for the writer thread before new ones get 503, and
+# how many of them it commits per transaction at most
+app.config["WRITE_QUEUE_SIZE"] = int(os.environ.get("WRITE_QUEUE_SIZE", 1000))
+app.config["WRITE_BATCH_SIZE"] = int(os.environ.get("WRITE_BATCH_SIZE", 200))
+# Seconds a write request waits for its commit before being answered 202
+app.config["WRITE_TIMEOUT"] = float(os.environ.get("WRITE_TIMEOUT", 5))
+# Minimum seconds between updates of the similar-songs index after writes
+app.config["SIMILAR_SONGS_INTERVAL"] = float(os.environ.get("SIMILAR_SONGS_INTERVAL", 30))
+
+# The Q&A questions are read once, at startup
+app.extensions["questions"] = question_registry.QuestionRegistry(
+    question_registry.load_questions(app.config["QUESTIONS_FILE"]),
+    workers=app.config["QUESTION_WORKERS"],
+)
+
+# Static files are fingerprinted and precompressed once, at startup
+app.extensions["assets"] = static_assets.AssetManifest.build(app.static_folder, app.config["STATIC_CACHE_DIR"])
+app.extensions["compression"] = compression.ResponseCompressor(app.config["COMPRESS_MIN_SIZE"])
+
+def seed_database():
+    """
+    Copies SEED_DATABASE to DATABASE when the latter does not exist yet.
+    The copy is written under a temporary name and linked into place, so
+    workers starting together never open a half-written file and the
+    first copy in place is the one every worker keeps.
+    """
+    path = app.config["DATABASE"]
+    if os.path.exists(path):
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, partial = tempfile.mkstemp(dir=directory, suffix=".partial")
+    os.close(descriptor)
+    try:
+        shutil.copyfile(app.config["SEED_DATABASE"], partial)
+        os.link(partial, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(partial)
+
+seed_database()
+
+def connect_db():
+    """
+    Opens a read-only connection to the SQLite database, or to its
+    in-memory copy in in-memory mode.
+    """
+    snapshot = app.extensions.get("memory_snapshot")
+    if snapshot is not None and snapshot.path == app.config["DATABASE"]:
+        return snapshot.connect()
+    return db_pool.connect_readonly(
+        app.config["DATABASE"], app.config["DB_MMAP_SIZE"], app.config["DB_CACHE_SIZE"]
+    )
+
+def get_pool():
+    """
+    Returns the pool of read-only connections, creating it on first use.
+    Pending migrations are applied and WAL enabled before any reader opens.
+    In in-memory mode the database is copied into memory first, and every
+    pooled connection is retired after each reload of the copy.
+    """
+    pool = app.extensions.get("db_pool")
+    if pool is None or pool.path != app.config["DATABASE"]:
+        with _setup_lock:
+            pool = app.extensions.get("db_pool")
+            if pool is None or pool.path != app.config["DATABASE"]:
+                migrations.ensure_migrated(app.config["DATABASE"])
+                db_pool.enable_wal(app.config["DATABASE"])
+                previous = app.extensions.pop("memory_snapshot", None)
+                if previous is not None:
+                    previous.stop()
+                if app.config["IN_MEMORY"]:
+                    snapshot = memory_snapshot.MemorySnapshot(
+                        app.config["DATABASE"], app.config["SNAPSHOT_POLL_INTERVAL"]
+                    )
+                    snapshot.start()
+                    app.extensions["memory_snapshot"] = snapshot
+                    app.logger.info("Loaded %s into memory: %.1f MiB in %.3f s", app.config["DATABASE"],
+                                    snapshot.size_bytes / 2**20, snapshot.load_seconds)
+                pool = db_pool.ConnectionPool(
+                    app.config["DATABASE"],
+                    connect_db,
+                    size=app.config["DB_POOL_SIZE"],
+                    timeout=app.config["DB_POOL_TIMEOUT"],
+                    health_check_interval=app.config["DB_HEALTH_CHECK_INTERVAL"],
+                )
+                if app.config["IN_MEMORY"]:
+                    snapshot.on_swap = pool.close_all
+                app.extensions["db_pool"] = pool
+    return pool
+
+def acquire_connection(deadline):
+    """
+    Checks a connection out of the pool, waiting no longer than 'deadline'
+    allows, and lets the deadline interrupt its statements.
+    """
+    pool = get_pool()
+    timeout = None if deadline is None else min(pool.timeout, deadline.remaining())
+    conn = pool.acquire(timeout)
+    query_timeout.interrupt_after(conn, deadline)
+    return conn
+
+def release_connection(conn):
+    """
+    Returns a connection taken with acquire_connection() to the pool.
+    """
+    query_timeout.interrupt_after(conn, None)
+    get_pool().release(conn)
+
+def get_db():
+    """
+    Retrieves the database connection for the current request.
+    Statements run through it are timed (see record_query) and interrupted
+    once the request's deadline passes.
+    """
+    if 'db' not in g:
+        deadline = g.get("deadline")
+        g.db = metrics.InstrumentedConnection(acquire_connection(deadline), record_query, deadline)
+    return g.db
+
+def record_query(timing):
+    """
+    Keeps the timing of a statement for the request's metrics and logs
+    it when it is slower than SLOW_QUERY_MS.
+    """
+    g.setdefault("queries", []).append(timing)
+    threshold = app.config["SLOW_QUERY_MS"]
+    if threshold and timing.seconds * 1000 >= threshold:
+        app.logger.warning(
+            "Slow query on %s: %.1f ms, %d rows: %s params=%r",
+            request.path if request else "-", timing.seconds * 1000, timing.rows,
+            metrics.statement_label(timing.sql), timing.params,
+        )
+
+def get_result_cache():
+    """
+    Returns the query-result cache shared by all requests.
+    """
+    # Migrations change the database, so they must run before the
+    # cache first reads its version
+    get_pool()
+    cache = app.extensions.get("result_cache")
+    if cache is None or cache.path != app.config["DATABASE"]:
+        with _setup_lock:
+            cache = app.extensions.get("result_cache")
+            if cache is None or cache.path != app.config["DATABASE"]:
+                snapshot = app.extensions.get("memory_snapshot")
+                cache = ResultCache(app.config["DATABASE"], app.config["RESULT_CACHE_SIZE"],
+                                    version_source=snapshot.version if snapshot is not None else None)
+                app.extensions["result_cache"] = cache
+    return cache
+
+def get_title_index():
+    """
+    Returns the trigram index over song and album titles, rebuilding it
+    whenever the database has changed since it was built.
+    """
+    version = get_result_cache().version()
+    index = app.extensions.get("title_index")
+    if index is None or index.version != version:
+        with _title_index_lock:
+            index = app.extensions.get("title_index")
+            if index is None or index.version != version:
+                index = title_index.TitleIndex.build(get_db(), version)
+                app.extensions["title_index"] = index
+    return index
+
+def get_collaboration_graph():
+    """
+    Returns the graph of who worked with whom, rebuilding it whenever the
+    database has changed since it was built.
+    """
+    version = get_result_cache().version()
+    graph = app.extensions.get("collaboration_graph")
+    if graph is None or graph.version != version:
+        with _graph_lock:
+            graph = app.extensions.get("collaboration_graph")
+            if graph is None or graph.version != version:
+                graph = collaboration_graph.CollaborationGraph.build(get_db(), version)
+                app.extensions["collaboration_graph"] = graph
+    return graph
+
+def get_analytics():
+    """
+    Returns the columnar snapshot behind the analytics endpoints,
+    rebuilding it whenever the database has changed since it was built.
+    Answers 501 when NumPy is not installed.
+    """
+    if not analytics.available():
+        abort(501, "Vectorized analytics need NumPy: pip install numpy")
+    version = get_result_cache().version()
+    snapshot = app.extensions.get("analytics")
+    if snapshot is None or snapshot.version != version:
+        with _analytics_lock:
+            snapshot = app.extensions.get("analytics")
+            if snapshot is None or snapshot.version != version:
+                snapshot = analytics.AnalyticsSnapshot.build(get_db(), version)
+                app.extensions["analytics"] = snapshot
+    return snapshot
+
+def get_write_queue():
+    """
+    Returns the queue of the single writer thread, starting it on first
+    use or again when its thread has died. Migrations and WAL come first
+    (see get_pool), so readers keep their snapshots while it commits.
+    When the writer has been idle, the similar-songs index picks up the
+    songs written since its last update.
+    """
+    get_pool()
+    writer = app.extensions.get("write_queue")
+    if writer is None or writer.path != app.config["DATABASE"] or not writer.running:
+        with _setup_lock:
+            writer = app.extensions.get("write_queue")
+            if writer is None or writer.path != app.config["DATABASE"] or not writer.running:
+                if writer is not None:
+                    writer.close()
+                writer = write_queue.WriteQueue(
+                    app.config["DATABASE"],
+                    size=app.config["WRITE_QUEUE_SIZE"],
+                    batch_size=app.config["WRITE_BATCH_SIZE"],
+                    on_batch=app.extensions["metrics"].observe_write_batch,
+                    idle_task=similar_songs.plan_update,
+                    idle_interval=app.config["SIMILAR_SONGS_INTERVAL"],
+                )
+                app.extensions["write_queue"] = writer
+    return writer
+
+def use_deadline(deadline):
+    """
+    Makes 'deadline' the one interrupting the request's statements from
+    now on, including on a connection already taken.
+    """
+    g.deadline = deadline
+    if 'db' in g:
+        g.db.deadline = deadline
+        query_timeout.interrupt_after(g.db.connection, deadline)
+
+@contextmanager
+def search_budget():
+    """
+    Runs the statements of the block under SEARCH_TIMEOUT, or under the
+    request's deadline when that comes first.
+    """
+    outer = g.get("deadline")
+    if app.config["SEARCH_TIMEOUT"] <= 0:
+        yield
+        return
+    use_deadline(query_timeout.Deadline(app.config["SEARCH_TIMEOUT"], parent=outer))
+    try:
+        yield
+    finally:
+        use_deadline(outer)
+
+def search_text(prefixes=False):
+    """
+    The search text of the request ('q'), stripped; empty when there is
+    nothing to search for. Text that is too short or too long raises
+    RejectedSearch and is counted in the metrics.
+    """
+    query = request.args.get("q", "").strip()
+    if query:
+        try:
+            search_guard.check_search(query, prefixes)
+        except search_guard.RejectedSearch as e:
+            app.extensions["metrics"].observe_guard(request.url_rule.rule, e.reason)
+            raise
+    return query
+
+def cached_result(route, compute, **args):
+    """
+    Returns the result of 'compute()' for this route and arguments,
+    reusing a previous result while the database is unchanged.
+    """
+    return get_result_cache().get_or_compute(cache_key(route, args), compute)
+
+def page_args(key_length, prefix=""):
+    """
+    Reads a listing's page cursor ('<prefix>after') and page size ('limit')
+    from the query string. Returns (raw token, decoded cursor, limit).
+    """
+    token = request.args.get(prefix + "after") or None
+    after = None
+    if token:
+        try:
+            after = decode_cursor(token, key_length)
+        except ValueError as e:
+            abort(400, str(e))
+    return token, after, clamp_limit(request.args.get("limit", type=int))
+
+@app.template_global()
+def page_url(**changes):
+    """
+    URL of the current page with some query arguments replaced.
+    """
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **args)
+
+@app.teardown_appcontext
+def close_db(exception):
+    """
+    Returns the database connection to the pool when the request ends.
+    """
+    db = g.pop('db', None)
+    if db is not None:
+        release_connection(db.connection)
+
+@app.before_request
+def start_timer():
+    """
+    Notes when the request started, for its latency metrics, and sets the
+    deadline of its queries: the one handed over by the server, if any,
+    or REQUEST_TIMEOUT from now.
+    """
+    g.request_start = time.perf_counter()
+    g.deadline = request.environ.get(query_timeout.ENVIRON_KEY)
+    if g.deadline is None and app.config["REQUEST_TIMEOUT"] > 0:
+        g.deadline = query_timeout.Deadline(app.config["REQUEST_TIMEOUT"])
+
+@app.after_request
+def record_request(response):
+    """
+    Adds the request to the per-route metrics and reports the time spent
+    in SQL and overall in a Server-Timing header. Streamed pages are timed
+    up to the start of the stream.
+    """
+    start = g.pop("request_start", None)
+    if start is None:
+        return response
+    seconds = time.perf_counter() - start
+    queries = g.pop("queries", [])
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    app.extensions["metrics"].observe_request(route, response.status_code, seconds, queries)
+    response.headers["Server-Timing"] = metrics.server_timing(queries, seconds)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    Compresses text responses for clients that accept gzip or brotli.
+    """
+    return app.extensions["compression"].apply(response, request.accept_encodings)
+
+@app.template_global()
+def asset_url(filename):
+    """
+    URL of a static file under its fingerprinted name, which can be
+    cached forever; files added since startup get their plain URL.
+    """
+    try:
+        return url_for("asset", filename=app.extensions["assets"].url_name(filename))
+    except KeyError:
+        return url_for("static", filename=filename)
+
+@app.template_filter("highlight")
+def highlight_filter(snippet):
+    """
+    Renders a search snippet with the matched terms highlighted.
+    """
+    return lyrics_index.highlight(snippet)
+
+@app.cli.command("migrate")
+def migrate_command():
+    """
+    Applies pending schema migrations to the database.
+    """
+    applied = migrations.migrate(app.config["DATABASE"])
+    click.echo(f"Applied migrations: {applied or 'none'}")
+
+@app.cli.command("rebuild-lyrics-index")
+def rebuild_lyrics_index_command():
+    """
+    Rebuilds the full-text index over the lyrics.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    with conn:
+        lyrics_index.rebuild_index(conn)
+    conn.close()
+    click.echo("Lyrics index rebuilt.")
+
+def echo_storage_report(report):
+    """
+    Prints the outcome of a change of lyrics layout.
+    """
+    dictionary = f" + {report.dictionary_bytes} bytes of dictionary" if report.dictionary_bytes else ""
+    click.echo(f"{report.rows} lyrics: {report.text_bytes} bytes of text, "
+               f"{report.stored_bytes} bytes compressed{dictionary}, in {report.seconds:.1f} s.")
+
+@app.cli.command("compress-lyrics")
+@click.option("--codec", type=click.Choice(lyrics_storage.available_codecs()),
+              help="Compression codec (zstd when installed, else zlib).")
+@click.option("--dictionary-size", default=lyrics_storage.DICTIONARY_SIZE, show_default=True,
+              help="Bytes of the shared dictionary trained on the lyrics.")
+def compress_lyrics_command(codec, dictionary_size):
+    """
+    Stores the lyrics compressed with a shared dictionary, checks that
+    every one decompresses to the original, recreates the lyrics index and
+    compacts the database.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    try:
+        with conn:
+            report = lyrics_storage.compress_lyrics(conn, codec, dictionary_size)
+            lyrics_index.recreate_index(conn)
+        conn.execute("VACUUM")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    echo_storage_report(report)
+
+@app.cli.command("decompress-lyrics")
+def decompress_lyrics_command():
+    """
+    Stores the lyrics as plain text again.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    try:
+        with conn:
+            report = lyrics_storage.decompress_lyrics(conn)
+            lyrics_index.recreate_index(conn)
+        conn.execute("VACUUM")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    echo_storage_report(report)
+
+@app.cli.command("verify-lyrics")
+@click.option("--against", type=click.Path(exists=True, dir_okay=False),
+              help="Database whose lyrics the stored ones must equal, in either layout.")
+def verify_lyrics_command(against):
+    """
+    Decompresses every lyric, optionally comparing them with another database.
+    """
+    conn = sqlite3.connect(app.config["DATABASE"])
+    reference = sqlite3.connect(against) if against else None
+    problems = lyrics_storage.verify_lyrics(conn, reference)
+    stats = lyrics_storage.storage_stats(conn)
+    conn.close()
+    if reference is not None:
+        reference.close()
+    for lyrics_id, problem in problems:
+        click.echo(f"Letras {lyrics_id}: {problem}")
+    if problems:
+        raise SystemExit(1)
+    click.echo(f"{stats['rows']} lyrics ({stats['layout']}, {stats['stored_bytes']} bytes) are consistent.")
+
+@app.cli.command("backfill-release-dates")
+def backfill_release_dates_command():
+    """
+    Recomputes Musicas.release_date from Musicas.date where they differ.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    with conn:
+        updated, unparsed = release_dates.backfill_release_dates(conn)
+    conn.close()
+    click.echo(f"Updated {updated} release dates; {unparsed} dates could not be parsed.")
+
+@app.cli.command("rebuild-summaries")
+def rebuild_summaries_command():
+    """
+    Recomputes the summary tables and song credits from the base tables.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    with conn:
+        summaries.rebuild_summaries(conn)
+        song_credits.rebuild_credits(conn)
+    conn.close()
+    click.echo("Summary tables rebuilt.")
+
+@app.cli.command("check-summaries")
+def check_summaries_command():
+    """
+    Compares the summary tables and song credits with a fresh recomputation.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    problems = summaries.check_summaries(conn) + song_credits.check_credits(conn)
+    conn.close()
+    for table, row, problem in problems:
+        click.echo(f"{table}: {problem} row {row}")
+    if problems:
+        raise SystemExit(1)
+    click.echo("Summary tables are consistent.")
+
+@app.cli.command("update-similar-songs")
+@click.option("--full", is_flag=True, help="Recompute the similar songs of every song.")
+def update_similar_songs_command(full):
+    """
+    Indexes the similar songs of songs added since the last update, or of
+    every song with --full.
+    """
+    migrations.migrate(app.config["DATABASE"])
+    conn = sqlite3.connect(app.config["DATABASE"])
+    with conn:
+        if full:
+            added, updated, removed, seconds = similar_songs.rebuild_similar(conn)
+        else:
+            added, updated, removed, seconds = similar_songs.update_similar(conn)
+    conn.close()
+    click.echo(f"Indexed {added} songs, updated {updated} and removed {removed} in {seconds:.1f} s.")
+
+@app.cli.command("import-catalog")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=importer.DEFAULT_BATCH_SIZE, show_default=True,
+              help="Records written per transaction.")
+@click.option("--restart", is_flag=True, help="Start over instead of resuming an interrupted import.")
+def import_catalog_command(source, batch_size, restart):
+    """
+    Loads songs from a CSV or JSON Lines file, replacing songs that are
+    already in the database. Re-run after an interruption to resume.
+    """
+    conn = importer.open_for_import(app.config["DATABASE"])
+
+    def progress(records, rows, seconds):
+        click.echo(f"{records} records, {rows} rows, {rows / seconds:.0f} rows/s")
+
+    try:
+        report = importer.import_catalog(conn, source, batch_size, restart, progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    total = sum(report.rows.values())
+    if report.resumed_from:
+        click.echo(f"Resumed after record {report.resumed_from}.")
+    for table, count in sorted(report.rows.items()):
+        click.echo(f"  {table:<12}{count:>10}")
+    click.echo(f"Imported {report.records} records ({total} rows) in {report.seconds:.1f} s, "
+               f"{total / max(report.seconds, 1e-9):.0f} rows/s.")
+    click.echo("Run update-similar-songs to index the similar songs of the imported songs.")
+
+@app.cli.command("explain-queries")
+def explain_queries_command():
+    """
+    Runs EXPLAIN QUERY PLAN on every query the routes issue and reports
+    full table scans and temporary B-trees that are not known to be needed.
+    """
+    app.config["RESULT_CACHE_SIZE"] = 0
+    app.extensions.pop("result_cache", None)
+    statements = query_advisor.collect_statements(app, get_db, query_advisor.ADVISOR_URLS)
+    # Q&A queries run on worker threads, outside the traced connection
+    statements += [("/questions", question.query) for question in app.extensions["questions"].questions.values()]
+    db = connect_db()
+    findings = query_advisor.review_plans(db, statements)
+    db.close()
+    unexpected = 0
+    for route, sql, step, reason in findings:
+        if reason:
+            click.echo(f"{route}: {step} (accepted: {reason})")
+        else:
+            unexpected += 1
+            click.echo(f"{route}: {step}\n    {' '.join(sql.split())}")
+    if unexpected:
+        raise SystemExit(1)
+    click.echo(f"Checked {len(statements)} queries; no unexpected scans.")
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    """
+    Serves a static file by its fingerprinted name, precompressed when
+    the client accepts it. The name changes with the content, so the
+    response is cached for a year and never revalidated.
+    """
+    try:
+        found = app.extensions["assets"].find(filename)
+    except KeyError:
+        abort(404)
+    encoding = compression.choose_encoding(request.accept_encodings, tuple(found.variants))
+    response = send_file(found.variants.get(encoding, found.path), mimetype=found.mimetype,
+                         etag=f"{found.digest}-{encoding or 'identity'}", max_age=static_assets.IMMUTABLE_MAX_AGE)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if found.variants:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/cache_stats")
+def cache_stats():
+    """
+    Hit, miss and eviction counters of the query-result cache,
+    plus the state of the connection pool.
+    """
+    return jsonify({**get_result_cache().stats(), "pool": get_pool().stats()})
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """
+    Request latency, SQL timing, cache and pool statistics in the
+    Prometheus text format.
+    """
+    text = (app.extensions["metrics"].render()
+            + metrics.format_gauges("result_cache", get_result_cache().stats(), "Query-result cache counter.")
+            + metrics.format_gauges("db_pool", get_pool().stats(), "Connection pool state."))
+    if "memory_snapshot" in app.extensions:
+        text += metrics.format_gauges("memory_snapshot", app.extensions["memory_snapshot"].stats(),
+                                      "In-memory database copy.")
+    if "collaboration_graph" in app.extensions:
+        text += metrics.format_gauges("collaboration_graph", app.extensions["collaboration_graph"].stats(),
+                                      "Collaboration graph size and build time.")
+    if "analytics" in app.extensions:
+        text += metrics.format_gauges("analytics", app.extensions["analytics"].stats(),
+                                      "Columnar analytics snapshot size and build time.")
+    text += metrics.format_gauges("static_assets", app.extensions["assets"].stats(),
+                                  "Fingerprinted static files and their precompressed size.")
+    text += metrics.format_gauges("compression", app.extensions["compression"].stats(),
+                                  "Compressed responses and their size before and after.")
+    if "asgi" in app.extensions:
+        text += metrics.format_gauges("asgi", app.extensions["asgi"].stats(), "Async server state.")
+    if "write_queue" in app.extensions:
+        text += metrics.format_gauges("write_queue", app.extensions["write_queue"].stats(),
+                                      "Write queue depth and counters.")
+    return app.response_class(text, mimetype="text/plain; version=0.0.4")
+
+def load_main_page():
+    """
+    Basic database statistics for the home page.
+    """
+    # Totals are kept up to date by triggers (see summaries.py)
+    stats = cached_result("main_page", lambda: {
+        row["name"]: row["value"] for row in get_db().execute("SELECT name, value FROM ResumoTotais")
+    })
+    return {"stats": stats}
+
+@app.route("/")
+def main_page():
+    """
+    Home page with basic database statistics.
+    """
+    return render_template("index.html", **load_main_page())
+
+
+def load_albums():
+    """
+    One page of albums by title, excluding "No Album" entries.
+    """
+    token, after, limit = page_args(2)
+    albums = cached_result("list_albums", lambda: keyset_page(
+        get_db(),
+        columns="album_title, album_url",
+        source="Albuns",
+        key=["album_title", "album_id"],
+        where='album_title != "Sem Album"',
+        after=after,
+        limit=limit,
+    ), after=token, limit=limit)
+    return {"albums": albums}
+
+@app.route("/albums")
+def list_albums():
+    """
+    Lists albums by title, one page at a time, excluding "No Album" entries.
+    """
+    return stream_template("albums.html", **load_albums())
+
+
+def load_songs():
+    """
+    One page of songs by date (ascending), songs without a date first.
+    Optional 'from' and 'to' (YYYY-MM-DD) limit the release date range.
+    """
+    token, after, limit = page_args(2)
+    start = request.args.get("from") or None
+    end = request.args.get("to") or None
+    try:
+        for day in (start, end):
+            if day is not None:
+                date.fromisoformat(day)
+    except ValueError:
+        abort(400, "Dates must be given as YYYY-MM-DD")
+
+    # The sort key is release_date (the ISO form of 'date'), with '' for
+    # songs without a date; it is indexed together with song_id
+    order_key = release_dates.SONG_ORDER_KEY
+    conditions, params = [], []
+    if start is not None or end is not None:
+        conditions.append(f"{order_key} > ''")
+    if start is not None:
+        conditions.append(f"{order_key} >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{order_key} <= ?")
+        params.append(end)
+
+    songs = cached_result("list_songs", lambda: keyset_page(
+        get_db(),
+        columns="song_title, song_url, date",
+        source="Musicas",
+        key=[order_key, "song_id"],
+        params=params,
+        where=" AND ".join(conditions),
+        after=after,
+        limit=limit,
+    ), after=token, limit=limit, start=start, end=end)
+    return {"songs": songs}
+
+@app.route("/songs")
+def list_songs():
+    """
+    Lists songs organized by date (ascending), one page at a time.
+    Optional 'from' and 'to' (YYYY-MM-DD) limit the release date range.
+    """
+    return stream_template("songs.html", **load_songs())
+
+
+def load_search():
+    """
+    Songs and albums whose title is similar to the search text, best match
+    first. Typos, accents and case are forgiven (see title_index.py).
+    Songs and albums are paged separately ('songs_after' / 'albums_after').
+    """
+    query = search_text()
+    songs_token, songs_after, limit = page_args(4, "songs_")
+    albums_token, albums_after, limit = page_args(4, "albums_")
+
+    def find_titles():
+        index = get_title_index()
+        try:
+            songs = index.search(query, "song", after=songs_after, limit=limit)
+            albums = index.search(query, "album", after=albums_after, limit=limit)
+        except ValueError as e:
+            abort(400, str(e))
+        return songs, albums
+
+    songs, albums = cached_result(
+        "search", find_titles, q=query, songs_after=songs_token, albums_after=albums_token, limit=limit
+    ) if query else (None, None)
+    return {"query": query, "songs": songs, "albums": albums}
+
+@app.route("/search")
+def search():
+    """
+    Allows searching for songs or albums by title, forgiving typos and accents.
+    Songs and albums are paged separately ('songs_after' / 'albums_after').
+    """
+    try:
+        context = {**load_search(), "error_message": None}
+    except search_guard.RejectedSearch as e:
+        context = {"query": request.args.get("q", "").strip(), "songs": None, "albums": None,
+                   "error_message": str(e)}
+    return stream_template("search.html", **context)
+
+
+def load_person_search():
+    """
+    Songs credited to the people whose name contains the search text,
+    by role. Each role is paged separately ('produtor_after', 'artista_after', ...).
+    """
+    query = search_text()
+    results = {role: None for role in person_credits.ROLES}
+    more_people = False
+
+    tokens, after = {}, {}
+    for role in person_credits.ROLES:
+        tokens[f"{role}_after"], after[role], limit = page_args(2, f"{role}_")
+
+    if query:
+        with search_budget():
+            results, more_people = cached_result(
+                "person_search",
+                lambda: person_credits.find_person_credits(get_db(), query, after, limit),
+                q=query, limit=limit, **tokens
+            )
+        if more_people:
+            app.extensions["metrics"].observe_guard(request.url_rule.rule, "truncated")
+    return {"query": query, "results": results, "more_people": more_people}
+
+@app.route("/person_search")
+def person_search():
+    """
+    Search for people and display tabs for songs where they worked as producers, artists, or writers.
+    Each role is paged separately ('produtor_after', 'artista_after', ...).
+    """
+    try:
+        context = {**load_person_search(), "error_message": None}
+    except (search_guard.RejectedSearch, sqlite3.Error) as e:
+        context = {
+            "query": request.args.get("q", "").strip(),
+            "results": {role: None for role in person_credits.ROLES},
+            "more_people": False,
+            "error_message": str(e) if isinstance(e, search_guard.RejectedSearch)
+            else f"Error accessing database: {e}",
+        }
+    return stream_template("person_search.html", max_people=search_guard.MAX_MATCHED_PEOPLE, **context)
+
+
+def load_lyrics_search():
+    """
+    One page of the songs whose lyrics match the search text, best first.
+    """
+    query = search_text(prefixes=True)
+    token, after, limit = page_args(2)
+    lyrics_results = None
+
+    if query:
+        with search_budget():
+            lyrics_results = cached_result(
+                "lyrics_search",
+                lambda: lyrics_index.search_lyrics(get_db(), query, after, limit),
+                q=query, after=token, limit=limit
+            )
+    return {"query": query, "lyrics_results": lyrics_results}
+
+@app.route("/lyrics_search")
+def lyrics_search():
+    """
+    Search lyrics by content using the full-text index over 'Letras'.
+    Supports "exact phrases" and prefix* terms, best matches first.
+    """
+    try:
+        context = {**load_lyrics_search(), "error_message": None}
+    except search_guard.RejectedSearch as e:
+        context = {"query": request.args.get("q", "").strip(), "lyrics_results": None, "error_message": str(e)}
+    except sqlite3.Error as e:
+        return f"<p>Error accessing database: {e}</p>"
+    return stream_template("lyrics_search.html", **context)
+
+def load_song(song_id):
+    """
+    The detail of one song (album, track number, credits and tags), read
+    from its row of the credits read model, or a 404 for an unknown id.
+    """
+    song = cached_result("song", lambda: song_credits.find_song(get_db(), song_id), song_id=song_id)
+    if song is None:
+        abort(404, f"There is no song {song_id}")
+    return {"song": song}
+
+@app.route("/song/<int:song_id>")
+def song(song_id):
+    """
+    Detail page of one song with its album, credits and tags.
+    """
+    return render_template("song.html", **load_song(song_id))
+
+def load_similar_songs(song_id):
+    """
+    A song and the songs most similar to it by lyrics, tags and credits,
+    read from the similar-songs index, or a 404 for an unknown id.
+    'limit' caps their number.
+    """
+    limit = clamp_limit(request.args.get("limit", similar_songs.DEFAULT_NEIGHBOURS, type=int))
+    found = cached_result("similar_songs", lambda: similar_songs.find_similar(get_db(), song_id, limit),
+                          song_id=song_id, limit=limit)
+    if found is None:
+        abort(404, f"There is no song {song_id}")
+    return found
+
+@app.route("/song/<int:song_id>/similar")
+def similar_songs_page(song_id):
+    """
+    Page listing the songs most similar to one song.
+    """
+    return render_template("similar_songs.html", **load_similar_songs(song_id))
+
+def run_question(question, deadline=None):
+    """
+    Runs one Q&A query on its own pooled connection and returns the answer
+    with its latency. Called from the question worker threads; the query
+    is interrupted once 'deadline' passes.
+    """
+    answer = {"question_number": question.id, "question": question.question}
+    db = acquire_connection(deadline)
+    start = time.perf_counter()
+    try:
+        answer["result"] = db.execute(question.query).fetchall()
+    except sqlite3.Error as e:
+        query_timeout.check_interrupted(e, deadline)
+        answer["result"] = f"Error: {e}"
+        answer["error"] = True
+    finally:
+        release_connection(db)
+    seconds = time.perf_counter() - start
+    answer["latency_ms"] = round(seconds * 1000, 3)
+    answer["timing"] = metrics.QueryTiming(question.query, (), seconds, len(answer["result"]))
+    return answer
+
+def answer_questions(question_ids):
+    """
+    Returns the answers to the given Q&A questions, reusing cached answers
+    and running the others concurrently.
+    """
+    registry = app.extensions["questions"]
+    deadline = g.get("deadline")
+    answers = registry.answer(question_ids, lambda question: run_question(question, deadline),
+                              get_result_cache().version())
+    for answer in answers:
+        # Fresh answers count towards this request's SQL time and metrics
+        timing = answer.pop("timing", None)
+        if timing is not None:
+            record_query(timing)
+            app.extensions["metrics"].observe_question(answer["question_number"], timing.seconds)
+    return answers
+
+def load_questions():
+    """
+    The answers to every Q&A question.
+    """
+    return {"results": answer_questions(list(app.extensions["questions"].questions))}
+
+def load_question(question_id):
+    """
+    The answer to one Q&A question, or a 404 for an unknown id.
+    """
+    if question_id not in app.extensions["questions"].questions:
+        abort(404, f"There is no question {question_id}")
+    return {"results": answer_questions([question_id])}
+
+@app.route("/questions")
+def questions():
+    """
+    Page with Questions and Answers.
+    """
+    return render_template("questions.html", **load_questions())
+
+@app.route("/questions/<int:question_id>")
+def question(question_id):
+    """
+    Page with a single question and its answer, for loading one at a time.
+    """
+    return render_template("questions.html", **load_question(question_id))
+
+
+def api_response(load):
+    """
+    Returns the data of a page as JSON, tagged with a strong ETag derived
+    from the database version. A request whose If-None-Match carries the
+    current tag gets an empty 304 without touching the database.
+    """
+    etag = api.make_etag(get_result_cache().version(), request.path, request.args)
+    # Weak comparison, as If-None-Match calls for: compressed responses
+    # carry the tag as a weak one
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        try:
+            data = load()
+        except sqlite3.Error as e:
+            return jsonify({"error": f"Error accessing database: {e}"}), 500
+        response = jsonify(api.to_json(data))
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config["API_MAX_AGE"]
+    response.cache_control.must_revalidate = True
+    return response
+
+@app.errorhandler(HTTPException)
+def api_error(e):
+    """
+    Reports HTTP errors from the JSON API as JSON; other pages keep
+    Flask's HTML error pages.
+    """
+    if not request.path.startswith(api.API_PREFIX + "/"):
+        return e
+    response = jsonify({"error": e.description})
+    response.status_code = e.code
+    # Keep headers such as Allow and Retry-After
+    for name, value in e.get_headers():
+        if name.lower() != "content-type":
+            response.headers[name] = value
+    return response
+
+@app.errorhandler(query_timeout.QueryTimeout)
+def query_timed_out(e):
+    """
+    Answers 504 when a request's queries run past its deadline.
+    """
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    app.extensions["metrics"].observe_guard(route, "timed_out")
+    return api_error(GatewayTimeout(str(e)))
+
+@app.errorhandler(search_guard.RejectedSearch)
+def search_rejected(e):
+    """
+    Answers 400 for search text the API will not run (pages show the
+    reason next to the search box instead).
+    """
+    return api_error(BadRequest(str(e)))
+
+@app.errorhandler(db_pool.PoolTimeout)
+def pool_exhausted(e):
+    """
+    Answers 503 when every database connection stays busy for too long,
+    asking the client to retry shortly.
+    """
+    return api_error(ServiceUnavailable(str(e), retry_after=1))
+
+@app.errorhandler(write_queue.WriteQueueFull)
+def write_queue_full(e):
+    """
+    Answers 503 when the write queue is full, asking the client to retry
+    shortly.
+    """
+    return api_error(ServiceUnavailable(str(e), retry_after=1))
+
+@app.errorhandler(write_queue.WriterStopped)
+def writer_stopped(e):
+    """
+    Answers 503 when the writer stopped while the write was queued; the
+    next write starts a new one.
+    """
+    return api_error(ServiceUnavailable(str(e), retry_after=1))
+
+@app.route(f"{api.API_PREFIX}/stats")
+def api_main_page():
+    """
+    JSON version of the home page statistics.
+    """
+    return api_response(load_main_page)
+
+@app.route(f"{api.API_PREFIX}/albums")
+def api_albums():
+    """
+    JSON version of /albums.
+    """
+    return api_response(load_albums)
+
+@app.route(f"{api.API_PREFIX}/songs")
+def api_songs():
+    """
+    JSON version of /songs.
+    """
+    return api_response(load_songs)
+
+@app.route(f"{api.API_PREFIX}/search")
+def api_search():
+    """
+    JSON version of /search.
+    """
+    return api_response(load_search)
+
+@app.route(f"{api.API_PREFIX}/typeahead")
+def api_typeahead():
+    """
+    Title suggestions for a search box, taking the last word of 'q' as
+    a prefix. 'limit' caps the number of suggestions.
+    """
+    def suggest():
+        limit = clamp_limit(request.args.get("limit", title_index.TYPEAHEAD_LIMIT, type=int))
+        text = request.args.get("q", "")[:search_guard.MAX_QUERY_LENGTH]
+        return {"suggestions": get_title_index().suggest(text, limit)}
+    return api_response(suggest)
+
+@app.route(f"{api.API_PREFIX}/person_search")
+def api_person_search():
+    """
+    JSON version of /person_search.
+    """
+    return api_response(load_person_search)
+
+@app.route(f"{api.API_PREFIX}/lyrics_search")
+def api_lyrics_search():
+    """
+    JSON version of /lyrics_search.
+    """
+    return api_response(load_lyrics_search)
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>")
+def api_song(song_id):
+    """
+    JSON version of /song/<id>.
+    """
+    return api_response(lambda: load_song(song_id))
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>/similar")
+def api_similar_songs(song_id):
+    """
+    JSON version of /song/<id>/similar.
+    """
+    return api_response(lambda: load_similar_songs(song_id))
+
+def check_write_token():
+    """
+    Lets a write through only with the bearer token in WRITE_API_TOKEN;
+    answers 403 while the write API is disabled.
+    """
+    token = app.config["WRITE_API_TOKEN"]
+    if not token:
+        abort(403, "The write API is disabled: set WRITE_API_TOKEN")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401, "A valid 'Authorization: Bearer <token>' header is required")
+
+def write_body(song_id):
+    """
+    The JSON object sent to a write endpoint, parsed as an import record
+    of the song (see importer.parse_record), and the fields it gave.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, "Send a JSON object")
+    try:
+        return importer.parse_record({**body, "song_id": song_id}), body.keys()
+    except (TypeError, ValueError) as e:
+        abort(400, f"Invalid song record: {e}")
+
+def submit_write(write, *args):
+    """
+    Queues 'write' for the writer thread and answers with its result once
+    committed (201 when it created the song), or with 202 when 'wait=0'
+    is given or the commit takes longer than WRITE_TIMEOUT. Writes naming
+    an unknown song get 404.
+    """
+    future = get_write_queue().submit(write, *args)
+    if request.args.get("wait", "1").lower() in ("0", "false", "no"):
+        return jsonify({"queued": True}), 202
+    try:
+        result = future.result(app.config["WRITE_TIMEOUT"])
+    except concurrent.futures.TimeoutError:
+        return jsonify({"queued": True}), 202
+    except LookupError as e:
+        abort(404, str(e))
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Error writing to the database: {e}"}), 500
+    return jsonify(result), 201 if result.get("created") else 200
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>", methods=["PUT"])
+def api_put_song(song_id):
+    """
+    Adds a song, or replaces every field of one, from a JSON record in
+    the import format (see importer.parse_record).
+    """
+    check_write_token()
+    record, _ = write_body(song_id)
+    return submit_write(song_writes.upsert_song, record)
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>/views", methods=["POST"])
+def api_song_views(song_id):
+    """
+    Sets a song's view count ({"views": n}) or adds to it ({"add": n}).
+    """
+    check_write_token()
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or ("views" in body) == ("add" in body):
+        abort(400, 'Send a JSON object with either "views" or "add"')
+    value = body.get("views", body.get("add"))
+    if not isinstance(value, int) or isinstance(value, bool) or ("views" in body and value < 0):
+        abort(400, '"views" must be a whole number of at least 0, "add" a whole number')
+    return submit_write(song_writes.set_views, song_id, body.get("views"), body.get("add"))
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>/credits", methods=["PUT"])
+def api_song_credits(song_id):
+    """
+    Replaces the people credited on a song in the roles given
+    ({"producers": [...], "artists": [...], "writers": [...]}).
+    """
+    check_write_token()
+    record, fields = write_body(song_id)
+    roles = [column for column in importer.ROLE_COLUMNS if column in fields]
+    if not roles:
+        abort(400, f"Give at least one of {', '.join(importer.ROLE_COLUMNS)}")
+    return submit_write(song_writes.replace_credits, song_id, {column: record[column] for column in roles})
+
+@app.route(f"{api.API_PREFIX}/songs/<int:song_id>/tags", methods=["PUT"])
+def api_song_tags(song_id):
+    """
+    Replaces a song's tags ({"tags": [...]}).
+    """
+    check_write_token()
+    record, fields = write_body(song_id)
+    if "tags" not in fields:
+        abort(400, 'Give the song\'s tags as "tags"')
+    return submit_write(song_writes.replace_tags, song_id, record["tags"])
+
+def graph_limit():
+    """
+    The 'limit' query argument of the graph endpoints, clamped like a page size.
+    """
+    return clamp_limit(request.args.get("limit", collaboration_graph.DEFAULT_LIMIT, type=int))
+
+def graph_lookup(answer):
+    """
+    Runs 'answer(graph)' with a 404 when it names a person the graph does
+    not know.
+    """
+    graph = get_collaboration_graph()
+    try:
+        return answer(graph)
+    except KeyError as e:
+        abort(404, f"There is no person {e.args[0]}")
+
+@app.route(f"{api.API_PREFIX}/people/<int:person_id>/collaborators")
+def api_collaborators(person_id):
+    """
+    The people who share the most songs with a person, in any role.
+    'limit' caps their number.
+    """
+    return api_response(lambda: graph_lookup(lambda graph: {
+        "person": graph.person(graph.node(person_id)),
+        "centrality": round(graph.centrality(person_id), 6),
+        "collaborators": graph.top_collaborators(person_id, graph_limit()),
+    }))
+
+@app.route(f"{api.API_PREFIX}/people/<int:person_id>/path/<int:other_id>")
+def api_collaboration_path(person_id, other_id):
+    """
+    The shortest chain of collaborations between two people ("path" is
+    null when there is none).
+    """
+    return api_response(lambda: graph_lookup(lambda graph: {
+        "path": graph.shortest_path(person_id, other_id),
+    }))
+
+@app.route(f"{api.API_PREFIX}/people/central")
+def api_central_people():
+    """
+    The people who worked with the most others (degree centrality).
+    'limit' caps their number.
+    """
+    return api_response(lambda: {"people": get_collaboration_graph().most_central(graph_limit())})
+
+def analytics_dimension(dimension):
+    """
+    Checks the dimension named in an analytics URL, with a 404 for an
+    unknown one.
+    """
+    if dimension not in analytics.DIMENSIONS:
+        abort(404, f"Unknown dimension {dimension!r}: use {', '.join(analytics.DIMENSIONS)}")
+    return dimension
+
+@app.route(f"{api.API_PREFIX}/analytics/top_songs")
+def api_analytics_top_songs():
+    """
+    The most viewed songs. 'limit' caps their number.
+    """
+    return api_response(lambda: {
+        "songs": get_analytics().top_songs(clamp_limit(request.args.get("limit", type=int))),
+    })
+
+@app.route(f"{api.API_PREFIX}/analytics/<dimension>")
+def api_analytics(dimension):
+    """
+    Songs grouped by album, category, year or tag, with one aggregate of
+    their views per group ('agg': count, sum, mean, min, max, median or
+    p0 to p100; sum by default), highest first. 'limit' caps the groups.
+    """
+    def group_by():
+        aggregate = request.args.get("agg", "sum")
+        try:
+            analytics.parse_aggregate(aggregate)
+        except ValueError as e:
+            abort(400, str(e))
+        limit = clamp_limit(request.args.get("limit", type=int))
+        groups = get_analytics().group_by(analytics_dimension(dimension), aggregate, limit)
+        return {"dimension": dimension, "aggregate": aggregate, "groups": groups}
+    return api_response(group_by)
+
+@app.route(f"{api.API_PREFIX}/analytics/<dimension>/distribution")
+def api_analytics_distribution(dimension):
+    """
+    View percentiles of every group of a dimension, in group order (e.g.
+    year by year). Each 'p' argument (0 to 100) adds a percentile; the
+    default is the minimum, quartiles and maximum. 'limit' caps the groups.
+    """
+    def distribution():
+        try:
+            percentiles = [analytics.parse_percentile(p) for p in request.args.getlist("p")]
+        except ValueError as e:
+            abort(400, str(e))
+        percentiles = percentiles or analytics.DEFAULT_PERCENTILES
+        limit = clamp_limit(request.args.get("limit", type=int))
+        groups = get_analytics().distribution(analytics_dimension(dimension), percentiles, limit)
+        return {"dimension": dimension, "groups": groups}
+    return api_response(distribution)
+
+@app.route(f"{api.API_PREFIX}/questions")
+def api_questions():
+    """
+    JSON version of /questions.
+    """
+    return api_response(load_questions)
+
+@app.route(f"{api.API_PREFIX}/questions/<int:question_id>")
+def api_question(question_id):
+    """
+    JSON version of /questions/<id>.
+    """
+    return api_response(lambda: load_question(question_id))
+
+
+def load_templates():
+    """
+    Compiles every template once at startup so no request pays for it.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+load_templates()
+
+
+if __name__ == "__main__":
+
+    app.run(debug=True)
@@ -0,0 +1,264 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import sys
+
+from app import app
+import api
+import query_timeout
+
+
+# Threads running requests, each with at most one pooled connection at a
+# time (by default as many as the pool has connections)
+app.config["ASYNC_WORKERS"] = int(os.environ.get("ASYNC_WORKERS", app.config["DB_POOL_SIZE"] or 8))
+# Requests allowed to wait for a free worker; any more are turned away with 503
+app.config["ASYNC_QUEUE_SIZE"] = int(os.environ.get("ASYNC_QUEUE_SIZE", 64))
+
+# Extra seconds a worker gets to finish after its deadline (SQLite stops
+# at the deadline, template rendering does not) before the client is
+# answered 504 without it
+TIMEOUT_GRACE = 1.0
+
+
+def wsgi_environ(scope, body):
+    """
+    Builds the WSGI environ of an ASGI HTTP request.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+        elif f"HTTP_{name}" in environ:
+            environ[f"HTTP_{name}"] += "," + value
+        else:
+            environ[f"HTTP_{name}"] = value
+    return environ
+
+
+def run_wsgi(wsgi_app, environ, emit):
+    """
+    Calls the WSGI app in a worker thread and hands its response to 'emit'
+    as it is produced: (status code, headers) once, then each chunk of the
+    body, so streamed pages reach the client chunk by chunk.
+    """
+    deadline = environ.get(query_timeout.ENVIRON_KEY)
+    if deadline is not None and deadline.expired():
+        # Waited in the queue for the whole budget
+        status, headers, body = error_response(environ["PATH_INFO"], 504,
+                                               "The server took too long to start this request")
+        emit((status, headers))
+        emit(body)
+        return
+
+    # Status and headers not sent yet
+    pending = []
+
+    def send(chunk):
+        # The headers go out with the first chunk, when start_response has
+        # been called even by an app that delays it
+        if pending:
+            emit(pending.pop())
+        if chunk:
+            emit(chunk)
+
+    def start_response(status, headers, exc_info=None):
+        pending[:] = [(int(status.split()[0]), headers)]
+        return send
+
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            send(chunk)
+        send(b"")
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+
+def error_response(path, status, message, headers=()):
+    """
+    A response produced by the server itself: JSON for the API, plain
+    text otherwise.
+    """
+    if path.startswith(api.API_PREFIX + "/"):
+        body = json.dumps({"error": message}).encode()
+        content_type = "application/json"
+    else:
+        body = message.encode()
+        content_type = "text/plain; charset=utf-8"
+    return status, [("Content-Type", content_type), ("Content-Length", str(len(body))), *headers], body
+
+
+class AsyncApp:
+    """
+    ASGI application serving the Flask app from an event loop.
+
+    The views stay synchronous: each request is handed to a bounded pool of
+    worker threads, so the loop keeps accepting connections while queries
+    run. At most 'queue_size' requests wait for a worker; any more are
+    answered 503 at once. Each request gets a Deadline of 'timeout' seconds
+    from its arrival, which interrupts its SQLite statements (through a
+    progress handler) and answers 504 when it passes before the response
+    has started. Responses are sent as the worker produces them, so
+    streamed pages keep their early first byte.
+    """
+
+    def __init__(self, wsgi_app, workers=8, queue_size=64, timeout=10.0):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            response = error_response(scope["path"], 503, "Server busy, try again shortly",
+                                      [("Retry-After", "1")])
+            await self.send_response(send, *response)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        environ = wsgi_environ(scope, body)
+        deadline = None
+        if self.timeout > 0:
+            deadline = environ[query_timeout.ENVIRON_KEY] = query_timeout.Deadline(self.timeout)
+
+        # The slot is held until the worker is done, even when the client
+        # has already been answered 504
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def emit(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        future = loop.run_in_executor(self._executor, run_wsgi, self.wsgi_app, environ, emit)
+        future.add_done_callback(self._finished)
+        # Queued after everything the worker emitted: the end of the body
+        future.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            wait = None if deadline is None else self.timeout + TIMEOUT_GRACE
+            start = await asyncio.wait_for(events.get(), wait)
+        except asyncio.TimeoutError:
+            deadline.cancel()
+            self.timed_out += 1
+            await self.send_response(send, *error_response(scope["path"], 504, "The request took too long"))
+            return
+        if start is None:
+            # The app raised before starting its response
+            future.result()
+            raise RuntimeError("The WSGI app returned without starting a response")
+        await self.stream_response(send, start, events, future)
+
+    def _finished(self, future):
+        self.in_flight -= 1
+
+    @staticmethod
+    async def send_start(send, status, headers):
+        """
+        Sends the status and headers of a response.
+        """
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+
+    async def send_response(self, send, status, headers, body):
+        """
+        Sends a complete response.
+        """
+        await self.send_start(send, status, headers)
+        await send({"type": "http.response.body", "body": body})
+
+    async def stream_response(self, send, start, events, future):
+        """
+        Sends a response as the worker produces it, one body message per
+        chunk. Once the status is sent, a request running past its
+        deadline can no longer be answered 504: its statements are still
+        interrupted, and the body ends where the app stopped.
+        """
+        await self.send_start(send, *start)
+        while True:
+            chunk = await events.get()
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        # Lets the server drop the connection on a body cut short by an error
+        future.result()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def lifespan(self, receive, send):
+        """
+        Answers the server's startup and shutdown events, stopping the
+        workers on shutdown.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def stats(self):
+        """
+        Returns the server counters.
+        """
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+# Served with any ASGI server, e.g. 'uvicorn asgi:application'
+application = AsyncApp(
+    app,
+    workers=app.config["ASYNC_WORKERS"],
+    queue_size=app.config["ASYNC_QUEUE_SIZE"],
+    timeout=app.config["REQUEST_TIMEOUT"],
+)
+app.extensions["asgi"] = application
@@ -0,0 +1,123 @@
+"""
+Compares SQL aggregates with the NumPy analytics snapshot (analytics.py)
+on a synthetic catalog (see catalog.py): group-bys over albums,
+categories, years and tags, a top-N and per-group percentiles. The SQL
+runs over the base tables, as a new question would without a summary
+table; the Q&A page's summary-table queries are listed too where one
+exists. Needs NumPy ('pip install numpy').
+
+Usage: python benchmarks/bench_analytics.py [scale] [repeat]
+"""
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, SOURCE_DATABASE, time_call
+
+import analytics
+
+
+# Percentile of the views of each group's songs, in SQL: rank the songs
+# within their group and interpolate between the two closest ranks
+_PERCENTILE_SQL = """
+    WITH Ranked AS (
+        SELECT {key} AS key, views,
+               ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY views) - 1 AS position,
+               COUNT(*) OVER (PARTITION BY {key}) AS songs
+        FROM {source}
+    )
+    SELECT key, AVG(views) FROM Ranked
+    WHERE position IN (CAST((songs - 1) * {fraction} AS INTEGER),
+                       CAST((songs - 1) * {fraction} + 0.999999 AS INTEGER))
+    GROUP BY key
+"""
+
+_TAGGED = "Descricoes d JOIN Musicas m ON m.song_id = d.song_id"
+_CATEGORIZED = "Musicas m JOIN Albuns a ON a.album_id = m.album_id"
+
+# (question, SQL over the base tables, summary-table SQL or None,
+#  the same question asked of the snapshot)
+QUESTIONS = [
+    ("views per album",
+     "SELECT album_id, SUM(views) FROM Musicas GROUP BY album_id ORDER BY 2 DESC",
+     "SELECT album_id, total_views FROM ResumoAlbuns ORDER BY 2 DESC",
+     lambda snapshot: snapshot.group_by("album", "sum")),
+    ("average views per album",
+     "SELECT album_id, AVG(views) FROM Musicas GROUP BY album_id ORDER BY 2 DESC",
+     "SELECT album_id, total_views * 1.0 / song_count FROM ResumoAlbuns WHERE song_count > 0 ORDER BY 2 DESC",
+     lambda snapshot: snapshot.group_by("album", "mean")),
+    ("views per category",
+     f"SELECT a.category, SUM(m.views) FROM {_CATEGORIZED} GROUP BY a.category ORDER BY 2 DESC",
+     "SELECT category, total_views FROM ResumoCategorias ORDER BY 2 DESC",
+     lambda snapshot: snapshot.group_by("category", "sum")),
+    ("songs per tag",
+     "SELECT tag_id, COUNT(*) FROM Descricoes GROUP BY tag_id ORDER BY 2 DESC",
+     "SELECT tag_id, song_count FROM ResumoTags ORDER BY 2 DESC",
+     lambda snapshot: snapshot.group_by("tag", "count")),
+    ("max views per tag",
+     f"SELECT d.tag_id, MAX(m.views) FROM {_TAGGED} GROUP BY d.tag_id ORDER BY 2 DESC",
+     None,
+     lambda snapshot: snapshot.group_by("tag", "max")),
+    ("top 10 songs",
+     "SELECT song_id, song_title, views FROM Musicas ORDER BY views DESC, song_id LIMIT 10",
+     None,
+     lambda snapshot: snapshot.top_songs(10)),
+    ("median views per year",
+     _PERCENTILE_SQL.format(key="substr(release_date, 1, 4)", source="Musicas", fraction=0.5),
+     None,
+     lambda snapshot: snapshot.group_by("year", "median")),
+    ("p90 views per album",
+     _PERCENTILE_SQL.format(key="album_id", source="Musicas", fraction=0.9),
+     None,
+     lambda snapshot: snapshot.group_by("album", "p90")),
+    ("p90 views per tag",
+     _PERCENTILE_SQL.format(key="d.tag_id", source=_TAGGED, fraction=0.9),
+     None,
+     lambda snapshot: snapshot.group_by("tag", "p90")),
+    ("view quartiles per year",
+     " UNION ALL ".join(
+         "SELECT * FROM (" + _PERCENTILE_SQL.format(key="substr(release_date, 1, 4)", source="Musicas",
+                                                    fraction=fraction) + ")"
+         for fraction in (0, 0.25, 0.5, 0.75, 1)
+     ),
+     None,
+     lambda snapshot: snapshot.distribution("year")),
+]
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    if not analytics.available():
+        sys.exit("The analytics snapshot needs NumPy: pip install numpy")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        if scale == 1:
+            shutil.copyfile(SOURCE_DATABASE, path)
+        else:
+            subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "catalog.py"), str(scale), path],
+                           check=True, stdout=subprocess.DEVNULL)
+        db = sqlite3.connect(path)
+        start = time.perf_counter()
+        snapshot = analytics.AnalyticsSnapshot.build(db)
+        stats = snapshot.stats()
+        print(f"Snapshot of {stats['songs']} songs ({scale}x): {stats['bytes'] / 2**20:.1f} MiB, "
+              f"built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        print(f"{'question':<26}{'SQL ms':>9}{'summary ms':>12}{'NumPy ms':>10}{'speed-up':>10}")
+        for question, sql, summary_sql, ask in QUESTIONS:
+            base = time_call(lambda: db.execute(sql).fetchall(), repeat)["p50"]
+            summary = time_call(lambda: db.execute(summary_sql).fetchall(), repeat)["p50"] if summary_sql else None
+            vectorized = time_call(lambda: ask(snapshot), repeat)["p50"]
+            summary_text = f"{summary:>12.3f}" if summary is not None else f"{'-':>12}"
+            print(f"{question:<26}{base:>9.3f}{summary_text}{vectorized:>10.3f}{base / vectorized:>9.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the bulk importer on a synthetic catalog written to JSON Lines:
+throughput in rows per second and the peak memory of the process.
+
+Usage: python benchmarks/bench_import.py [songs] [batch size]
+"""
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import SOURCE_DATABASE
+
+import importer
+
+
+PEOPLE = 10_000
+TAGS = 500
+SONGS_PER_ALBUM = 15
+
+
+def write_catalog(path, songs, seed=0):
+    """
+    Writes 'songs' synthetic records, reusing the real lyrics in turn.
+    """
+    rng = random.Random(seed)
+    source = sqlite3.connect(SOURCE_DATABASE)
+    lyrics = [row[0] for row in source.execute("SELECT song_lyrics FROM Letras")]
+    source.close()
+    with open(path, "w", encoding="utf-8") as file:
+        for song_id in range(1, songs + 1):
+            album = (song_id - 1) // SONGS_PER_ALBUM
+            file.write(json.dumps({
+                "song_id": song_id,
+                "song_title": f"Song {song_id}",
+                "views": rng.randrange(10_000_000),
+                "date": f"{rng.randrange(1, 29):02d}/{rng.randrange(1, 13):02d}/{rng.randrange(2006, 2025)}",
+                "song_url": f"https://example.com/songs/{song_id}",
+                "album_title": f"Album {album}",
+                "album_url": f"https://example.com/albums/{album}",
+                "category": f"Category {album % 12}",
+                "track_number": (song_id - 1) % SONGS_PER_ALBUM + 1,
+                "lyrics": lyrics[song_id % len(lyrics)],
+                "producers": [f"Person {rng.randrange(PEOPLE)}" for _ in range(2)],
+                "artists": [f"Person {rng.randrange(PEOPLE)}"],
+                "writers": [f"Person {rng.randrange(PEOPLE)}" for _ in range(2)],
+                "tags": [f"Tag {rng.randrange(TAGS)}" for _ in range(8)],
+            }) + "\n")
+
+
+def main():
+    songs = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else importer.DEFAULT_BATCH_SIZE
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "catalog.jsonl")
+        start = time.perf_counter()
+        write_catalog(source, songs)
+        print(f"Catalog: {songs} songs, {os.path.getsize(source) / 2**20:.0f} MiB, "
+              f"written in {time.perf_counter() - start:.1f} s")
+
+        path = os.path.join(tmp, "import.db")
+        conn = importer.open_for_import(path)
+        last_report = [0.0]
+
+        def progress(records, rows, seconds):
+            if seconds - last_report[0] >= 10:
+                last_report[0] = seconds
+                print(f"  {records} records, {rows / seconds:.0f} rows/s")
+
+        report = importer.import_catalog(conn, source, batch_size, progress=progress)
+        conn.close()
+        rows = sum(report.rows.values())
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Imported {rows} rows in {report.seconds:.1f} s ({rows / report.seconds:.0f} rows/s, "
+              f"indexes, triggers and summaries rebuilt included)")
+        print(f"Database: {os.path.getsize(path) / 2**20:.0f} MiB; peak RSS {peak_rss:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
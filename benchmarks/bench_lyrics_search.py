@@ -0,0 +1,50 @@
+"""
+Compares the old LIKE scan over Letras with the FTS5 lyrics index.
+
+Usage: python benchmarks/bench_lyrics_search.py [scale]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+from common import scaled_copy, time_call
+
+import lyrics_index
+import migrations
+
+
+QUERIES = ["love", "shake it off", "midnight", "\"blank space\"", "forev*"]
+
+
+def like_search(db, query):
+    pattern = query.strip('"').rstrip("*")
+    return db.execute("""
+        SELECT Musicas.song_title, Musicas.song_url, Letras.song_lyrics
+        FROM Musicas
+        JOIN Letras ON Musicas.song_id = Letras.lyrics_id
+        WHERE Letras.song_lyrics LIKE ?
+    """, (f"%{pattern}%",)).fetchall()
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        path = scaled_copy(os.path.join(tmp, "bench.db"), scale)
+        migrations.migrate(path)
+        db = sqlite3.connect(path)
+        db.row_factory = sqlite3.Row
+        songs = db.execute("SELECT COUNT(*) FROM Letras").fetchone()[0]
+        print(f"Corpus: {songs} lyrics ({scale}x)")
+        print(f"{'query':<16}{'LIKE ms':>10}{'FTS ms':>10}{'LIKE rows':>11}{'FTS rows':>10}")
+        for query in QUERIES:
+            like = time_call(lambda: like_search(db, query), repeat=5)
+            fts = time_call(lambda: lyrics_index.search_lyrics(db, query, limit=50), repeat=5)
+            like_rows = len(like_search(db, query))
+            fts_rows = len(lyrics_index.search_lyrics(db, query, limit=50).rows)
+            print(f"{query:<16}{like['p50']:>10.2f}{fts['p50']:>10.2f}{like_rows:>11}{fts_rows:>10}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the plain-text lyrics layout with compressed lyrics (zlib, and
+zstd when installed): database size, lyrics search and lyric reads.
+
+Usage: python benchmarks/bench_lyrics_storage.py [scale]
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import scaled_copy, time_call
+
+import lyrics_index
+import lyrics_storage
+import migrations
+
+
+QUERIES = ["love", "shake it off", "\"blank space\"", "forev*"]
+
+
+def convert(path, codec):
+    """
+    Compresses the lyrics of the database at 'path' with 'codec' and
+    compacts it. Returns the storage report.
+    """
+    conn = sqlite3.connect(path)
+    with conn:
+        report = lyrics_storage.compress_lyrics(conn, codec)
+        lyrics_index.recreate_index(conn)
+    conn.execute("VACUUM")
+    conn.close()
+    return report
+
+
+def measure(path):
+    """
+    Size of the database and p50 latencies (ms) of the searches, of
+    reading one lyric and of reading them all.
+    """
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    lyrics_id = db.execute("SELECT rowid FROM LetrasFTS WHERE LetrasFTS MATCH 'love' LIMIT 1").fetchone()[0]
+    result = {"size": os.path.getsize(path), **lyrics_storage.storage_stats(db)}
+    for query in QUERIES:
+        result[query] = time_call(lambda: lyrics_index.search_lyrics(db, query, limit=50), repeat=10)["p50"]
+    result["read one"] = time_call(lambda: lyrics_storage.read_lyrics(db, [lyrics_id]), repeat=50)["p50"]
+    result["read all"] = time_call(lambda: sum(1 for _ in lyrics_storage.iter_lyrics(db)), repeat=3)["p50"]
+    db.close()
+    return result
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = scaled_copy(os.path.join(tmp, "plain.db"), scale)
+        migrations.migrate(plain)
+        conn = sqlite3.connect(plain)
+        conn.execute("VACUUM")
+        conn.close()
+        layouts = {"plain": measure(plain)}
+        for codec in reversed(lyrics_storage.available_codecs()):
+            path = os.path.join(tmp, f"{codec}.db")
+            shutil.copyfile(plain, path)
+            start = time.perf_counter()
+            report = convert(path, codec)
+            conn, reference = sqlite3.connect(path), sqlite3.connect(plain)
+            problems = lyrics_storage.verify_lyrics(conn, reference)
+            conn.close()
+            reference.close()
+            print(f"{codec}: {report.rows} lyrics compressed in {time.perf_counter() - start:.1f} s, "
+                  f"{report.text_bytes / max(report.stored_bytes, 1):.2f}x, {len(problems)} round-trip problems")
+            layouts[codec] = measure(path)
+
+        print(f"Corpus: {layouts['plain']['rows']} lyrics ({scale}x)")
+        print(f"{'':<16}" + "".join(f"{name:>12}" for name in layouts))
+        for label, key, unit in [("database", "size", 2**20), ("lyrics", "stored_bytes", 2**20),
+                                 ("dictionary", "dictionary_bytes", 2**10)]:
+            suffix = "MiB" if unit == 2**20 else "KiB"
+            print(f"{label + ' ' + suffix:<16}" + "".join(f"{layout[key] / unit:>12.2f}" for layout in layouts.values()))
+        for key in QUERIES + ["read one", "read all"]:
+            print(f"{key + ' ms':<16}" + "".join(f"{layout[key]:>12.3f}" for layout in layouts.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares the old person search (three fan-out joins per request) with the
+person-credit query on synthetic catalogs of growing size.
+
+Usage: python benchmarks/bench_person_search.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+
+from common import SOURCE_DATABASE, time_call
+
+import migrations
+import person_credits
+
+
+# (people, credits) per run; the last one is the 10k / 100k catalog
+SIZES = [(1000, 10000), (5000, 50000), (10000, 100000)]
+QUERIES = ["Taylor", "Jack", "son", "a"]
+# Page size (and cap on matched people) large enough to return every
+# match, like the old query did
+FULL = 10 ** 6
+
+FIRST_NAMES = ["Jack", "Aaron", "Max", "Shellback", "Liz", "Nathan", "Ryan", "Greg",
+               "Emma", "Lana", "Ed", "Phoebe", "Colbie", "Joni", "Sam", "Ali"]
+LAST_NAMES = ["Antonoff", "Dessner", "Martin", "Rose", "Chapman", "Tedder", "Kurstin",
+              "Johnson", "Sheeran", "Bridgers", "Smith", "Payami", "Bell", "Little"]
+
+ROLE_TABLES = [("Produtores", "producer_id"), ("Artistas", "artist_id"), ("Escritores", "writer_id")]
+
+
+def old_person_search(db, query):
+    """
+    The person search as it was: one fan-out join per role.
+    """
+    results = {}
+    for role, (table, column) in zip(person_credits.ROLES, ROLE_TABLES):
+        results[role] = db.execute(f"""
+            SELECT
+                Musicas.song_title AS song_title,
+                Musicas.song_url AS song_url,
+                GROUP_CONCAT(DISTINCT ArtistasPeople.person) AS artistas,
+                GROUP_CONCAT(DISTINCT EscritoresPeople.person) AS escritores,
+                GROUP_CONCAT(DISTINCT ProdutoresPeople.person) AS produtores
+            FROM Pessoas
+            JOIN {table} AS RoleTable ON Pessoas.person_id = RoleTable.{column}
+            JOIN Musicas ON Musicas.song_id = RoleTable.song_id
+            LEFT JOIN Artistas ON Artistas.song_id = Musicas.song_id
+            LEFT JOIN Escritores ON Escritores.song_id = Musicas.song_id
+            LEFT JOIN Produtores ON Produtores.song_id = Musicas.song_id
+            LEFT JOIN Pessoas AS ArtistasPeople ON Artistas.artist_id = ArtistasPeople.person_id
+            LEFT JOIN Pessoas AS EscritoresPeople ON Escritores.writer_id = EscritoresPeople.person_id
+            LEFT JOIN Pessoas AS ProdutoresPeople ON Produtores.producer_id = ProdutoresPeople.person_id
+            WHERE Pessoas.person LIKE ?
+            GROUP BY Musicas.song_id
+            ORDER BY Musicas.song_title
+        """, (f"%{query}%",)).fetchall()
+    return results
+
+
+def build_catalog(path, people, credits, seed=42):
+    """
+    Builds a catalog with 'people' people and 'credits' role credits spread
+    over credits / 5 songs. A few people get most of the credits, as in
+    the real data.
+    """
+    rng = random.Random(seed)
+    shutil.copyfile(SOURCE_DATABASE, path)
+    conn = sqlite3.connect(path)
+    with conn:
+        for table in ["Produtores", "Artistas", "Escritores", "Descricoes", "Numeros", "Letras", "Musicas", "Pessoas"]:
+            conn.execute(f"DELETE FROM {table}")
+        conn.executemany("INSERT INTO Pessoas (person_id, person) VALUES (?, ?)", (
+            (i, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}") for i in range(1, people + 1)
+        ))
+        songs = credits // 5
+        conn.executemany(
+            "INSERT INTO Musicas (song_id, song_title, views, date, song_url, album_id, lyrics_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((i, f"Song {i}", rng.randint(1000, 5000000), "01/01/2020", f"https://example.com/{i}", rng.randint(1, 56), i)
+             for i in range(1, songs + 1)),
+        )
+        weights = [1 / rank for rank in range(1, people + 1)]
+        pairs = set()
+        while len(pairs) < credits:
+            role = rng.randrange(3)
+            person = rng.choices(range(1, people + 1), weights, k=1)[0]
+            pairs.add((role, rng.randint(1, songs), person))
+        for role, (table, column) in enumerate(ROLE_TABLES):
+            conn.executemany(
+                f"INSERT INTO {table} (song_id, {column}) VALUES (?, ?)",
+                ((song, person) for r, song, person in pairs if r == role),
+            )
+    conn.close()
+    migrations.migrate(path)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'people':>7}{'credits':>9}  {'query':<8}{'old ms':>10}{'new ms':>10}{'rows':>7}")
+        for people, credits in SIZES:
+            path = os.path.join(tmp, f"people_{people}.db")
+            build_catalog(path, people, credits)
+            db = sqlite3.connect(path)
+            db.row_factory = sqlite3.Row
+            for query in QUERIES:
+                old = time_call(lambda: old_person_search(db, query), repeat=3)
+                new = time_call(lambda: person_credits.find_person_credits(db, query, limit=FULL, max_people=FULL),
+                                repeat=3)
+                pages, _ = person_credits.find_person_credits(db, query, limit=FULL, max_people=FULL)
+                rows = sum(len(page.rows) for page in pages.values())
+                print(f"{people:>7}{credits:>9}  {query:<8}{old['p50']:>10.1f}{new['p50']:>10.1f}{rows:>7}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
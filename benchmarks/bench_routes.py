@@ -0,0 +1,330 @@
+"""
+Benchmarks every route of the app on a synthetic catalog (see catalog.py)
+and prints the results as JSON, so runs can be saved and compared across
+commits:
+
+- "sequential": each sample URL requested one at a time through the Flask
+  test client, with latency percentiles (ms) per route;
+- "concurrent": clients requesting every sample URL in turn from a
+  threaded server, with the throughput and latency percentiles per route;
+- "peak_rss_mib": peak memory of the process serving the requests (the
+  catalog is generated in a separate process).
+
+The query-result cache and the Q&A answer cache are off unless --cache is
+given, so every request reaches SQLite. With --in-memory the app serves
+from an in-memory copy of the catalog (see memory_snapshot.py); the
+result then also reports how long the copy took to load and its size.
+
+Usage: python benchmarks/bench_routes.py [scale] [--database PATH] [--repeat N]
+           [--seconds N] [--clients N] [--cache] [--in-memory] [--output FILE]
+       python benchmarks/bench_routes.py --compare BEFORE.json AFTER.json
+"""
+import argparse
+import http.client
+from importlib import metadata
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from common import ROOT, SOURCE_DATABASE, percentiles
+
+from werkzeug.serving import make_server
+
+import analytics
+from app import app
+import question_registry
+
+
+# Sample requests of each endpoint; the {fields} are filled in from the
+# catalog being measured. Every GET endpoint of the app must be listed here
+# (the write API is measured by stress_writes.py).
+SAMPLES = {
+    "main_page": ["/"],
+    "list_albums": ["/albums", "/albums?after={albums_after}"],
+    "list_songs": ["/songs", "/songs?after={songs_after}", "/songs?from=2019-01-01&to=2020-12-31"],
+    "search": ["/search?q={title_word}", "/search?q=love"],
+    "person_search": ["/person_search?q={person}"],
+    "lyrics_search": ["/lyrics_search?q=love", "/lyrics_search?q={lyrics_phrase}"],
+    "song": ["/song/{song_id}"],
+    "similar_songs_page": ["/song/{song_id}/similar"],
+    "questions": ["/questions"],
+    "question": ["/questions/1"],
+    "cache_stats": ["/cache_stats"],
+    "prometheus_metrics": ["/metrics"],
+    "api_main_page": ["/api/v1/stats"],
+    "api_albums": ["/api/v1/albums"],
+    "api_songs": ["/api/v1/songs", "/api/v1/songs?after={songs_after}"],
+    "api_search": ["/api/v1/search?q={title_word}"],
+    "api_typeahead": ["/api/v1/typeahead?q={title_prefix}"],
+    "api_person_search": ["/api/v1/person_search?q={person}"],
+    "api_lyrics_search": ["/api/v1/lyrics_search?q=love"],
+    "api_song": ["/api/v1/songs/{song_id}"],
+    "api_similar_songs": ["/api/v1/songs/{song_id}/similar"],
+    "api_collaborators": ["/api/v1/people/{person_id}/collaborators"],
+    "api_collaboration_path": ["/api/v1/people/{person_id}/path/{other_person_id}"],
+    "api_central_people": ["/api/v1/people/central"],
+    "api_analytics_top_songs": ["/api/v1/analytics/top_songs"],
+    "api_analytics": ["/api/v1/analytics/album", "/api/v1/analytics/tag?agg=p90"],
+    "api_analytics_distribution": ["/api/v1/analytics/year/distribution"],
+    "api_questions": ["/api/v1/questions"],
+    "api_question": ["/api/v1/questions/1"],
+    "static": ["/static/taytay.jpg"],
+    "asset": ["/assets/{stylesheet}"],
+}
+
+
+def sample_values(path, client):
+    """
+    Picks search terms that occur in the catalog (its most credited
+    person, most common title word and a lyrics line), its most viewed
+    song, its most and least credited writers, the cursors of the second
+    page of the listings and the fingerprinted name of the stylesheet.
+    """
+    conn = sqlite3.connect(path)
+    people = conn.execute("""
+        SELECT p.person_id, p.person FROM Pessoas p JOIN Escritores e ON e.writer_id = p.person_id
+        GROUP BY p.person_id ORDER BY COUNT(*) DESC, p.person_id
+    """).fetchall()
+    (person_id, person), other_person_id = people[0], people[-1][0]
+    words = {}
+    for (title,) in conn.execute("SELECT song_title FROM Musicas"):
+        for word in (title or "").lower().split():
+            if len(word) > 3 and word.isalpha():
+                words[word] = words.get(word, 0) + 1
+    title_word = max(words, key=words.get)
+    song_id = conn.execute("SELECT song_id FROM Musicas ORDER BY views DESC LIMIT 1").fetchone()[0]
+    lyrics = conn.execute("SELECT song_lyrics FROM Letras WHERE LENGTH(song_lyrics) > 0 LIMIT 1").fetchone()[0]
+    conn.close()
+    return {
+        "person": person.split()[0],
+        "person_id": str(person_id),
+        "other_person_id": str(other_person_id),
+        "title_word": title_word,
+        "title_prefix": title_word[:3],
+        "song_id": str(song_id),
+        "lyrics_phrase": " ".join([word for word in lyrics.split() if word.isalpha()][:3]),
+        "albums_after": client.get("/api/v1/albums").json["albums"]["next_cursor"] or "",
+        "songs_after": client.get("/api/v1/songs").json["songs"]["next_cursor"] or "",
+        "stylesheet": app.extensions["assets"].url_name("vendor/bootstrap/bootstrap.min.css"),
+    }
+
+
+def sample_urls(values):
+    """
+    Returns (endpoint, URL) pairs for every sample request, failing when
+    a GET endpoint of the app has no samples. The analytics endpoints are
+    left out when NumPy is not installed.
+    """
+    missing = sorted({rule.endpoint for rule in app.url_map.iter_rules() if "GET" in rule.methods} - SAMPLES.keys())
+    if missing:
+        sys.exit(f"No sample requests for: {', '.join(missing)}")
+    quoted = {name: quote(value) for name, value in values.items()}
+    return [(endpoint, url.format(**quoted)) for endpoint, urls in SAMPLES.items() for url in urls
+            if analytics.available() or not endpoint.startswith("api_analytics")]
+
+
+def summarize(latencies):
+    """
+    Percentiles (ms) per endpoint from a dict of endpoint -> seconds.
+    """
+    result = {}
+    for endpoint, samples in sorted(latencies.items()):
+        stats = percentiles([seconds * 1000 for seconds in samples])
+        result[endpoint] = {"requests": len(samples), **{name: round(value, 3) for name, value in stats.items()}}
+    return result
+
+
+def run_sequential(client, urls, repeat):
+    """
+    Requests every URL 'repeat' times through the test client.
+    """
+    latencies = {}
+    for endpoint, url in urls:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def run_concurrent(urls, seconds, clients):
+    """
+    Requests the URLs in turn from 'clients' threads against a threaded
+    server for 'seconds'.
+    """
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def client(number):
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        i = number
+        while time.monotonic() < deadline:
+            endpoint, url = urls[i % len(urls)]
+            start = time.perf_counter()
+            conn.request("GET", url)
+            response = conn.getresponse()
+            response.read()
+            latencies[number].append((endpoint, time.perf_counter() - start))
+            if response.status >= 400:
+                errors[number] += 1
+            i += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for client_thread in threads:
+        client_thread.start()
+    for client_thread in threads:
+        client_thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    by_endpoint = {}
+    for samples in latencies:
+        for endpoint, latency in samples:
+            by_endpoint.setdefault(endpoint, []).append(latency)
+    total = sum(len(samples) for samples in latencies)
+    return {
+        "clients": clients,
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(errors),
+        "throughput": round(total / elapsed, 1),
+        "routes": summarize(by_endpoint),
+    }
+
+
+def commit():
+    """
+    The commit being measured, marked "-dirty" when the tree has changes.
+    """
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ("-dirty" if dirty else "")
+
+
+def benchmark(path, args):
+    """
+    Runs both benchmarks against the database at 'path'.
+    """
+    app.config.update(DATABASE=path, IN_MEMORY=args.in_memory)
+    if not args.cache:
+        app.config.update(RESULT_CACHE_SIZE=0)
+        registry = app.extensions["questions"]
+        app.extensions["questions"] = question_registry.QuestionRegistry(
+            [question._replace(ttl=0) for question in registry.questions.values()], registry.workers
+        )
+
+    client = app.test_client()
+    urls = sample_urls(sample_values(path, client))
+    for endpoint, url in urls:  # warm-up, and every sample must succeed
+        status = client.get(url).status_code
+        if status != 200:
+            sys.exit(f"{url} answered {status}")
+
+    conn = sqlite3.connect(path)
+    rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("Musicas", "Albuns", "Pessoas", "Letras", "Descricoes",
+                          "Produtores", "Artistas", "Escritores")}
+    conn.close()
+    return {
+        "commit": commit(),
+        "scale": args.scale,
+        "database_mib": round(os.path.getsize(path) / 2**20, 1),
+        "rows": rows,
+        "settings": {"repeat": args.repeat, "seconds": args.seconds, "clients": args.clients,
+                     "cache": args.cache, "in_memory": args.in_memory,
+                     "pool_size": app.config["DB_POOL_SIZE"]},
+        "versions": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                     "flask": metadata.version("flask")},
+        "sequential": run_sequential(client, urls, args.repeat),
+        "concurrent": run_concurrent(urls, args.seconds, args.clients),
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "memory_snapshot": app.extensions["memory_snapshot"].stats() if args.in_memory else None,
+    }
+
+
+def compare(before_path, after_path):
+    """
+    Prints the p50/p95 of every route in two saved results side by side.
+    """
+    with open(before_path) as file:
+        before = json.load(file)
+    with open(after_path) as file:
+        after = json.load(file)
+    print(f"before {before['commit']} ({before['scale']}x), after {after['commit']} ({after['scale']}x)")
+    for mode in ("sequential", "concurrent"):
+        old = before[mode] if mode == "sequential" else before[mode]["routes"]
+        new = after[mode] if mode == "sequential" else after[mode]["routes"]
+        print(f"\n{mode:<22}{'p50 before':>11}{'p50 after':>11}{'p95 before':>12}{'p95 after':>11}{'p50 ratio':>11}")
+        for endpoint in sorted(old.keys() | new.keys()):
+            if endpoint not in old or endpoint not in new:
+                print(f"{endpoint:<22}{'(only in one run)':>34}")
+                continue
+            ratio = new[endpoint]["p50"] / old[endpoint]["p50"] if old[endpoint]["p50"] else float("nan")
+            print(f"{endpoint:<22}{old[endpoint]['p50']:>11.2f}{new[endpoint]['p50']:>11.2f}"
+                  f"{old[endpoint]['p95']:>12.2f}{new[endpoint]['p95']:>11.2f}{ratio:>10.2f}x")
+    print(f"\nthroughput {before['concurrent']['throughput']} -> {after['concurrent']['throughput']} req/s, "
+          f"peak RSS {before['peak_rss_mib']} -> {after['peak_rss_mib']} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every route on a synthetic catalog.")
+    parser.add_argument("scale", nargs="?", type=int, default=10,
+                        help="catalog size as a multiple of dbfinal.db (1 uses dbfinal.db itself)")
+    parser.add_argument("--database", help="catalog generated earlier by catalog.py, used in place")
+    parser.add_argument("--repeat", type=int, default=20, help="sequential requests per sample URL")
+    parser.add_argument("--seconds", type=float, default=10, help="length of the concurrent run")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--cache", action="store_true", help="keep the result and Q&A caches on")
+    parser.add_argument("--in-memory", action="store_true", help="serve from an in-memory copy of the catalog")
+    parser.add_argument("--output", help="write the JSON here instead of to stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved results")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.database
+        if path is None:
+            path = os.path.join(tmp, "bench.db")
+            if args.scale == 1:
+                shutil.copyfile(SOURCE_DATABASE, path)
+            else:
+                # A separate process, so the peak RSS is that of the app alone
+                subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "catalog.py"),
+                                str(args.scale), path], check=True, stdout=subprocess.DEVNULL)
+        result = benchmark(path, args)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Render time per route: compiling the template source on every call (what
+render_template_string did) versus the precompiled, cached templates.
+
+Usage: python benchmarks/bench_templates.py
+"""
+import os
+import shutil
+import tempfile
+
+from flask import render_template, render_template_string, template_rendered
+
+from common import SOURCE_DATABASE, time_call
+
+from app import app
+
+
+ROUTES = [
+    "/",
+    "/albums",
+    "/songs",
+    "/search?q=love",
+    "/person_search?q=Jack",
+    "/lyrics_search?q=midnight",
+    "/questions",
+]
+
+
+def capture_contexts(client):
+    """
+    Requests every route once and records the template and context it rendered.
+    """
+    captured = {}
+
+    def record(sender, template, context, **extra):
+        captured[current] = (template.name, dict(context))
+
+    template_rendered.connect(record, app)
+    try:
+        for current in ROUTES:
+            client.get(current).get_data()
+    finally:
+        template_rendered.disconnect(record, app)
+    return captured
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(SOURCE_DATABASE, path)
+        app.config.update(DATABASE=path)
+        contexts = capture_contexts(app.test_client())
+
+    print(f"{'route':<28}{'compile each call ms':>22}{'cached ms':>12}")
+    for route, (name, context) in contexts.items():
+        source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+        with app.test_request_context(route):
+            before = time_call(lambda: render_template_string(source, **context), repeat=50)
+            after = time_call(lambda: render_template(name, **context), repeat=50)
+        print(f"{route:<28}{before['p50']:>22.3f}{after['p50']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the old LIKE title search with the trigram title index, and
+measures typeahead latency one keystroke at a time.
+
+Usage: python benchmarks/bench_title_search.py [scale]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import scaled_copy, time_call
+
+import migrations
+from title_index import TitleIndex
+
+
+QUERIES = ["love", "fearless tv", "shake it of", "evermore", "all too well"]
+
+# Typeahead answers should stay under this many milliseconds at p99
+TYPEAHEAD_TARGET_MS = 5
+
+
+def like_search(db, query):
+    songs = db.execute("SELECT song_title, song_url FROM Musicas WHERE song_title LIKE ? ORDER BY song_id LIMIT 51",
+                       (f"%{query}%",)).fetchall()
+    albums = db.execute("SELECT album_title, album_url FROM Albuns WHERE album_title LIKE ? ORDER BY album_id LIMIT 51",
+                        (f"%{query}%",)).fetchall()
+    return songs, albums
+
+
+def index_search(index, query):
+    return index.search(query, "song", limit=50), index.search(query, "album", limit=50)
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        path = scaled_copy(os.path.join(tmp, "bench.db"), scale)
+        migrations.migrate(path)
+        db = sqlite3.connect(path)
+        start = time.perf_counter()
+        index = TitleIndex.build(db)
+        print(f"Index: {len(index.titles)} titles ({scale}x), built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        print(f"{'query':<16}{'LIKE ms':>10}{'index ms':>10}{'LIKE rows':>11}{'index rows':>12}")
+        for query in QUERIES:
+            like = time_call(lambda: like_search(db, query), repeat=10)
+            fuzzy = time_call(lambda: index_search(index, query), repeat=10)
+            like_rows = sum(len(rows) for rows in like_search(db, query))
+            index_rows = sum(len(page.rows) for page in index_search(index, query))
+            print(f"{query:<16}{like['p50']:>10.2f}{fuzzy['p50']:>10.2f}{like_rows:>11}{index_rows:>12}")
+
+        # Every prefix of every query, as typed
+        prefixes = [query[:end] for query in QUERIES for end in range(1, len(query) + 1)]
+        samples = iter(prefixes * 5)
+        typeahead = time_call(lambda: index.suggest(next(samples)), repeat=len(prefixes) * 5)
+        verdict = "ok" if typeahead["p99"] <= TYPEAHEAD_TARGET_MS else "over target"
+        print(f"Typeahead over {len(prefixes)} prefixes: p50 {typeahead['p50']:.2f} ms, "
+              f"p95 {typeahead['p95']:.2f} ms, p99 {typeahead['p99']:.2f} ms "
+              f"(target {TYPEAHEAD_TARGET_MS} ms: {verdict})")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
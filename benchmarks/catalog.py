@@ -0,0 +1,206 @@
+"""
+Generates a synthetic catalog shaped like dbfinal.db at a multiple of its
+size (songs, albums, people, credits and lyrics) and loads it with the
+bulk importer, so benchmarks can run against a realistic amount of data.
+
+The real catalog is the model for everything: album sizes and categories,
+views, dates, titles, names, tags, the number of credits of each song and
+the lines of its lyrics are all sampled from it. Popularity is skewed the
+way it is in real catalogs: a few people and tags get most of the credits
+(a Zipf distribution), and views have a long tail.
+
+Usage: python benchmarks/catalog.py <scale> <database> [seed]
+"""
+from collections import Counter, namedtuple
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import SOURCE_DATABASE
+
+import importer
+
+
+# Scale factors the route benchmark is usually run at
+SCALES = (10, 100, 1000)
+
+# Exponent of the Zipf distribution of credits over people and of
+# descriptions over tags; about 1 in published music catalogs
+ZIPF_EXPONENT = 1.1
+
+# Share of the songs that reuse the title of the song they are modelled
+# on (re-recordings, live versions, covers); the rest get new titles
+REUSED_TITLES = 0.5
+
+# Share of the lines of each lyric taken from another song
+MIXED_LINES = 0.3
+
+# What the generator learns from the real catalog
+Profile = namedtuple("Profile", [
+    "albums", "songs", "people", "tags", "title_words", "lines", "song_count",
+])
+
+# One real album (title, category, song ids in track order) and one real song
+ModelAlbum = namedtuple("ModelAlbum", ["title", "category", "songs"])
+ModelSong = namedtuple("ModelSong", ["title", "views", "date", "lines", "credits", "tags"])
+
+
+def read_profile(source=SOURCE_DATABASE):
+    """
+    Reads the shape of the real catalog.
+    """
+    conn = sqlite3.connect(source)
+    credits = {}
+    for role, (table, column) in importer.ROLE_COLUMNS.items():
+        for song_id, count in conn.execute(f"SELECT song_id, COUNT(*) FROM {table} GROUP BY song_id"):
+            credits.setdefault(song_id, {})[role] = count
+    tags = dict(conn.execute("SELECT song_id, COUNT(*) FROM Descricoes GROUP BY song_id"))
+
+    songs = {}
+    lines = []
+    for song_id, title, views, date, lyrics in conn.execute("""
+        SELECT m.song_id, m.song_title, m.views, m.date, l.song_lyrics
+        FROM Musicas m LEFT JOIN Letras l ON l.lyrics_id = m.lyrics_id
+    """):
+        song_lines = [line for line in (lyrics or "").splitlines() if line.strip()]
+        lines += song_lines
+        songs[song_id] = ModelSong(title, views or 0, date, song_lines,
+                                   credits.get(song_id, {}), tags.get(song_id, 0))
+
+    albums = []
+    for album_id, title, category in conn.execute("SELECT album_id, album_title, category FROM Albuns"):
+        album_songs = [song_id for (song_id,) in conn.execute(
+            "SELECT song_id FROM Musicas WHERE album_id = ? ORDER BY song_id", (album_id,)
+        )]
+        if album_songs:
+            albums.append(ModelAlbum(title, category, album_songs))
+
+    people = [name for (name,) in conn.execute("SELECT person FROM Pessoas ORDER BY person_id")]
+    tag_names = [name for (name,) in conn.execute("SELECT tag FROM Tags ORDER BY tag_id")]
+    conn.close()
+    words = sorted({word.strip("()[]") for song in songs.values() for word in (song.title or "").split()} - {""})
+    return Profile(albums, songs, people, tag_names, words, lines, len(songs))
+
+
+def person_names(profile, count, rng):
+    """
+    Returns 'count' distinct names: the real ones first, then first and
+    last names of real people recombined, with a middle initial once the
+    combinations run out.
+    """
+    names = list(dict.fromkeys(profile.people))[:count]
+    first = sorted({name.split()[0] for name in profile.people})
+    last = sorted({name.split()[-1] for name in profile.people if len(name.split()) > 1})
+    pairs = list(itertools.product(first, last))
+    rng.shuffle(pairs)
+    seen = set(names)
+    for initial in [""] + [f" {letter}." for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]:
+        for given, family in pairs:
+            if len(names) >= count:
+                return names
+            name = f"{given}{initial} {family}"
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+    return names
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """
+    Cumulative weights for random.choices() giving the item at rank r a
+    probability proportional to 1 / r ** exponent.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def records(profile, scale, seed=0):
+    """
+    Yields importer records for about 'scale' times as many songs as the
+    real catalog, album by album.
+    """
+    rng = random.Random(seed)
+    people = person_names(profile, len(profile.people) * scale, rng)
+    rng.shuffle(people)
+    people_weights = zipf_weights(len(people))
+    tags = list(profile.tags)
+    rng.shuffle(tags)
+    tag_weights = zipf_weights(len(tags))
+
+    def pick(names, weights, count):
+        chosen = set()
+        while len(chosen) < min(count, len(names)):
+            chosen.update(rng.choices(names, cum_weights=weights, k=count - len(chosen)))
+        return sorted(chosen)
+
+    song_id = 0
+    copies = Counter()
+    while song_id < profile.song_count * scale:
+        album = rng.choice(profile.albums)
+        copies[album.title] += 1
+        title = album.title
+        if copies[album.title] > 1 and title != importer.NO_ALBUM:
+            title = f"{album.title} ({copies[album.title]})"
+        album_url = f"https://example.com/albums/{len(copies)}-{copies[album.title]}"
+        for number, model_id in enumerate(album.songs, 1):
+            song_id += 1
+            model = profile.songs[model_id]
+            if rng.random() < REUSED_TITLES and model.title:
+                song_title = model.title
+            else:
+                song_title = " ".join(rng.sample(profile.title_words, rng.randint(1, 4)))
+            lyrics = [rng.choice(profile.lines) if rng.random() < MIXED_LINES else line
+                      for line in model.lines]
+            yield {
+                "song_id": song_id,
+                "song_title": song_title,
+                "views": int(model.views * rng.lognormvariate(0, 1)),
+                "date": model.date,
+                "song_url": f"https://example.com/songs/{song_id}",
+                "album_title": title,
+                "album_url": album_url,
+                "category": album.category,
+                "track_number": number,
+                "lyrics": "\n".join(lyrics),
+                **{role: pick(people, people_weights, model.credits.get(role, 0))
+                   for role in importer.ROLE_COLUMNS},
+                "tags": pick(tags, tag_weights, model.tags),
+            }
+
+
+def generate(path, scale, seed=0, source=SOURCE_DATABASE):
+    """
+    Builds a database at 'path' with a synthetic catalog 'scale' times the
+    size of the real one. Returns the row count of each table.
+    """
+    profile = read_profile(source)
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = os.path.join(tmp, "catalog.jsonl")
+        with open(catalog, "w", encoding="utf-8") as file:
+            for record in records(profile, scale, seed):
+                file.write(json.dumps(record) + "\n")
+        conn = importer.open_for_import(path)
+        report = importer.import_catalog(conn, catalog)
+        conn.close()
+    return report.rows
+
+
+def main():
+    scale = int(sys.argv[1])
+    path = sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    if os.path.exists(path):
+        sys.exit(f"{path} already exists")
+    start = time.perf_counter()
+    rows = generate(path, scale, seed)
+    print(f"{scale}x catalog written to {path} in {time.perf_counter() - start:.1f} s")
+    for table, count in rows.items():
+        print(f"  {table:<12}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+
+# Let the scripts import the app modules when run as
+# 'python benchmarks/<script>.py' from the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SOURCE_DATABASE = os.path.join(ROOT, "dbfinal.db")
+
+# Tables keyed by song that are duplicated when scaling the catalog up
+SONG_TABLES = {
+    "Produtores": "producer_id",
+    "Artistas": "artist_id",
+    "Escritores": "writer_id",
+    "Descricoes": "tag_id",
+}
+
+
+def scaled_copy(dest, factor, source=SOURCE_DATABASE):
+    """
+    Copies the database to 'dest' with every song (and its lyrics, credits,
+    tags and track numbers) repeated 'factor' times under new ids.
+    Albums, people and tags are shared by all the copies.
+    """
+    shutil.copyfile(source, dest)
+    conn = sqlite3.connect(dest)
+    with conn:
+        max_id = conn.execute("SELECT MAX(song_id) FROM Musicas").fetchone()[0]
+        for copy in range(1, factor):
+            offset = copy * max_id
+            conn.execute("""
+                INSERT INTO Musicas (song_id, song_title, views, date, song_url, album_id, lyrics_id)
+                SELECT song_id + ?, song_title, views, date, song_url, album_id, lyrics_id + ?
+                FROM Musicas WHERE song_id <= ?
+            """, (offset, offset, max_id))
+            conn.execute("""
+                INSERT INTO Letras (lyrics_id, song_lyrics)
+                SELECT lyrics_id + ?, song_lyrics FROM Letras WHERE lyrics_id <= ?
+            """, (offset, max_id))
+            conn.execute("""
+                INSERT INTO Numeros (song_id, album_id, number)
+                SELECT song_id + ?, album_id, number FROM Numeros WHERE song_id <= ?
+            """, (offset, max_id))
+            for table, column in SONG_TABLES.items():
+                conn.execute(f"""
+                    INSERT INTO {table} (song_id, {column})
+                    SELECT song_id + ?, {column} FROM {table} WHERE song_id <= ?
+                """, (offset, max_id))
+    conn.close()
+    return dest
+
+
+def percentiles(samples):
+    """
+    Returns the mean and percentiles of a list of latencies.
+    """
+    samples = sorted(samples)
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def time_call(function, repeat=20):
+    """
+    Calls 'function' 'repeat' times and returns latency stats in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
@@ -0,0 +1,91 @@
+"""
+Measures requests/sec of the read routes under a threaded WSGI server,
+with one connection per request (pool size 0, the old behaviour) and
+with the connection pool. The result cache is disabled so every request
+reaches SQLite.
+
+Usage: python benchmarks/load_test.py [seconds] [clients] [pool size]
+"""
+import http.client
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from common import SOURCE_DATABASE
+
+from app import app
+
+
+PATHS = [
+    "/",
+    "/albums",
+    "/songs",
+    "/search?q=love",
+    "/person_search?q=Jack",
+    "/lyrics_search?q=midnight",
+    "/questions",
+]
+
+
+def run_clients(port, seconds, clients):
+    """
+    Hammers the server from 'clients' threads, returning completed requests.
+    """
+    done = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def client(number):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        i = number
+        while time.monotonic() < deadline:
+            conn.request("GET", PATHS[i % len(PATHS)])
+            conn.getresponse().read()
+            done[number] += 1
+            i += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done)
+
+
+def measure(path, pool_size, seconds, clients):
+    app.config.update(DATABASE=path, DB_POOL_SIZE=pool_size, RESULT_CACHE_SIZE=0)
+    app.extensions.pop("db_pool", None)
+    app.extensions.pop("result_cache", None)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        run_clients(server.port, 1, clients)  # warm-up
+        return run_clients(server.port, seconds, clients) / seconds
+    finally:
+        server.shutdown()
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(SOURCE_DATABASE, path)
+        before = measure(path, 0, seconds, clients)
+        after = measure(path, pool_size, seconds, clients)
+    print(f"{clients} clients, {seconds:.0f}s per run")
+    print(f"connection per request: {before:8.1f} req/s")
+    print(f"pool of {pool_size:<15} {after:8.1f} req/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
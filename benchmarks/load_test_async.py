@@ -0,0 +1,151 @@
+"""
+Tail latency under 200 concurrent clients: the threaded WSGI server (one
+thread per connection, all of them queueing for the connection pool)
+against the ASGI mode (asgi.py under uvicorn: a bounded set of workers,
+503 when the queue is full, 504 when a request runs out of time).
+
+Both serve the same synthetic catalog (see catalog.py) with the result
+cache off. Each client sends one request per connection, in a loop,
+cycling through the read routes. Needs uvicorn ('pip install uvicorn').
+
+Usage: python benchmarks/load_test_async.py [scale] [seconds] [clients]
+"""
+import asyncio
+import importlib.util
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, SOURCE_DATABASE, percentiles
+
+
+PATHS = [
+    "/",
+    "/albums",
+    "/songs",
+    "/search?q=love",
+    "/person_search?q=Jack",
+    "/lyrics_search?q=midnight",
+    "/questions",
+    "/api/v1/songs",
+    "/api/v1/lyrics_search?q=love",
+]
+
+# Seconds a client waits for a response before counting it as failed
+CLIENT_TIMEOUT = 30
+
+SERVERS = {
+    "threaded WSGI": ["-c", "import sys; from werkzeug.serving import run_simple; from app import app; "
+                            "run_simple('127.0.0.1', int(sys.argv[1]), app, threaded=True)"],
+    "ASGI (uvicorn)": ["-m", "uvicorn", "asgi:application", "--host", "127.0.0.1",
+                       "--log-level", "warning", "--no-access-log", "--port"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port, database):
+    """
+    Starts a server process and waits until it accepts connections.
+    """
+    env = dict(os.environ, DATABASE=database, RESULT_CACHE_SIZE="0")
+    process = subprocess.Popen([sys.executable, *args, str(port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit("The server did not start")
+
+
+async def fetch(port, path):
+    """
+    Sends one request on a new connection and returns the status code.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def run_clients(port, seconds, clients):
+    """
+    Runs 'clients' concurrent clients for 'seconds', returning a list of
+    (status, seconds) with status None for failed requests.
+    """
+    results = []
+    deadline = time.monotonic() + seconds
+
+    async def client(number):
+        i = number
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(port, PATHS[i % len(PATHS)]), CLIENT_TIMEOUT)
+            except (OSError, IndexError, ValueError, asyncio.TimeoutError):
+                status = None
+            results.append((status, time.perf_counter() - start))
+            i += 1
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return results
+
+
+def report(name, results, seconds):
+    counts = {}
+    for status, _ in results:
+        counts[status] = counts.get(status, 0) + 1
+    everything = percentiles([latency * 1000 for _, latency in results])
+    ok = [latency * 1000 for status, latency in results if status == 200]
+    ok_p99 = f"{percentiles(ok)['p99']:>9.0f}" if ok else f"{'-':>9}"
+    print(f"{name:<16}{len(results) / seconds:>8.1f}{counts.get(200, 0):>7}{counts.get(503, 0):>6}"
+          f"{counts.get(504, 0):>6}{counts.get(None, 0):>7}{everything['p50']:>8.0f}{everything['p95']:>8.0f}"
+          f"{everything['p99']:>8.0f}{max(latency for _, latency in results) * 1000:>9.0f}{ok_p99}")
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    if importlib.util.find_spec("uvicorn") is None:
+        sys.exit("The ASGI run needs uvicorn: pip install uvicorn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        if scale == 1:
+            shutil.copyfile(SOURCE_DATABASE, path)
+        else:
+            subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "catalog.py"), str(scale), path],
+                           check=True, stdout=subprocess.DEVNULL)
+        print(f"{clients} clients for {seconds:.0f}s per server, {scale}x catalog; latencies in ms")
+        print(f"{'server':<16}{'req/s':>8}{'200':>7}{'503':>6}{'504':>6}{'failed':>7}"
+              f"{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}{'p99 200':>9}")
+        for name, args in SERVERS.items():
+            port = free_port()
+            process = start_server(args, port, path)
+            try:
+                asyncio.run(run_clients(port, 2, 8))  # warm-up
+                results = asyncio.run(run_clients(port, seconds, clients))
+            finally:
+                process.terminate()
+                process.wait()
+            report(name, results, seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Stress test of the write API (see write_queue.py): read traffic on /songs
+and /questions, first alone and then while clients flood the write queue
+with view-count updates, most of them on a few hot songs.
+
+Reports the read latencies of both runs, the write throughput, latency
+and rejections, and the sizes of the transactions the writer committed.
+It then checks that nothing was lost or torn:
+
+- every song's views grew by exactly the sum of its acknowledged updates;
+- a reader comparing the songs' views with the album summaries (kept by
+  triggers, see summaries.py) in one statement never saw them disagree;
+- the summary tables and the song credits read model match a fresh
+  recomputation.
+
+The query-result cache and the Q&A answer cache are off unless --cache is
+given, so every read reaches SQLite.
+
+Usage: python benchmarks/stress_writes.py [scale] [--seconds N] [--readers N]
+           [--writers N] [--batch-size N] [--queue-size N] [--cache]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from common import percentiles, scaled_copy
+
+from werkzeug.serving import make_server
+
+import app as app_module
+from app import app
+import db_pool
+import question_registry
+import song_credits
+import summaries
+
+
+READ_PATHS = ["/songs", "/songs?from=2019-01-01&to=2020-12-31", "/questions"]
+
+TOKEN = "stress-test"
+
+# Share of the view updates going to the hot songs, and how many songs are hot
+HOT_SHARE = 0.8
+HOT_SONGS = 20
+
+# Seconds between two snapshot checks
+CHECK_INTERVAL = 0.005
+
+# Difference between the songs' views and the album summaries, in one statement
+TORN_CHECK = "SELECT (SELECT SUM(views) FROM Musicas) - (SELECT SUM(total_views) FROM ResumoAlbuns)"
+
+
+def run_readers(port, readers, stop, latencies):
+    """
+    Starts 'readers' threads requesting READ_PATHS in turn until 'stop'
+    is set, appending (path, seconds, status) to 'latencies'.
+    """
+    def reader(number):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        i = number
+        while not stop.is_set():
+            path = READ_PATHS[i % len(READ_PATHS)]
+            start = time.perf_counter()
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            latencies.append((path, time.perf_counter() - start, response.status))
+            i += 1
+        conn.close()
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_writers(port, writers, stop, song_ids, results):
+    """
+    Starts 'writers' threads adding views to songs until 'stop' is set.
+    Each acknowledged update is appended to results["added"] as (song_id,
+    views added, seconds); rejected ones (503) are counted.
+    """
+    hot = song_ids[:HOT_SONGS]
+    headers = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+
+    def writer(number):
+        rng = random.Random(number)
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while not stop.is_set():
+            song_id = rng.choice(hot) if rng.random() < HOT_SHARE else rng.choice(song_ids)
+            add = rng.randint(1, 5)
+            start = time.perf_counter()
+            conn.request("POST", f"/api/v1/songs/{song_id}/views", json.dumps({"add": add}), headers)
+            response = conn.getresponse()
+            response.read()
+            seconds = time.perf_counter() - start
+            if response.status == 200:
+                results["added"].append((song_id, add, seconds))
+            elif response.status == 503:
+                results["rejected"] += 1
+                time.sleep(0.01)
+            else:
+                results["errors"].append(response.status)
+        conn.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def watch_snapshots(path, stop, checks):
+    """
+    Runs TORN_CHECK on a read-only connection until 'stop' is set,
+    counting the checks and those that saw a difference.
+    """
+    conn = db_pool.connect_readonly(path)
+    while not stop.is_set():
+        checks["runs"] += 1
+        if conn.execute(TORN_CHECK).fetchone()[0] != 0:
+            checks["torn"] += 1
+        time.sleep(CHECK_INTERVAL)
+    conn.close()
+
+
+def phase(port, path, args, song_ids=None):
+    """
+    Runs the readers (and the writers, given 'song_ids') for
+    args.seconds; returns the read latencies, write results, snapshot
+    checks and elapsed seconds.
+    """
+    stop = threading.Event()
+    latencies = []
+    results = {"added": [], "rejected": 0, "errors": []}
+    checks = {"runs": 0, "torn": 0}
+    threads = run_readers(port, args.readers, stop, latencies)
+    if song_ids is not None:
+        threads += run_writers(port, args.writers, stop, song_ids, results)
+        threads.append(threading.Thread(target=watch_snapshots, args=(path, stop, checks)))
+        threads[-1].start()
+    start = time.perf_counter()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, results, checks, time.perf_counter() - start
+
+
+def read_report(label, latencies, seconds):
+    """
+    Prints the throughput and latency percentiles (ms) of each read path.
+    """
+    print(f"{label}: {len(latencies) / seconds:.1f} reads/s, "
+          f"{sum(status != 200 for _, _, status in latencies)} errors")
+    for path in READ_PATHS:
+        samples = [seconds * 1000 for read_path, seconds, _ in latencies if read_path == path]
+        if samples:
+            stats = percentiles(samples)
+            print(f"  {path:<40} {len(samples):>7}  p50 {stats['p50']:8.2f}  p99 {stats['p99']:8.2f} ms")
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser(description="Stress test of the write queue under read traffic")
+    parser.add_argument("scale", nargs="?", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=app.config["WRITE_BATCH_SIZE"])
+    parser.add_argument("--queue-size", type=int, default=app.config["WRITE_QUEUE_SIZE"])
+    parser.add_argument("--cache", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = scaled_copy(os.path.join(tmp, "stress.db"), args.scale)
+        app.config.update(DATABASE=path, WRITE_API_TOKEN=TOKEN, WRITE_BATCH_SIZE=args.batch_size,
+                          WRITE_QUEUE_SIZE=args.queue_size)
+        if not args.cache:
+            app.config.update(RESULT_CACHE_SIZE=0)
+            registry = app.extensions["questions"]
+            app.extensions["questions"] = question_registry.QuestionRegistry(
+                [question._replace(ttl=0) for question in registry.questions.values()], registry.workers
+            )
+
+        # Every transaction's size and seconds, next to the metrics the app records
+        batches = []
+        writer = app_module.get_write_queue()
+        observe = writer.on_batch
+
+        def on_batch(size, failed, latencies, seconds):
+            batches.append((size, seconds))
+            observe(size, failed, latencies, seconds)
+        writer.on_batch = on_batch
+
+        conn = sqlite3.connect(path)
+        song_ids = [song_id for (song_id,) in conn.execute("SELECT song_id FROM Musicas ORDER BY views DESC")]
+        views_before = dict(conn.execute("SELECT song_id, views FROM Musicas"))
+        conn.close()
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            phase(server.port, path, argparse.Namespace(**{**vars(args), "seconds": 1}))  # warm-up
+            reads_alone, _, _, seconds_alone = phase(server.port, path, args)
+            reads_mixed, results, checks, seconds_mixed = phase(server.port, path, args, song_ids)
+        finally:
+            server.shutdown()
+        writer.close()
+
+        print(f"Catalog: {len(song_ids)} songs ({args.scale}x), {args.readers} readers, {args.writers} writers, "
+              f"{args.seconds:.0f}s per run, batches of up to {args.batch_size}, "
+              f"cache {'on' if args.cache else 'off'}")
+        read_report("reads alone", reads_alone, seconds_alone)
+        read_report("reads under writes", reads_mixed, seconds_mixed)
+
+        added = results["added"]
+        write_ms = percentiles([seconds * 1000 for _, _, seconds in added]) if added else None
+        print(f"writes: {len(added) / seconds_mixed:.1f} acknowledged/s, {results['rejected']} rejected (503), "
+              f"{len(results['errors'])} errors"
+              + (f", p50 {write_ms['p50']:.2f} p99 {write_ms['p99']:.2f} ms" if write_ms else ""))
+        if batches:
+            sizes = percentiles([size for size, _ in batches])
+            busy = sum(seconds for _, seconds in batches)
+            print(f"transactions: {len(batches)}, writes per transaction mean {sizes['mean']:.1f} "
+                  f"p50 {sizes['p50']} p99 {sizes['p99']} max {max(size for size, _ in batches)}, "
+                  f"writer busy {busy / seconds_mixed:.0%} of the time")
+
+        expected = dict(views_before)
+        for song_id, add, _ in added:
+            expected[song_id] += add
+        conn = sqlite3.connect(path)
+        views_after = dict(conn.execute("SELECT song_id, views FROM Musicas"))
+        lost = sum(1 for song_id, views in expected.items() if views_after[song_id] != views)
+        problems = summaries.check_summaries(conn) + song_credits.check_credits(conn)
+        conn.close()
+        print(f"views: {sum(views_after.values()) - sum(views_before.values())} added, "
+              f"{sum(add for _, add, _ in added)} acknowledged, {lost} songs off")
+        print(f"snapshots: {checks['runs']} checks, {checks['torn']} saw a partial write")
+        print(f"read models: {len(problems)} problems")
+        if lost or checks["torn"] or problems or results["errors"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
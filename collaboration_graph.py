@@ -0,0 +1,180 @@
+from array import array
+from collections import Counter
+from itertools import groupby
+import time
+
+
+# Collaborators and central people returned when no limit is given
+DEFAULT_LIMIT = 10
+
+# Every (song, person) credit, whatever the role, each pair once
+CREDITS_QUERY = """
+    SELECT song_id, producer_id FROM Produtores
+    UNION SELECT song_id, artist_id FROM Artistas
+    UNION SELECT song_id, writer_id FROM Escritores
+    ORDER BY 1, 2
+"""
+
+PEOPLE_QUERY = "SELECT person_id, person FROM Pessoas ORDER BY person_id"
+
+
+class CollaborationGraph:
+    """
+    In-memory graph of who worked with whom: people are nodes, and two
+    people share an edge when they are credited on the same song (in any
+    role), weighted by the number of songs they share.
+
+    Adjacency is stored in compressed sparse row form: the neighbours of
+    node i are neighbours[offsets[i]:offsets[i + 1]], with the matching
+    shared-song counts in 'weights', sorted by weight (heaviest first).
+    Nodes are numbered in person_id order. Like the title index, the graph
+    is tagged with the database version it was built from.
+    """
+
+    def __init__(self, person_ids, names, offsets, neighbours, weights, version=None, build_seconds=0.0):
+        self.version = version
+        self.build_seconds = build_seconds
+        self.person_ids = person_ids
+        self.names = names
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.weights = weights
+        self.nodes = {person_id: node for node, person_id in enumerate(person_ids)}
+        # Nodes by degree (most connected first), for the centrality ranking
+        self.ranking = array("i", sorted(range(len(person_ids)), key=lambda node: (-self.degree(node), node)))
+
+    @classmethod
+    def build(cls, db, version=None):
+        """
+        Reads every person and credit from the database and counts the
+        songs each pair of people shares.
+        """
+        start = time.perf_counter()
+        person_ids, names = array("q"), []
+        for person_id, name in db.execute(PEOPLE_QUERY):
+            person_ids.append(person_id)
+            names.append(name)
+        nodes = {person_id: node for node, person_id in enumerate(person_ids)}
+
+        # Pairs are counted once, smaller node first, as a single integer
+        size = len(person_ids)
+        pairs = Counter()
+        for _, credits in groupby(db.execute(CREDITS_QUERY), key=lambda row: row[0]):
+            people = [nodes[person_id] for _, person_id in credits if person_id in nodes]
+            for i, first in enumerate(people):
+                for second in people[i + 1:]:
+                    pairs[first * size + second] += 1
+
+        adjacency = [[] for _ in range(size)]
+        for pair, shared in pairs.items():
+            first, second = divmod(pair, size)
+            adjacency[first].append((-shared, second))
+            adjacency[second].append((-shared, first))
+
+        offsets, neighbours, weights = array("i", [0]), array("i"), array("i")
+        for edges in adjacency:
+            edges.sort()
+            neighbours.extend(node for _, node in edges)
+            weights.extend(-shared for shared, _ in edges)
+            offsets.append(len(neighbours))
+        return cls(person_ids, names, offsets, neighbours, weights, version, time.perf_counter() - start)
+
+    def node(self, person_id):
+        """
+        Returns the node of a person, raising KeyError for an unknown id.
+        """
+        return self.nodes[person_id]
+
+    def degree(self, node):
+        """
+        Number of distinct people the node has worked with.
+        """
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def person(self, node):
+        """
+        The person behind a node, as the API shows it.
+        """
+        return {"person_id": self.person_ids[node], "person": self.names[node]}
+
+    def top_collaborators(self, person_id, limit=DEFAULT_LIMIT):
+        """
+        The people 'person_id' shares the most songs with, most first.
+        """
+        node = self.node(person_id)
+        start = self.offsets[node]
+        end = min(start + limit, self.offsets[node + 1])
+        return [{**self.person(self.neighbours[i]), "shared_songs": self.weights[i]} for i in range(start, end)]
+
+    def shortest_path(self, source_id, target_id):
+        """
+        The shortest chain of collaborations from one person to another,
+        as a list of people (both ends included), or None when they are
+        not connected. Searches from both ends at once, always expanding
+        the smaller frontier.
+        """
+        source, target = self.node(source_id), self.node(target_id)
+        if source == target:
+            return [self.person(source)]
+        # Node -> the node it was reached from, on each side
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            next_frontier = []
+            for node in frontiers[side]:
+                for i in range(self.offsets[node], self.offsets[node + 1]):
+                    neighbour = self.neighbours[i]
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = node
+                    if neighbour in other:
+                        return [self.person(node) for node in self._join(parents, neighbour)]
+                    next_frontier.append(neighbour)
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        return None
+
+    @staticmethod
+    def _join(parents, meeting):
+        """
+        Chains the parents from the source to 'meeting' and on to the target.
+        """
+        path = []
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = parents[0][node]
+        path.reverse()
+        node = parents[1][meeting]
+        while node is not None:
+            path.append(node)
+            node = parents[1][node]
+        return path
+
+    def centrality(self, person_id):
+        """
+        Degree centrality of one person: the share of everyone else they
+        have worked with.
+        """
+        node = self.node(person_id)
+        return self.degree(node) / max(len(self.person_ids) - 1, 1)
+
+    def most_central(self, limit=DEFAULT_LIMIT):
+        """
+        The people with the highest degree centrality, highest first.
+        """
+        others = max(len(self.person_ids) - 1, 1)
+        return [{**self.person(node), "collaborators": self.degree(node),
+                 "centrality": round(self.degree(node) / others, 6)}
+                for node in self.ranking[:limit]]
+
+    def stats(self):
+        """
+        Size of the graph and how long it took to build.
+        """
+        return {
+            "nodes": len(self.person_ids),
+            "edges": len(self.neighbours) // 2,
+            "build_seconds": round(self.build_seconds, 6),
+        }
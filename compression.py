@@ -0,0 +1,188 @@
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: responses are gzipped without it
+    brotli = None
+
+
+# Media types worth compressing; images such as the home page's JPEG are
+# compressed already
+COMPRESSIBLE_TYPES = (
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+)
+
+# Levels for compressing responses as they are sent, cheap enough to pay
+# on every request; static files are compressed once, as hard as possible
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+STATIC_LEVELS = {"br": 11, "gzip": 9}
+
+# A streamed page is flushed to the client after its first chunk (the
+# <head>, so the stylesheet can load) and then every this many bytes
+STREAM_FLUSH_BYTES = 16 * 1024
+
+
+def available_encodings():
+    """
+    Content encodings this server can produce, preferred first.
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compressible(mimetype):
+    """
+    Tells whether responses of a media type are worth compressing.
+    """
+    return mimetype in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encodings, encodings=None):
+    """
+    The encoding to send a client given its Accept-Encoding header (a
+    werkzeug Accept), among 'encodings' (by default all available ones):
+    the one it rates highest, ties going to the one listed first. None
+    when it accepts none of them.
+    """
+    best, best_quality = None, 0
+    for encoding in encodings if encodings is not None else available_encodings():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level):
+    """
+    Compresses a whole body with 'encoding' ('br' or 'gzip').
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return encoder.compress(data) + encoder.flush()
+
+
+class StreamEncoder:
+    """
+    Incremental compressor for a streamed body: 'write' takes the next
+    chunk and returns whatever compressed bytes are ready, 'flush' pushes
+    out everything written so far and 'finish' ends the stream.
+    """
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            self._encoder = brotli.Compressor(quality=level)
+        else:
+            self._encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def write(self, data):
+        if self.encoding == "br":
+            return self._encoder.process(data)
+        return self._encoder.compress(data)
+
+    def flush(self):
+        if self.encoding == "br":
+            return self._encoder.flush()
+        return self._encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._encoder.finish()
+        return self._encoder.flush()
+
+
+class ResponseCompressor:
+    """
+    Compresses HTML, JSON and other text responses for clients that
+    accept gzip or brotli. Whole bodies are compressed when they are at
+    least 'min_size' bytes (a negative size turns compression off);
+    streamed pages are compressed as they are sent.
+    """
+
+    def __init__(self, min_size=1024):
+        self.min_size = min_size
+        self.responses = {encoding: 0 for encoding in ("br", "gzip")}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def apply(self, response, accept_encodings):
+        """
+        Compresses 'response' in place when it qualifies and the client
+        accepts an encoding. Returns the response.
+        """
+        if (self.min_size < 0 or response.status_code != 200 or response.direct_passthrough
+                or "Content-Encoding" in response.headers or not compressible(response.mimetype)):
+            return response
+        # Caches must keep the compressed and plain bodies apart
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.iter_encoded(), response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            compressed = compress(data, encoding, DYNAMIC_LEVELS[encoding])
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+            self._count(encoding, len(data), len(compressed))
+        response.headers["Content-Encoding"] = encoding
+        # The bytes differ from the uncompressed ones, so the tag is weak
+        tag, weak = response.get_etag()
+        if tag is not None and not weak:
+            response.set_etag(tag, weak=True)
+        return response
+
+    def _stream(self, chunks, body, encoding):
+        """
+        Compresses the encoded 'chunks' of a streamed body chunk by chunk,
+        flushing after the first chunk and then every STREAM_FLUSH_BYTES.
+        The original 'body' is closed at the end, as the server would have.
+        """
+        encoder = StreamEncoder(encoding, DYNAMIC_LEVELS[encoding])
+        size = compressed = pending = 0
+        first = True
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                pending += len(chunk)
+                data = encoder.write(chunk)
+                if first or pending >= STREAM_FLUSH_BYTES:
+                    data += encoder.flush()
+                    first, pending = False, 0
+                if data:
+                    compressed += len(data)
+                    yield data
+            data = encoder.finish()
+            compressed += len(data)
+            yield data
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+        self._count(encoding, size, compressed)
+
+    def _count(self, encoding, size, compressed):
+        with self._lock:
+            self.responses[encoding] += 1
+            self.bytes_in += size
+            self.bytes_out += compressed
+
+    def stats(self):
+        """
+        Returns the compression counters.
+        """
+        with self._lock:
+            return {
+                **{f"{encoding}_responses": count for encoding, count in self.responses.items()},
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
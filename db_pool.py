@@ -0,0 +1,183 @@
+from collections import deque
+import os
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection becomes free within the pool timeout.
+    """
+
+
+def enable_wal(path):
+    """
+    Switches the database to WAL journaling so readers never wait on a
+    writer. The setting is stored in the file, so this only needs to
+    succeed once.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
+
+
+def connect_readonly(path, mmap_size=268435456, cache_size=-65536):
+    """
+    Opens a read-only connection tuned for the read routes.
+    'cache_size' follows SQLite's convention: negative values are KiB.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived database connections.
+
+    Connections are opened lazily up to 'size'. An idle connection that has
+    not been used for 'health_check_interval' seconds is checked with a
+    trivial query before being handed out. When the database file is
+    replaced (new inode), every connection opened on the old file is closed
+    instead of being reused. A size of 0 disables pooling: every checkout
+    opens a fresh connection that is closed on return.
+    """
+
+    def __init__(self, path, connect, size=8, timeout=10.0, health_check_interval=30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.recycled = 0
+        self._connect = connect
+        self._available = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._open = 0
+        self._generation = 0
+        self._file_id = self._file_identity()
+
+    def _file_identity(self):
+        info = os.stat(self.path)
+        return (info.st_dev, info.st_ino)
+
+    def _check_file(self):
+        """
+        Retires every connection when the database file has been replaced.
+        """
+        file_id = self._file_identity()
+        if file_id == self._file_id:
+            return
+        with self._available:
+            if file_id == self._file_id:
+                return
+            self._file_id = file_id
+            self._generation += 1
+            while self._idle:
+                conn, _generation, _last_used = self._idle.popleft()
+                conn.close()
+                self._open -= 1
+                self.recycled += 1
+            self._available.notify_all()
+
+    def _healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Checks a connection out of the pool, waiting up to 'timeout' seconds
+        (the pool's timeout by default) for one to be returned when all of
+        them are in use.
+        """
+        self._check_file()
+        if self.size <= 0:
+            return self._connect()
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        conn = None
+        with self._available:
+            while True:
+                if self._idle:
+                    conn, _generation, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection free after {timeout:g}s")
+                self._available.wait(remaining)
+            generation = self._generation
+
+        if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._healthy(conn):
+                conn.close()
+                self.recycled += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._available:
+                    self._open -= 1
+                    self._available.notify()
+                raise
+
+        with self._available:
+            self._in_use[conn] = generation
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool.
+        """
+        if self.size <= 0:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        with self._available:
+            generation = self._in_use.pop(conn, None)
+            if generation == self._generation:
+                self._idle.append((conn, generation, time.monotonic()))
+            else:
+                conn.close()
+                self._open -= 1
+                self.recycled += 1
+            self._available.notify()
+
+    def close_all(self):
+        """
+        Closes the idle connections; checked-out ones are closed on return.
+        """
+        with self._available:
+            self._generation += 1
+            while self._idle:
+                conn, _generation, _last_used = self._idle.popleft()
+                conn.close()
+                self._open -= 1
+
+    def stats(self):
+        """
+        Returns the pool counters.
+        """
+        with self._available:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "recycled": self.recycled,
+                "generation": self._generation,
+            }
@@ -0,0 +1,355 @@
+from collections import namedtuple
+import csv
+from datetime import date
+import json
+import os
+import sqlite3
+import time
+
+import lyrics_index
+import lyrics_storage
+import migrations
+import release_dates
+import song_credits
+import summaries
+
+
+# Records written per transaction (and per checkpoint)
+DEFAULT_BATCH_SIZE = 10_000
+
+# Page cache of the importing connection, in KiB (negative) as in PRAGMA cache_size
+IMPORT_CACHE_SIZE = -64 * 1024
+
+# Separates the names in the list columns of a CSV file
+LIST_SEPARATOR = "|"
+
+# Album given to songs whose record names none
+NO_ALBUM = "Sem Album"
+
+# Role columns of a record and the junction table each one fills
+ROLE_COLUMNS = {
+    "producers": ("Produtores", "producer_id"),
+    "artists": ("Artistas", "artist_id"),
+    "writers": ("Escritores", "writer_id"),
+}
+
+# Tables keyed by song whose rows are replaced when a song is re-imported
+# (a re-imported song's similar songs are left for update-similar-songs)
+SONG_TABLES = ["Produtores", "Artistas", "Escritores", "Descricoes", "Numeros", "MusicasSemelhantes"]
+
+# Base tables, as in dbfinal.db, for importing into a new database (the
+# lyrics table depends on the layout, see lyrics_storage.py)
+BASE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Albuns (album_id INTEGER PRIMARY KEY NOT NULL, album_title TEXT, album_url TEXT, category TEXT);
+    CREATE TABLE IF NOT EXISTS Musicas (song_id INTEGER PRIMARY KEY NOT NULL, song_title TEXT, views INTEGER NOT NULL, date TEXT, song_url TEXT, album_id INTEGER REFERENCES Albuns (album_id) NOT NULL, lyrics_id INTEGER REFERENCES Letras (lyrics_id) NOT NULL);
+    CREATE TABLE IF NOT EXISTS Pessoas (person_id INTEGER PRIMARY KEY NOT NULL, person TEXT);
+    CREATE TABLE IF NOT EXISTS Tags (tag_id INTEGER PRIMARY KEY NOT NULL, tag TEXT);
+    CREATE TABLE IF NOT EXISTS Numeros (album_id INTEGER REFERENCES Albuns (album_id) NOT NULL, song_id INTEGER REFERENCES Musicas (song_id) NOT NULL, number INTEGER NOT NULL, PRIMARY KEY (album_id, song_id));
+    CREATE TABLE IF NOT EXISTS Produtores (song_id INTEGER NOT NULL, producer_id INTEGER NOT NULL, PRIMARY KEY (song_id, producer_id), FOREIGN KEY (song_id) REFERENCES Musicas (song_id), FOREIGN KEY (producer_id) REFERENCES Pessoas (person_id));
+    CREATE TABLE IF NOT EXISTS Artistas (song_id INTEGER NOT NULL, artist_id INTEGER NOT NULL, PRIMARY KEY (song_id, artist_id), FOREIGN KEY (song_id) REFERENCES Musicas (song_id), FOREIGN KEY (artist_id) REFERENCES Pessoas (person_id));
+    CREATE TABLE IF NOT EXISTS Escritores (song_id INTEGER NOT NULL, writer_id INTEGER NOT NULL, PRIMARY KEY (song_id, writer_id), FOREIGN KEY (song_id) REFERENCES Musicas (song_id), FOREIGN KEY (writer_id) REFERENCES Pessoas (person_id));
+    CREATE TABLE IF NOT EXISTS Descricoes (song_id INTEGER NOT NULL, tag_id INTEGER NOT NULL, PRIMARY KEY (song_id, tag_id), FOREIGN KEY (song_id) REFERENCES Musicas (song_id), FOREIGN KEY (tag_id) REFERENCES Tags (tag_id));
+"""
+
+# Progress of unfinished imports, and the indexes and triggers they
+# dropped, so an interrupted import can resume and put them back
+CHECKPOINT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Importacoes (
+        source TEXT PRIMARY KEY,
+        records INTEGER NOT NULL,
+        rows_written INTEGER NOT NULL,
+        seconds REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ImportacaoEsquema (
+        position INTEGER PRIMARY KEY,
+        type TEXT NOT NULL,
+        name TEXT NOT NULL,
+        sql TEXT NOT NULL
+    );
+"""
+
+# Outcome of an import: records read, rows written per table, and time
+ImportReport = namedtuple("ImportReport", ["records", "rows", "seconds", "resumed_from"])
+
+
+def read_records(path):
+    """
+    Streams the records of a CSV (with a header row) or JSON Lines file,
+    one dict at a time, so files of any size can be read.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as file:
+        if extension == ".csv":
+            yield from csv.DictReader(file)
+        elif extension in (".jsonl", ".ndjson"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported file type {extension!r}: use .csv or .jsonl")
+
+
+def _names(value):
+    """
+    Returns the names in a list column, given as a list or as text
+    separated by LIST_SEPARATOR, without blanks or repeats.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    names = []
+    for name in value:
+        name = str(name).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _stored_date(value):
+    """
+    Returns a date as Musicas stores it (DD/MM/YYYY), accepting that
+    format or ISO (YYYY-MM-DD).
+    """
+    value = (value or "").strip()
+    try:
+        return date.fromisoformat(value).strftime("%d/%m/%Y")
+    except ValueError:
+        return value or None
+
+
+def parse_record(raw):
+    """
+    Validates one input record and returns it with typed fields.
+    Raises ValueError when 'song_id' is missing or not a number.
+    """
+    try:
+        song_id = int(raw["song_id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Record without a valid song_id: {raw!r:.200}") from e
+    number = raw.get("track_number")
+    return {
+        "song_id": song_id,
+        "song_title": raw.get("song_title") or None,
+        "views": int(raw.get("views") or 0),
+        "date": _stored_date(raw.get("date")),
+        "song_url": raw.get("song_url") or None,
+        "lyrics": raw.get("lyrics") or "",
+        "album_title": raw.get("album_title") if (raw.get("album_title") or "").strip() else NO_ALBUM,
+        "album_url": raw.get("album_url") or None,
+        "category": raw.get("category") or None,
+        "track_number": int(number) if number not in (None, "") else None,
+        "tags": _names(raw.get("tags")),
+        **{column: _names(raw.get(column)) for column in ROLE_COLUMNS},
+    }
+
+
+class IdMap:
+    """
+    Maps the natural key of a lookup table (a person's name, a tag, an
+    album title) to its id, in memory. Keys not seen before get the next
+    free id and are queued until 'take_new()' hands them over for insert.
+    """
+
+    def __init__(self, conn, table, id_column, key_column):
+        self.ids = {}
+        for row_id, key in conn.execute(f"SELECT {id_column}, {key_column} FROM {table} ORDER BY {id_column}"):
+            self.ids.setdefault(key, row_id)
+        self.next_id = conn.execute(f"SELECT COALESCE(MAX({id_column}), 0) + 1 FROM {table}").fetchone()[0]
+        self.new = []
+
+    def get(self, key, *extra):
+        """
+        Returns the id of 'key', assigning one if it is new. 'extra' values
+        are stored with a new key's row.
+        """
+        row_id = self.ids.get(key)
+        if row_id is None:
+            row_id = self.ids[key] = self.next_id
+            self.next_id += 1
+            self.new.append((row_id, key, *extra))
+        return row_id
+
+    def take_new(self):
+        """
+        Returns the rows queued since the last call.
+        """
+        new, self.new = self.new, []
+        return new
+
+
+def _write_batch(conn, records, albums, people, tags):
+    """
+    Writes one batch of parsed records and returns the rows written per
+    table. Songs already in the database are replaced, their credits,
+    tags and track numbers included.
+    """
+    songs, lyrics, numbers, descriptions = [], [], [], []
+    credits = {table: [] for table, _ in ROLE_COLUMNS.values()}
+    for record in records:
+        song_id = record["song_id"]
+        album_id = albums.get(record["album_title"], record["album_url"], record["category"])
+        songs.append((song_id, record["song_title"], record["views"], record["date"],
+                      record["song_url"], album_id, song_id))
+        lyrics.append((song_id, record["lyrics"]))
+        if record["track_number"] is not None:
+            numbers.append((album_id, song_id, record["track_number"]))
+        for column, (table, _) in ROLE_COLUMNS.items():
+            credits[table] += [(song_id, people.get(name)) for name in record[column]]
+        descriptions += [(song_id, tags.get(tag)) for tag in record["tags"]]
+
+    rows = {
+        "Albuns": albums.take_new(),
+        "Pessoas": people.take_new(),
+        "Tags": tags.take_new(),
+    }
+    conn.executemany("INSERT INTO Albuns (album_id, album_title, album_url, category) VALUES (?, ?, ?, ?)",
+                     rows["Albuns"])
+    conn.executemany("INSERT INTO Pessoas (person_id, person) VALUES (?, ?)", rows["Pessoas"])
+    conn.executemany("INSERT INTO Tags (tag_id, tag) VALUES (?, ?)", rows["Tags"])
+
+    song_ids = json.dumps([song[0] for song in songs])
+    existing = conn.execute(
+        "SELECT COUNT(*) FROM Musicas WHERE song_id IN (SELECT value FROM json_each(?))", (song_ids,)
+    ).fetchone()[0]
+    if existing:
+        for table in SONG_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE song_id IN (SELECT value FROM json_each(?))", (song_ids,))
+
+    conn.executemany("""
+        INSERT OR REPLACE INTO Musicas (song_id, song_title, views, date, song_url, album_id, lyrics_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, songs)
+    lyrics_storage.write_lyrics(conn, lyrics)
+    conn.executemany("INSERT OR REPLACE INTO Numeros (album_id, song_id, number) VALUES (?, ?, ?)", numbers)
+    for (table, column), table_rows in zip(ROLE_COLUMNS.values(), credits.values()):
+        conn.executemany(f"INSERT OR IGNORE INTO {table} (song_id, {column}) VALUES (?, ?)", table_rows)
+    conn.executemany("INSERT OR IGNORE INTO Descricoes (song_id, tag_id) VALUES (?, ?)", descriptions)
+
+    counts = {table: len(table_rows) for table, table_rows in rows.items()}
+    counts.update(Musicas=len(songs), Letras=len(lyrics), Numeros=len(numbers), Descricoes=len(descriptions))
+    counts.update({table: len(table_rows) for table, table_rows in credits.items()})
+    return counts
+
+
+def _drop_derived(conn):
+    """
+    Saves the definitions of every index and trigger, then drops them so
+    rows can be written without maintaining them.
+    """
+    objects = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type = 'trigger', name
+    """).fetchall()
+    conn.execute("DELETE FROM ImportacaoEsquema")
+    conn.executemany("INSERT INTO ImportacaoEsquema (type, name, sql) VALUES (?, ?, ?)", objects)
+    for object_type, name, _ in objects:
+        conn.execute(f'DROP {object_type.upper()} IF EXISTS "{name}"')
+
+
+def _restore_derived(conn):
+    """
+    Recreates the saved indexes, recomputes the data the triggers would
+    have kept up to date (lyrics index, release dates, summary tables,
+    song credits), then recreates the triggers. Recomputing first spares
+    every rewritten row a round of trigger work. The similar-songs index,
+    which needs every song's vector in memory, is not touched: new and
+    re-imported songs are indexed by update-similar-songs.
+    """
+    saved = conn.execute("SELECT type, sql FROM ImportacaoEsquema ORDER BY position").fetchall()
+    for object_type, sql in saved:
+        if object_type == "index":
+            conn.execute(sql)
+    lyrics_index.rebuild_index(conn)
+    release_dates.backfill_release_dates(conn)
+    summaries.rebuild_summaries(conn)
+    song_credits.rebuild_credits(conn)
+    for object_type, sql in saved:
+        if object_type == "trigger":
+            conn.execute(sql)
+    conn.execute("DELETE FROM ImportacaoEsquema")
+    conn.execute("ANALYZE")
+
+
+def open_for_import(path):
+    """
+    Opens a writable connection for bulk loading, creating the base
+    tables if the database is new and applying pending migrations.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(BASE_SCHEMA)
+    if not lyrics_storage.is_compressed(conn):
+        conn.executescript(lyrics_storage.PLAIN_SCHEMA)
+    conn.close()
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = {IMPORT_CACHE_SIZE}")
+    return conn
+
+
+def import_catalog(conn, source, batch_size=DEFAULT_BATCH_SIZE, restart=False, progress=None):
+    """
+    Loads a CSV or JSON Lines catalog (one song per record) into the
+    database, 'batch_size' records per transaction.
+
+    Indexes and triggers are dropped for the duration of the load and
+    rebuilt at the end. After every batch the number of records done is
+    saved with it, so calling this again with the same source after an
+    interruption skips what was already written; 'restart' starts over
+    instead. Only one import can be unfinished at a time.
+    'progress(records, rows, seconds)' is called after every batch.
+    """
+    source_key = os.path.abspath(source)
+    conn.executescript(CHECKPOINT_SCHEMA)
+    checkpoint = conn.execute("SELECT source, records, rows_written, seconds FROM Importacoes").fetchone()
+    if checkpoint is not None and checkpoint[0] != source_key and not restart:
+        raise ValueError(f"The import of {checkpoint[0]} is unfinished: resume it or restart")
+    with conn:
+        if checkpoint is None:
+            _drop_derived(conn)
+        if checkpoint is None or restart:
+            conn.execute("DELETE FROM Importacoes")
+            conn.execute("INSERT INTO Importacoes VALUES (?, 0, 0, 0)", (source_key,))
+            checkpoint = (source_key, 0, 0, 0.0)
+    _, resumed_from, rows_written, previous_seconds = checkpoint
+
+    albums = IdMap(conn, "Albuns", "album_id", "album_title")
+    people = IdMap(conn, "Pessoas", "person_id", "person")
+    tags = IdMap(conn, "Tags", "tag_id", "tag")
+
+    rows = {}
+    records = 0
+    start = time.perf_counter()
+    batch = []
+
+    def flush():
+        nonlocal rows_written
+        with conn:
+            counts = _write_batch(conn, batch, albums, people, tags)
+            rows_written += sum(counts.values())
+            conn.execute(
+                "UPDATE Importacoes SET records = ?, rows_written = ?, seconds = ?",
+                (records, rows_written, previous_seconds + time.perf_counter() - start),
+            )
+        for table, count in counts.items():
+            rows[table] = rows.get(table, 0) + count
+        batch.clear()
+        if progress is not None:
+            progress(records, rows_written, previous_seconds + time.perf_counter() - start)
+
+    for raw in read_records(source):
+        records += 1
+        if records <= resumed_from:
+            continue
+        batch.append(parse_record(raw))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    with conn:
+        _restore_derived(conn)
+        conn.execute("DELETE FROM Importacoes")
+    return ImportReport(records, rows, previous_seconds + time.perf_counter() - start, resumed_from)
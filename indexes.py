@@ -0,0 +1,18 @@
+# Secondary indexes for the lookups the base schema leaves to full scans.
+# The junction tables only have primary keys led by song_id, so every
+# lookup from the album, tag or view-count side needs one of these.
+COVERING_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_descricoes_tag ON Descricoes (tag_id, song_id);
+    CREATE INDEX IF NOT EXISTS idx_numeros_album ON Numeros (album_id, number, song_id);
+    CREATE INDEX IF NOT EXISTS idx_musicas_album ON Musicas (album_id, views);
+    CREATE INDEX IF NOT EXISTS idx_musicas_views ON Musicas (views);
+    CREATE INDEX IF NOT EXISTS idx_albuns_title ON Albuns (album_title);
+"""
+
+
+def create_covering_indexes(conn):
+    """
+    Creates the secondary indexes and refreshes the planner statistics.
+    """
+    conn.executescript(COVERING_INDEXES)
+    conn.execute("ANALYZE")
@@ -0,0 +1,260 @@
+from collections import Counter
+import re
+import unicodedata
+
+from markupsafe import Markup, escape
+
+import lyrics_storage
+from pagination import DEFAULT_PAGE_SIZE, Page, keyset_page
+
+
+# Markers used by snippet() around matched terms. They are swapped for
+# <mark> tags only after the lyric text has been HTML-escaped.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# External-content FTS5 table over Letras: the index stores only the
+# tokens, the text itself stays in Letras. The triggers keep both in sync.
+LYRICS_INDEX_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS LetrasFTS USING fts5(
+        song_lyrics,
+        content='Letras',
+        content_rowid='lyrics_id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS Letras_fts_insert AFTER INSERT ON Letras BEGIN
+        INSERT INTO LetrasFTS(rowid, song_lyrics) VALUES (new.lyrics_id, new.song_lyrics);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS Letras_fts_delete AFTER DELETE ON Letras BEGIN
+        INSERT INTO LetrasFTS(LetrasFTS, rowid, song_lyrics) VALUES ('delete', old.lyrics_id, old.song_lyrics);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS Letras_fts_update AFTER UPDATE ON Letras BEGIN
+        INSERT INTO LetrasFTS(LetrasFTS, rowid, song_lyrics) VALUES ('delete', old.lyrics_id, old.song_lyrics);
+        INSERT INTO LetrasFTS(rowid, song_lyrics) VALUES (new.lyrics_id, new.song_lyrics);
+    END;
+"""
+
+# With compressed lyrics (see lyrics_storage.py) the index is contentless:
+# it keeps only the tokens, and snippets are cut from the decompressed
+# lyrics of the rows on the page. There are no triggers; whatever writes
+# lyrics rebuilds the index.
+CONTENTLESS_INDEX_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS LetrasFTS USING fts5(
+        song_lyrics,
+        content='',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+"""
+
+# Words shown in a snippet, as in snippet(..., 16)
+SNIPPET_TOKENS = 16
+SNIPPET_ELLIPSIS = "…"
+
+# Matches either a "quoted phrase" or a single bare term
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+# Tokens as unicode61 sees them: runs of letters and digits
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def create_index(conn):
+    """
+    Creates the lyrics index (and its triggers, for plain-text lyrics),
+    then fills it.
+    """
+    if lyrics_storage.is_compressed(conn):
+        conn.executescript(CONTENTLESS_INDEX_SCHEMA)
+    else:
+        conn.executescript(LYRICS_INDEX_SCHEMA)
+    rebuild_index(conn)
+
+
+def recreate_index(conn):
+    """
+    Drops the lyrics index and creates it again for the layout the lyrics
+    are stored in, after lyrics_storage changed it.
+    """
+    for trigger in ("Letras_fts_insert", "Letras_fts_delete", "Letras_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS LetrasFTS")
+    create_index(conn)
+
+
+def rebuild_index(conn):
+    """
+    Rebuilds the lyrics index from scratch and merges its segments.
+    """
+    if lyrics_storage.is_compressed(conn):
+        conn.execute("INSERT INTO LetrasFTS(LetrasFTS) VALUES ('delete-all')")
+        conn.executemany("INSERT INTO LetrasFTS(rowid, song_lyrics) VALUES (?, ?)",
+                         lyrics_storage.iter_lyrics(conn))
+    else:
+        conn.execute("INSERT INTO LetrasFTS(LetrasFTS) VALUES ('rebuild')")
+    conn.execute("INSERT INTO LetrasFTS(LetrasFTS) VALUES ('optimize')")
+
+
+def update_lyrics(conn, rows):
+    """
+    Inserts or replaces lyrics given as (lyrics_id, text) pairs with the
+    index in place. Plain-text lyrics are kept in step by the triggers;
+    the contentless index of compressed lyrics is told which tokens to
+    drop from the old text, then given the new one.
+    """
+    rows = list(rows)
+    if lyrics_storage.is_compressed(conn):
+        old = lyrics_storage.read_lyrics(conn, [lyrics_id for lyrics_id, _ in rows])
+        conn.executemany("INSERT INTO LetrasFTS(LetrasFTS, rowid, song_lyrics) VALUES ('delete', ?, ?)",
+                         old.items())
+        lyrics_storage.write_lyrics(conn, rows)
+        conn.executemany("INSERT INTO LetrasFTS(rowid, song_lyrics) VALUES (?, ?)", rows)
+    else:
+        lyrics_storage.write_lyrics(conn, rows)
+
+
+def build_match_query(text):
+    """
+    Turns user input into an FTS5 MATCH expression.
+
+    "quoted words" become a phrase query, a trailing * makes a prefix query
+    and every other word is required. Each part is quoted so characters
+    with a meaning in the FTS5 syntax can never break the query.
+    Returns an empty string when nothing searchable is left.
+    """
+    parts = []
+    for phrase, term in _QUERY_PART.findall(text):
+        if phrase:
+            words = phrase.split()
+            if words:
+                parts.append('"' + " ".join(words) + '"')
+        else:
+            prefix = term.endswith("*")
+            term = term.strip("*").replace('"', "")
+            if term:
+                parts.append('"' + term + '"' + ("*" if prefix else ""))
+    return " ".join(parts)
+
+
+def search_lyrics(db, text, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Returns a page of the songs whose lyrics match 'text', best match first
+    (BM25), each with a short highlighted snippet instead of the whole lyric.
+    Compressed lyrics are decompressed only for the rows of the page.
+    """
+    match = build_match_query(text)
+    if not match:
+        return Page([], None)
+    if not lyrics_storage.is_compressed(db):
+        return keyset_page(
+            db,
+            columns="""
+                Musicas.song_title,
+                Musicas.song_url,
+                snippet(LetrasFTS, 0, ?, ?, '…', 16) AS snippet
+            """,
+            source="LetrasFTS JOIN Musicas ON Musicas.song_id = LetrasFTS.rowid",
+            key=["bm25(LetrasFTS)", "LetrasFTS.rowid"],
+            params=(HIGHLIGHT_START, HIGHLIGHT_END, match),
+            where="LetrasFTS MATCH ?",
+            after=after,
+            limit=limit,
+        )
+    page = keyset_page(
+        db,
+        columns="Musicas.song_title, Musicas.song_url, LetrasFTS.rowid AS lyrics_id",
+        source="LetrasFTS JOIN Musicas ON Musicas.song_id = LetrasFTS.rowid",
+        key=["bm25(LetrasFTS)", "LetrasFTS.rowid"],
+        params=(match,),
+        where="LetrasFTS MATCH ?",
+        after=after,
+        limit=limit,
+    )
+    lyrics = lyrics_storage.read_lyrics(db, [row["lyrics_id"] for row in page.rows])
+    terms = match_terms(text)
+    rows = [{"song_title": row["song_title"], "song_url": row["song_url"],
+             "snippet": make_snippet(lyrics.get(row["lyrics_id"]) or "", terms)} for row in page.rows]
+    return Page(rows, page.next_cursor)
+
+
+def _fold(word):
+    """
+    A token as unicode61 with remove_diacritics compares it: lowercased,
+    without accents.
+    """
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def match_terms(text):
+    """
+    The words of a search as (folded word, is prefix) pairs, for finding
+    them in a lyric.
+    """
+    terms = []
+    for phrase, term in _QUERY_PART.findall(text):
+        if phrase:
+            terms += [(_fold(word), False) for word in _TOKEN.findall(phrase)]
+        else:
+            words = _TOKEN.findall(term)
+            terms += [(_fold(word), False) for word in words[:-1]]
+            if words:
+                terms.append((_fold(words[-1]), term.endswith("*")))
+    return terms
+
+
+def make_snippet(lyric, terms, size=SNIPPET_TOKENS):
+    """
+    Cuts the stretch of 'size' tokens of a lyric holding the most distinct
+    search terms, with the terms between the HIGHLIGHT markers, like the
+    FTS5 snippet() function does for plain-text lyrics. The words of a
+    phrase are highlighted wherever they occur, not only together.
+    """
+    tokens = list(_TOKEN.finditer(lyric))
+    if not tokens:
+        return ""
+    exact = {word for word, prefix in terms if not prefix}
+    prefixes = tuple(word for word, prefix in terms if prefix)
+    hits = []
+    for token in tokens:
+        word = token.group(0).lower()
+        if not word.isascii():
+            word = _fold(word)
+        hits.append(word if word in exact or (prefixes and word.startswith(prefixes)) else None)
+    # Slide the window one token at a time, counting the terms inside it
+    inside = Counter(hit for hit in hits[:size] if hit is not None)
+    best, best_count = 0, len(inside)
+    for start in range(1, len(tokens) - size + 1):
+        leaving, entering = hits[start - 1], hits[start + size - 1]
+        if leaving is not None:
+            inside[leaving] -= 1
+            if not inside[leaving]:
+                del inside[leaving]
+        if entering is not None:
+            inside[entering] += 1
+        if len(inside) > best_count:
+            best, best_count = start, len(inside)
+    window = range(best, min(best + size, len(tokens)))
+    parts = [SNIPPET_ELLIPSIS] if best > 0 else []
+    position = tokens[best].start()
+    for i in window:
+        token = tokens[i]
+        parts.append(lyric[position:token.start()])
+        if hits[i] is not None:
+            parts.append(HIGHLIGHT_START + token.group(0) + HIGHLIGHT_END)
+        else:
+            parts.append(token.group(0))
+        position = token.end()
+    if window[-1] < len(tokens) - 1:
+        parts.append(SNIPPET_ELLIPSIS)
+    return "".join(parts)
+
+
+def highlight(snippet):
+    """
+    Escapes a snippet and wraps the matched terms in <mark> tags.
+    """
+    return (escape(snippet or "")
+            .replace(HIGHLIGHT_START, Markup("<mark>"))
+            .replace(HIGHLIGHT_END, Markup("</mark>")))
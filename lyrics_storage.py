@@ -0,0 +1,376 @@
+from collections import Counter, namedtuple
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional: lyrics are compressed with zlib without it
+    zstandard = None
+
+
+# Bytes of the shared dictionary. zlib only looks 32 KiB back, so a
+# larger dictionary would not help it.
+DICTIONARY_SIZE = 32 * 1024
+
+# Lyrics the dictionary is trained on, spread evenly over the corpus
+TRAINING_SAMPLES = 5000
+
+# A word pair goes into the zlib dictionary when this many lyrics use it
+MIN_PAIR_SONGS = 3
+
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+# Lyrics as plain text, the layout of dbfinal.db
+PLAIN_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Letras (lyrics_id INTEGER PRIMARY KEY, song_lyrics TEXT NOT NULL);
+"""
+
+# Lyrics as compressed UTF-8, each row naming the shared dictionary it
+# was compressed with. Dictionaries never change once written: training
+# a new one adds a row, identified by the digest of its content.
+COMPRESSED_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS DicionariosLetras (
+        dictionary_id INTEGER PRIMARY KEY,
+        codec TEXT NOT NULL,
+        digest TEXT NOT NULL UNIQUE,
+        dictionary BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS LetrasComprimidas (
+        lyrics_id INTEGER PRIMARY KEY,
+        dictionary_id INTEGER NOT NULL REFERENCES DicionariosLetras (dictionary_id),
+        song_lyrics BLOB NOT NULL
+    );
+"""
+
+PLAIN_QUERIES = {
+    "lyrics": "SELECT lyrics_id, song_lyrics FROM Letras WHERE lyrics_id IN (SELECT value FROM json_each(?))",
+    "all_lyrics": "SELECT lyrics_id, song_lyrics FROM Letras ORDER BY lyrics_id",
+    "songs": """
+        SELECT m.song_id, l.song_lyrics
+        FROM Musicas m LEFT JOIN Letras l ON l.lyrics_id = m.lyrics_id
+        ORDER BY m.song_id
+    """,
+}
+
+# The same, with each row's dictionary digest for looking up its codec
+COMPRESSED_QUERIES = {
+    "lyrics": """
+        SELECT l.lyrics_id, l.song_lyrics, d.digest
+        FROM LetrasComprimidas l JOIN DicionariosLetras d ON d.dictionary_id = l.dictionary_id
+        WHERE l.lyrics_id IN (SELECT value FROM json_each(?))
+    """,
+    "all_lyrics": """
+        SELECT l.lyrics_id, l.song_lyrics, d.digest
+        FROM LetrasComprimidas l JOIN DicionariosLetras d ON d.dictionary_id = l.dictionary_id
+        ORDER BY l.lyrics_id
+    """,
+    "songs": """
+        SELECT m.song_id, l.song_lyrics, d.digest
+        FROM Musicas m
+        LEFT JOIN LetrasComprimidas l ON l.lyrics_id = m.lyrics_id
+        LEFT JOIN DicionariosLetras d ON d.dictionary_id = l.dictionary_id
+        ORDER BY m.song_id
+    """,
+}
+
+# Outcome of a change of layout: lyrics moved, their size as UTF-8 text
+# and as stored, the size of the dictionary, and time taken
+StorageReport = namedtuple(
+    "StorageReport", ["codec", "rows", "text_bytes", "stored_bytes", "dictionary_bytes", "seconds"]
+)
+
+_WORD_PAIR = re.compile(r"\S+\s+(?=(\S+\s*))")
+
+
+class ZlibCodec:
+    """
+    Raw deflate with the shared dictionary preset, so even short lyrics
+    can refer back to words and phrases common across the corpus.
+    """
+
+    name = "zlib"
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+
+    @staticmethod
+    def train(samples, size=DICTIONARY_SIZE):
+        """
+        Builds a dictionary from the word pairs used by the most lyrics,
+        weighted by their length. The most valuable pairs go last, where
+        deflate reaches them with the shortest distances.
+        """
+        pairs = Counter()
+        for sample in samples:
+            text = sample.decode("utf-8")
+            pairs.update({match.group(0) + match.group(1) for match in _WORD_PAIR.finditer(text)})
+        ranked = sorted(((songs * len(pair.encode()), pair) for pair, songs in pairs.items()
+                         if songs >= MIN_PAIR_SONGS), reverse=True)
+        chosen, used = [], 0
+        for _, pair in ranked:
+            encoded = pair.encode()
+            if used + len(encoded) > size:
+                break
+            chosen.append(encoded)
+            used += len(encoded)
+        return b"".join(reversed(chosen))
+
+    def compress(self, data):
+        encoder = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=self.dictionary)
+        return encoder.compress(data) + encoder.flush()
+
+    def decompress(self, blob):
+        decoder = zlib.decompressobj(-15, zdict=self.dictionary)
+        return decoder.decompress(blob) + decoder.flush()
+
+
+class ZstdCodec:
+    """
+    Zstandard with a dictionary trained by zstd itself. Compressors and
+    decompressors are not safe to share between threads, so each thread
+    gets its own.
+    """
+
+    name = "zstd"
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self._dict = zstandard.ZstdCompressionDict(dictionary)
+        self._local = threading.local()
+
+    @staticmethod
+    def train(samples, size=DICTIONARY_SIZE):
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+    def compress(self, data):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=self._dict)
+        return self._local.compressor.compress(data)
+
+    def decompress(self, blob):
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstandard.ZstdDecompressor(dict_data=self._dict)
+        return self._local.decompressor.decompress(blob)
+
+
+CODECS = {"zlib": ZlibCodec, "zstd": ZstdCodec}
+
+# Errors raised by a corrupt blob
+DECOMPRESSION_ERRORS = (zlib.error, UnicodeDecodeError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+# Codecs of the dictionaries read so far, by digest
+_codecs = {}
+_codecs_lock = threading.Lock()
+
+
+def available_codecs():
+    """
+    Codecs this installation can use, preferred first.
+    """
+    return ("zstd", "zlib") if zstandard is not None else ("zlib",)
+
+
+def is_compressed(conn):
+    """
+    Tells whether the database keeps its lyrics compressed.
+    """
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'LetrasComprimidas'"
+    ).fetchone() is not None
+
+
+def _digest(codec, dictionary):
+    return hashlib.sha256(codec.encode() + b"\0" + dictionary).hexdigest()[:32]
+
+
+def _codec(conn, digest):
+    """
+    The codec of the dictionary with 'digest', read from the database the
+    first time it is needed.
+    """
+    codec = _codecs.get(digest)
+    if codec is None:
+        name, dictionary = conn.execute(
+            "SELECT codec, dictionary FROM DicionariosLetras WHERE digest = ?", (digest,)
+        ).fetchone()
+        if name not in available_codecs():
+            raise ValueError(f"Lyrics are compressed with {name}, which is not installed")
+        codec = CODECS[name](dictionary)
+        with _codecs_lock:
+            codec = _codecs.setdefault(digest, codec)
+    return codec
+
+
+def _current_dictionary(conn):
+    """
+    The id and codec of the newest dictionary, used for new lyrics.
+    """
+    dictionary_id, digest = conn.execute(
+        "SELECT dictionary_id, digest FROM DicionariosLetras ORDER BY dictionary_id DESC LIMIT 1"
+    ).fetchone()
+    return dictionary_id, _codec(conn, digest)
+
+
+def _decoded(conn, rows):
+    """
+    Decompresses the (id, blob, digest) rows of a COMPRESSED_QUERIES
+    statement into (id, text) pairs; missing lyrics stay None.
+    """
+    for row_id, blob, digest in rows:
+        yield row_id, None if blob is None else _codec(conn, digest).decompress(blob).decode("utf-8")
+
+
+def read_lyrics(db, lyrics_ids):
+    """
+    The lyrics with the given ids, as {lyrics_id: text}. In the compressed
+    layout only these rows are decompressed.
+    """
+    ids = json.dumps(list(lyrics_ids))
+    if is_compressed(db):
+        return dict(_decoded(db, db.execute(COMPRESSED_QUERIES["lyrics"], (ids,)).fetchall()))
+    return dict(db.execute(PLAIN_QUERIES["lyrics"], (ids,)).fetchall())
+
+
+def iter_lyrics(conn):
+    """
+    Every lyric as (lyrics_id, text), in id order.
+    """
+    if is_compressed(conn):
+        return _decoded(conn, conn.execute(COMPRESSED_QUERIES["all_lyrics"]))
+    return iter(conn.execute(PLAIN_QUERIES["all_lyrics"]))
+
+
+def song_lyrics(conn):
+    """
+    Every song's lyrics as (song_id, text), in song_id order; None for a
+    song without lyrics.
+    """
+    if is_compressed(conn):
+        return _decoded(conn, conn.execute(COMPRESSED_QUERIES["songs"]))
+    return iter(conn.execute(PLAIN_QUERIES["songs"]))
+
+
+def write_lyrics(conn, rows):
+    """
+    Inserts or replaces lyrics given as (lyrics_id, text) pairs, in
+    whichever layout the database uses. Plain-text lyrics are upserted so
+    the index triggers see replaced rows; for compressed lyrics the index
+    is left to the caller (see lyrics_index.update_lyrics()).
+    """
+    if not is_compressed(conn):
+        conn.executemany("""
+            INSERT INTO Letras (lyrics_id, song_lyrics) VALUES (?, ?)
+            ON CONFLICT (lyrics_id) DO UPDATE SET song_lyrics = excluded.song_lyrics
+        """, rows)
+        return
+    dictionary_id, codec = _current_dictionary(conn)
+    conn.executemany(
+        "INSERT OR REPLACE INTO LetrasComprimidas (lyrics_id, dictionary_id, song_lyrics) VALUES (?, ?, ?)",
+        [(lyrics_id, dictionary_id, codec.compress(text.encode("utf-8"))) for lyrics_id, text in rows],
+    )
+
+
+def compress_lyrics(conn, codec=None, dictionary_size=DICTIONARY_SIZE):
+    """
+    Moves the lyrics from Letras into LetrasComprimidas, compressed with a
+    dictionary trained on the corpus ('codec' is the preferred available
+    one by default). Every row is decompressed again and compared with
+    the original before Letras is dropped; a mismatch raises ValueError
+    and leaves the transaction to be rolled back. The lyrics index must be
+    recreated afterwards (lyrics_index.recreate_index).
+    """
+    start = time.perf_counter()
+    codec = codec or available_codecs()[0]
+    if codec not in available_codecs():
+        raise ValueError(f"Unknown or unavailable codec {codec!r}: use {', '.join(available_codecs())}")
+    if is_compressed(conn):
+        raise ValueError("Lyrics are compressed already")
+    lyrics = conn.execute(PLAIN_QUERIES["all_lyrics"]).fetchall()
+    step = max(1, len(lyrics) // TRAINING_SAMPLES)
+    samples = [text.encode("utf-8") for _, text in lyrics[::step] if text]
+    dictionary = CODECS[codec].train(samples, dictionary_size)
+
+    conn.executescript(COMPRESSED_SCHEMA)
+    dictionary_id = conn.execute(
+        "INSERT INTO DicionariosLetras (codec, digest, dictionary) VALUES (?, ?, ?)",
+        (codec, _digest(codec, dictionary), dictionary),
+    ).lastrowid
+    compressor = CODECS[codec](dictionary)
+    rows, text_bytes, stored_bytes = [], 0, 0
+    for lyrics_id, text in lyrics:
+        data = text.encode("utf-8")
+        blob = compressor.compress(data)
+        if compressor.decompress(blob) != data:
+            raise ValueError(f"Lyrics {lyrics_id} do not survive a round trip through {codec}")
+        rows.append((lyrics_id, dictionary_id, blob))
+        text_bytes += len(data)
+        stored_bytes += len(blob)
+    conn.executemany("INSERT INTO LetrasComprimidas (lyrics_id, dictionary_id, song_lyrics) VALUES (?, ?, ?)", rows)
+    conn.execute("DROP TABLE Letras")
+    return StorageReport(codec, len(rows), text_bytes, stored_bytes, len(dictionary), time.perf_counter() - start)
+
+
+def decompress_lyrics(conn):
+    """
+    Moves the lyrics back into a plain-text Letras table and drops the
+    compressed ones. The lyrics index must be recreated afterwards.
+    """
+    start = time.perf_counter()
+    if not is_compressed(conn):
+        raise ValueError("Lyrics are not compressed")
+    stats = storage_stats(conn)
+    lyrics = list(iter_lyrics(conn))
+    conn.executescript(PLAIN_SCHEMA)
+    conn.executemany("INSERT INTO Letras (lyrics_id, song_lyrics) VALUES (?, ?)", lyrics)
+    conn.execute("DROP TABLE LetrasComprimidas")
+    conn.execute("DROP TABLE DicionariosLetras")
+    text_bytes = sum(len(text.encode("utf-8")) for _, text in lyrics)
+    return StorageReport(None, len(lyrics), text_bytes, stats["stored_bytes"], stats["dictionary_bytes"],
+                         time.perf_counter() - start)
+
+
+def verify_lyrics(conn, reference=None):
+    """
+    Decompresses every lyric and, given a 'reference' connection to a
+    database in either layout, compares them with its lyrics.
+    Returns a list of (lyrics_id, problem) tuples; empty when consistent.
+    """
+    problems, stored = [], {}
+    if is_compressed(conn):
+        for lyrics_id, blob, digest in conn.execute(COMPRESSED_QUERIES["all_lyrics"]):
+            try:
+                stored[lyrics_id] = _codec(conn, digest).decompress(blob).decode("utf-8")
+            except DECOMPRESSION_ERRORS as e:
+                problems.append((lyrics_id, f"does not decompress: {e}"))
+    else:
+        stored = dict(iter_lyrics(conn))
+    if reference is not None:
+        expected = dict(iter_lyrics(reference))
+        broken = {lyrics_id for lyrics_id, _ in problems}
+        problems += [(lyrics_id, "missing") for lyrics_id in sorted(expected.keys() - stored.keys() - broken)]
+        problems += [(lyrics_id, "unexpected") for lyrics_id in sorted(stored.keys() - expected.keys())]
+        problems += [(lyrics_id, "differs") for lyrics_id in sorted(stored.keys() & expected.keys())
+                     if stored[lyrics_id] != expected[lyrics_id]]
+    return problems
+
+
+def storage_stats(conn):
+    """
+    Number of lyrics and their stored size in bytes, with the size of the
+    dictionaries in the compressed layout.
+    """
+    if is_compressed(conn):
+        rows, stored = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(song_lyrics)), 0) FROM LetrasComprimidas"
+        ).fetchone()
+        dictionaries = conn.execute("SELECT COALESCE(SUM(length(dictionary)), 0) FROM DicionariosLetras").fetchone()[0]
+        return {"layout": "compressed", "rows": rows, "stored_bytes": stored, "dictionary_bytes": dictionaries}
+    rows, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(CAST(song_lyrics AS BLOB))), 0) FROM Letras"
+    ).fetchone()
+    return {"layout": "plain", "rows": rows, "stored_bytes": stored, "dictionary_bytes": 0}
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemorySnapshot:
+    """
+    A copy of the database file held in a shared in-memory database, so
+    the read routes never touch the filesystem.
+
+    The copy is made with SQLite's backup API into a named database
+    ('file:<name>?mode=memory&cache=shared') that every reader connection
+    opens. A watcher thread polls the source file and, when it changes,
+    loads a fresh copy under a new name and switches new connections to it
+    in one step. Connections already open keep reading the old copy (it
+    lives as long as one of them does) and 'on_swap' is called so the pool
+    can retire them once their requests are done.
+    """
+
+    def __init__(self, path, poll_interval=2.0, on_swap=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self.generation = 0
+        self.swaps = 0
+        self.load_seconds = 0.0
+        self.size_bytes = 0
+        self._uri = None
+        self._holder = None
+        self._source_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._watcher_conn = None
+        self._watched_inode = None
+
+    def source_version(self):
+        """
+        A token that changes whenever the source file is committed to
+        (PRAGMA data_version on a long-lived watcher connection, which
+        readers opening and closing the file leave alone) or replaced.
+        """
+        info = os.stat(self.path)
+        if self._watcher_conn is None or info.st_ino != self._watched_inode:
+            if self._watcher_conn is not None:
+                self._watcher_conn.close()
+            self._watcher_conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._watched_inode = info.st_ino
+        data_version = self._watcher_conn.execute("PRAGMA data_version").fetchone()[0]
+        return (info.st_ino, info.st_mtime_ns, info.st_size, data_version)
+
+    def load(self):
+        """
+        Copies the source file into a new in-memory database and makes it
+        the one new connections open. Returns the seconds the copy took.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            source_version = self.source_version()
+            generation = self.generation + 1
+            uri = f"file:catalog-snapshot-{os.getpid()}-{id(self)}-{generation}?mode=memory&cache=shared"
+            holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                source.backup(holder)
+            finally:
+                source.close()
+            page_count = holder.execute("PRAGMA page_count").fetchone()[0]
+            page_size = holder.execute("PRAGMA page_size").fetchone()[0]
+
+            # The switch: from here on new connections open the new copy.
+            # Closing the old holder frees the old copy once the last
+            # connection still reading it is closed.
+            previous = self._holder
+            self._uri, self._holder = uri, holder
+            self.generation, self._source_version = generation, source_version
+            self.size_bytes = page_count * page_size
+            self.load_seconds = time.perf_counter() - start
+            if previous is not None:
+                previous.close()
+                self.swaps += 1
+        if previous is not None and self.on_swap is not None:
+            self.on_swap()
+        return self.load_seconds
+
+    def connect(self):
+        """
+        Opens a read-only connection to the current copy.
+        """
+        conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def version(self):
+        """
+        Identifies the current copy: its generation and the version of the
+        file it was loaded from, so tokens from another process never match
+        (the data version seen by the caches and ETags in this mode).
+        """
+        return (self.generation, self._source_version)
+
+    def refresh(self):
+        """
+        Loads a fresh copy if the source file changed since the last one.
+        Returns True when it did.
+        """
+        if self.source_version() == self._source_version:
+            return False
+        self.load()
+        return True
+
+    def start(self):
+        """
+        Loads the first copy and starts watching the source file.
+        """
+        self.load()
+        self._watcher = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        """
+        Polls the source file until stopped.
+        """
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except (OSError, sqlite3.Error):
+                # The file may be mid-replacement; the next poll retries
+                pass
+
+    def stop(self):
+        """
+        Stops the watcher.
+        """
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        if self._watcher_conn is not None:
+            self._watcher_conn.close()
+            self._watcher_conn = None
+
+    def stats(self):
+        """
+        Returns the snapshot counters.
+        """
+        return {
+            "generation": self.generation,
+            "swaps": self.swaps,
+            "bytes": self.size_bytes,
+            "load_seconds": round(self.load_seconds, 6),
+        }
@@ -0,0 +1,295 @@
+from collections import namedtuple
+import sqlite3
+import threading
+import time
+
+import query_timeout
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Upper bounds of the statements-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Upper bounds of the writes-per-transaction histogram buckets
+WRITE_BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Statement text kept in metric labels and logs
+STATEMENT_LABEL_LENGTH = 120
+
+# One executed statement: its SQL and parameters, wall time and rows returned
+QueryTiming = namedtuple("QueryTiming", ["sql", "params", "seconds", "rows"])
+
+
+def statement_label(sql):
+    """
+    Collapses the whitespace of a statement and shortens it for labels.
+    """
+    text = " ".join(sql.split())
+    if len(text) > STATEMENT_LABEL_LENGTH:
+        text = text[:STATEMENT_LABEL_LENGTH - 1] + "…"
+    return text
+
+
+class FetchedCursor:
+    """
+    The rows of a statement that has already run to completion, with the
+    parts of the sqlite3.Cursor interface the app uses.
+    """
+
+    def __init__(self, rows, description):
+        self.rows = rows
+        self.description = description
+        self._position = 0
+
+    def fetchone(self):
+        """
+        Returns the next row, or None when there are no more.
+        """
+        if self._position >= len(self.rows):
+            return None
+        self._position += 1
+        return self.rows[self._position - 1]
+
+    def fetchall(self):
+        """
+        Returns the rows not fetched yet.
+        """
+        rows = self.rows[self._position:]
+        self._position = len(self.rows)
+        return rows
+
+    def __iter__(self):
+        while self._position < len(self.rows):
+            yield self.fetchone()
+
+
+class InstrumentedConnection:
+    """
+    Wraps a sqlite3 connection and reports every statement run through
+    execute() to 'on_query' as a QueryTiming.
+
+    SQLite does most of its work while rows are being stepped through, so
+    each statement is read to the end before it is timed; its rows come
+    back in a FetchedCursor. Everything else goes to the connection.
+
+    A statement interrupted because 'deadline' expired raises QueryTimeout.
+    """
+
+    def __init__(self, connection, on_query, deadline=None):
+        self.connection = connection
+        self.on_query = on_query
+        self.deadline = deadline
+
+    def execute(self, sql, params=()):
+        """
+        Runs a statement to completion and records its timing.
+        """
+        start = time.perf_counter()
+        try:
+            cursor = self.connection.execute(sql, params)
+            rows = cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            query_timeout.check_interrupted(e, self.deadline)
+            raise
+        seconds = time.perf_counter() - start
+        self.on_query(QueryTiming(sql, params, seconds, len(rows)))
+        return FetchedCursor(rows, cursor.description)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus style.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Adds one observation.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    """
+    Formats Prometheus labels, escaping the values.
+    """
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """
+    Request and SQL statistics aggregated per route, and the transactions
+    of the write queue, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._request_seconds = {}
+        self._query_seconds = {}
+        self._queries_per_request = {}
+        self._statements = {}
+        self._question_seconds = {}
+        self._guard_events = {}
+        self._write_batch_sizes = Histogram(WRITE_BATCH_BUCKETS)
+        self._write_seconds = Histogram(buckets)
+        self._write_commit_seconds = Histogram(buckets)
+        self._writes = {}
+
+    def observe_request(self, route, status, seconds, queries):
+        """
+        Records one finished request and the statements it ran.
+        """
+        with self._lock:
+            self._requests[(route, status)] = self._requests.get((route, status), 0) + 1
+            self._request_seconds.setdefault(route, Histogram(self.buckets)).observe(seconds)
+            self._queries_per_request.setdefault(route, Histogram(QUERY_COUNT_BUCKETS)).observe(len(queries))
+            query_histogram = self._query_seconds.setdefault(route, Histogram(self.buckets))
+            for query in queries:
+                query_histogram.observe(query.seconds)
+                totals = self._statements.setdefault((route, statement_label(query.sql)), [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += query.seconds
+                totals[2] += query.rows
+
+    def observe_question(self, question_id, seconds):
+        """
+        Records how long one Q&A query took to run.
+        """
+        with self._lock:
+            self._question_seconds.setdefault(str(question_id), Histogram(self.buckets)).observe(seconds)
+
+    def observe_guard(self, route, outcome):
+        """
+        Counts a search turned away or cut short ("too_short", "too_long",
+        "truncated") or a request whose queries were interrupted
+        ("timed_out").
+        """
+        with self._lock:
+            self._guard_events[(route, outcome)] = self._guard_events.get((route, outcome), 0) + 1
+
+    def observe_write_batch(self, size, failed, latencies, seconds):
+        """
+        Records one transaction of the write queue: its number of writes,
+        how many of them failed, each write's seconds from being queued to
+        being committed, and the transaction's seconds.
+        """
+        with self._lock:
+            self._write_batch_sizes.observe(size)
+            self._write_commit_seconds.observe(seconds)
+            for latency in latencies:
+                self._write_seconds.observe(latency)
+            self._writes["committed"] = self._writes.get("committed", 0) + size - failed
+            self._writes["failed"] = self._writes.get("failed", 0) + failed
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_requests_total Requests served, by route and status.",
+                      "# TYPE http_requests_total counter"]
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{_labels(route=route, status=status)} {count}")
+
+            lines += ["# HELP query_guard_events_total Searches rejected or truncated and requests timed out, "
+                      "by route and outcome.",
+                      "# TYPE query_guard_events_total counter"]
+            for (route, outcome), count in sorted(self._guard_events.items()):
+                lines.append(f"query_guard_events_total{_labels(route=route, outcome=outcome)} {count}")
+
+            lines += ["# HELP db_writes_total Writes applied by the write queue, by outcome.",
+                      "# TYPE db_writes_total counter"]
+            for outcome, count in sorted(self._writes.items()):
+                lines.append(f"db_writes_total{_labels(outcome=outcome)} {count}")
+
+            for name, label, description, histograms in (
+                ("http_request_duration_seconds", "route", "Time to produce a response, by route.",
+                 self._request_seconds),
+                ("db_query_duration_seconds", "route", "Wall time of each SQL statement, by route.",
+                 self._query_seconds),
+                ("db_queries_per_request", "route", "SQL statements run by each request, by route.",
+                 self._queries_per_request),
+                ("qa_query_duration_seconds", "question", "Wall time of each Q&A query, by question id.",
+                 self._question_seconds),
+            ):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for value, histogram in sorted(histograms.items()):
+                    lines += _histogram_lines(name, histogram, **{label: value})
+
+            for name, description, histogram in (
+                ("db_write_batch_size", "Writes committed per write-queue transaction.",
+                 self._write_batch_sizes),
+                ("db_write_latency_seconds", "Time from queueing a write to its commit.", self._write_seconds),
+                ("db_write_transaction_seconds", "Wall time of each write-queue transaction.",
+                 self._write_commit_seconds),
+            ):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                lines += _histogram_lines(name, histogram)
+
+            for index, (name, description) in enumerate((
+                ("db_statement_executions_total", "Times each SQL statement ran, by route."),
+                ("db_statement_seconds_total", "Total wall time of each SQL statement, by route."),
+                ("db_statement_rows_total", "Rows returned by each SQL statement, by route."),
+            )):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+                for (route, statement), totals in sorted(self._statements.items()):
+                    lines.append(f"{name}{_labels(route=route, statement=statement)} {totals[index]}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, histogram, **labels):
+    """
+    The bucket, sum and count lines of one histogram.
+    """
+    lines = [f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+             for bound, count in zip(histogram.buckets, histogram.counts)]
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def format_gauges(prefix, values, description):
+    """
+    Formats a dict of numbers (nested dicts are skipped) as Prometheus
+    gauges named '<prefix>_<key>'.
+    """
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, (int, float)):
+            name = f"{prefix}_{key}"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(queries, seconds):
+    """
+    Builds a Server-Timing header value with the time spent in SQL and
+    the whole request, in milliseconds.
+    """
+    db_ms = sum(query.seconds for query in queries) * 1000
+    return (f'db;dur={db_ms:.2f};desc="{len(queries)} queries", '
+            f"total;dur={seconds * 1000:.2f}")
@@ -0,0 +1,65 @@
+import sqlite3
+
+import indexes
+import lyrics_index
+import person_credits
+import release_dates
+import similar_songs
+import song_credits
+import summaries
+
+
+# Each migration is (version, description, function taking a connection).
+# The database keeps the last applied version in PRAGMA user_version, so
+# migrations run exactly once and always in order.
+MIGRATIONS = [
+    (1, "Full-text index over Letras", lyrics_index.create_index),
+    (2, "Summary tables for the home and Q&A pages", summaries.create_summaries),
+    (3, "Person-side indexes on the role tables", person_credits.create_role_indexes),
+    (4, "ISO release_date column on Musicas", release_dates.create_release_date),
+    (5, "Reverse-direction and covering indexes", indexes.create_covering_indexes),
+    (6, "Per-song credits read model", song_credits.create_credits),
+    (7, "Similar-songs index", similar_songs.create_similar),
+    (8, "Songs list ordered on a non-null date key", release_dates.create_song_order_index),
+    (9, "Song credits rows rewritten only when a projected column changes", song_credits.narrow_song_trigger),
+]
+
+# Paths already migrated by this process
+_migrated = set()
+
+
+def current_version(conn):
+    """
+    Returns the schema version recorded in the database.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path):
+    """
+    Applies every pending migration to the database at 'path'.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    conn = sqlite3.connect(path)
+    try:
+        version = current_version(conn)
+        for number, _description, apply in MIGRATIONS:
+            if number <= version:
+                continue
+            with conn:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+            applied.append(number)
+    finally:
+        conn.close()
+    _migrated.add(path)
+    return applied
+
+
+def ensure_migrated(path):
+    """
+    Migrates the database the first time it is used by this process.
+    """
+    if path not in _migrated:
+        migrate(path)
@@ -0,0 +1,86 @@
+import base64
+from collections import namedtuple
+import json
+import math
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# One page of rows plus the cursor of the next page (None on the last page)
+Page = namedtuple("Page", ["rows", "next_cursor"])
+
+
+def encode_cursor(values):
+    """
+    Turns the sort key of the last row of a page into an opaque URL token.
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+def _bindable(value):
+    """
+    Tells whether a cursor value is one SQLite can bind: text, a 64-bit
+    integer, a finite number or null.
+    """
+    if value is None or isinstance(value, str):
+        return True
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2**63 <= value < 2**63
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def decode_cursor(token, length=None):
+    """
+    Reverses encode_cursor(). Raises ValueError for a malformed token, one
+    holding anything but a list of bindable values, or one whose list is
+    not 'length' long.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page cursor: {token!r}") from e
+    if (not isinstance(values, list) or (length is not None and len(values) != length)
+            or not all(_bindable(value) for value in values)):
+        raise ValueError(f"Invalid page cursor: {token!r}")
+    return values
+
+
+def clamp_limit(limit):
+    """
+    Keeps a requested page size between 1 and MAX_PAGE_SIZE.
+    """
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(db, columns, source, key, params=(), where=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetches one page of 'SELECT columns FROM source' ordered by 'key', a
+    list of SQL expressions that together identify a row. Rather than an
+    OFFSET, the page starts right after the row whose key is 'after', so
+    every page costs the same no matter how deep it is.
+    """
+    key_columns = ", ".join(f"{expression} AS _key{i}" for i, expression in enumerate(key))
+    conditions = [where] if where else []
+    args = list(params)
+    if after is not None:
+        if len(after) != len(key):
+            raise ValueError("Page cursor does not match this listing")
+        conditions.append(f"({', '.join(key)}) > ({', '.join('?' * len(key))})")
+        args += after
+    sql = f"SELECT {columns}, {key_columns} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {', '.join(key)} LIMIT ?"
+    args.append(limit + 1)
+
+    rows = db.execute(sql, args).fetchall()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor(last[f"_key{i}"] for i in range(len(key))))
@@ -0,0 +1,113 @@
+import json
+
+from pagination import DEFAULT_PAGE_SIZE, Page, encode_cursor
+from search_guard import MAX_MATCHED_PEOPLE, escape_like
+
+
+# Role keys used by the person search page, in tab order
+ROLES = ("produtor", "artista", "escritor")
+
+# Reverse-direction indexes so a person's songs are found without scanning
+# the junction tables, whose primary keys are led by song_id
+ROLE_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_produtores_producer ON Produtores (producer_id, song_id);
+    CREATE INDEX IF NOT EXISTS idx_artistas_artist ON Artistas (artist_id, song_id);
+    CREATE INDEX IF NOT EXISTS idx_escritores_writer ON Escritores (writer_id, song_id);
+"""
+
+# People whose name contains the search text, in id order. The text is
+# escaped so '%' and '_' match themselves.
+MATCHED_PEOPLE_QUERY = """
+    SELECT person_id FROM Pessoas WHERE person LIKE ? ESCAPE '\\' ORDER BY person_id LIMIT ?
+"""
+
+# The matching people are resolved once, each role's songs are fetched
+# through the person-side indexes, and only the songs on the requested page
+# of each role get their credit lists, from correlated subqueries instead
+# of joining all three roles at once. Each role pages independently,
+# starting after its own (song_title, song_id) cursor. Songs without a
+# title sort first under '': a cursor holding NULL would match no row.
+PERSON_CREDITS_QUERY = """
+    WITH Matched AS (
+        SELECT value AS person_id FROM json_each(?)
+    ),
+    Credited AS (
+        SELECT 'produtor' AS role, song_id FROM Produtores WHERE producer_id IN Matched
+        UNION
+        SELECT 'artista', song_id FROM Artistas WHERE artist_id IN Matched
+        UNION
+        SELECT 'escritor', song_id FROM Escritores WHERE writer_id IN Matched
+    ),
+    Cursors (role, song_title, song_id) AS (
+        VALUES ('produtor', ?, ?), ('artista', ?, ?), ('escritor', ?, ?)
+    ),
+    Ranked AS (
+        SELECT
+            Credited.role AS role,
+            Musicas.song_id AS song_id,
+            Musicas.song_title AS song_title,
+            Musicas.song_url AS song_url,
+            ROW_NUMBER() OVER (
+                PARTITION BY Credited.role ORDER BY COALESCE(Musicas.song_title, ''), Musicas.song_id
+            ) AS position
+        FROM Credited
+        JOIN Musicas ON Musicas.song_id = Credited.song_id
+        JOIN Cursors ON Cursors.role = Credited.role
+        WHERE Cursors.song_id IS NULL
+        OR (COALESCE(Musicas.song_title, ''), Musicas.song_id) > (COALESCE(Cursors.song_title, ''), Cursors.song_id)
+    )
+    SELECT
+        Ranked.role AS role,
+        Ranked.song_id AS song_id,
+        Ranked.song_title AS song_title,
+        Ranked.song_url AS song_url,
+        (SELECT GROUP_CONCAT(DISTINCT Pessoas.person)
+         FROM Artistas JOIN Pessoas ON Pessoas.person_id = Artistas.artist_id
+         WHERE Artistas.song_id = Ranked.song_id) AS artistas,
+        (SELECT GROUP_CONCAT(DISTINCT Pessoas.person)
+         FROM Escritores JOIN Pessoas ON Pessoas.person_id = Escritores.writer_id
+         WHERE Escritores.song_id = Ranked.song_id) AS escritores,
+        (SELECT GROUP_CONCAT(DISTINCT Pessoas.person)
+         FROM Produtores JOIN Pessoas ON Pessoas.person_id = Produtores.producer_id
+         WHERE Produtores.song_id = Ranked.song_id) AS produtores
+    FROM Ranked
+    WHERE Ranked.position <= ?
+    ORDER BY COALESCE(Ranked.song_title, ''), Ranked.song_id
+"""
+
+
+def create_role_indexes(conn):
+    """
+    Creates the person-side indexes on the role tables.
+    """
+    conn.executescript(ROLE_INDEXES)
+
+
+def find_person_credits(db, query, after=None, limit=DEFAULT_PAGE_SIZE, max_people=MAX_MATCHED_PEOPLE):
+    """
+    Returns, for every role, a page of the songs credited to people whose
+    name contains 'query', each with its full producer, artist and writer
+    lists. 'after' maps a role to the cursor its page starts after.
+
+    Only the first 'max_people' matching people are searched. Returns
+    (pages by role, True when more people matched).
+    """
+    after = after or {}
+    people = [row[0] for row in db.execute(MATCHED_PEOPLE_QUERY, (f"%{escape_like(query)}%", max_people + 1))]
+    params = [json.dumps(people[:max_people])]
+    for role in ROLES:
+        params += after.get(role) or [None, None]
+    params.append(limit + 1)
+
+    rows = {role: [] for role in ROLES}
+    for row in db.execute(PERSON_CREDITS_QUERY, params):
+        rows[row["role"]].append(row)
+
+    results = {}
+    for role, role_rows in rows.items():
+        if len(role_rows) > limit:
+            last = role_rows[limit - 1]
+            results[role] = Page(role_rows[:limit], encode_cursor([last["song_title"] or "", last["song_id"]]))
+        else:
+            results[role] = Page(role_rows, None)
+    return results, len(people) > max_people
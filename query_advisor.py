@@ -0,0 +1,102 @@
+import re
+
+from pagination import encode_cursor
+
+
+# Requests that together run every query the app can issue. The cursors
+# only need the right shape: the plan does not depend on their values.
+ADVISOR_URLS = [
+    "/",
+    "/albums",
+    f"/albums?after={encode_cursor(['M', 0])}",
+    "/songs",
+    "/songs?from=2019-01-01&to=2019-12-31",
+    f"/songs?after={encode_cursor(['2019-01-01', 0])}",
+    "/search?q=love",
+    "/person_search?q=Jack",
+    "/lyrics_search?q=midnight",
+    "/song/1",
+    "/song/1/similar",
+    "/questions",
+]
+
+# Plan steps that need a closer look
+_FLAGGED = re.compile(r"^SCAN (?!.*\bUSING (COVERING )?INDEX\b)(?!.*VIRTUAL TABLE)(?!\d+ CONSTANT ROWS)|TEMP B-TREE")
+
+# Statements FTS5 runs on its own shadow tables
+_INTERNAL = re.compile(r"\bFROM 'main'\.")
+
+# Steps known to be unavoidable, per route, with the reason. A step is
+# accepted when it equals the text or starts with it followed by a space.
+# Plans name tables by their alias when the query gives them one.
+ACCEPTED = {
+    ("/", "SCAN ResumoTotais"): "the home page shows every row of this dozen-row table",
+    ("/search", "SCAN Musicas"): "loads every title into the trigram index (title_index.py) once per database version",
+    ("/search", "SCAN Albuns"): "loads every title into the trigram index (title_index.py) once per database version",
+    ("/person_search", "SCAN Pessoas"): "name search is LIKE '%q%', which no B-tree index can serve",
+    ("/person_search", "SCAN Matched"): "the people matched by name, resolved once",
+    ("/person_search", "SCAN Credited"): "the matched people's songs, read to rank them by title",
+    ("/person_search", "SCAN Cursors"): "three-row table of per-role page cursors",
+    ("/person_search", "SCAN Ranked"): "the ranked songs, cut to one page per role",
+    ("/person_search", "SCAN (subquery)"): "the ranked songs, cut to one page per role",
+    ("/person_search", "UNION USING TEMP B-TREE"): "deduplicates the matched people's songs per role",
+    ("/person_search", "USE TEMP B-TREE"): "ROW_NUMBER() and GROUP_CONCAT(DISTINCT) over the matched songs",
+    ("/lyrics_search", "USE TEMP B-TREE FOR ORDER BY"): "BM25 rank only exists after matching",
+    ("/lyrics_search", "SCAN sqlite_master"): "looks up the lyrics layout in the schema, which is held in memory",
+    ("/questions", "SCAN r"): "summary tables with one row per album or song, where most rows pass the filter",
+    ("/questions", "SCAN a"): "question 6 lists every album",
+    ("/questions", "SCAN ResumoCategorias"): "summary table with one row per category",
+    ("/questions", "USE TEMP B-TREE FOR ORDER BY"): "question 5 sorts only the tags tied for the top count",
+}
+
+
+def collect_statements(app, get_db, urls):
+    """
+    Runs each request with the result cache disabled and returns the
+    (route, SQL with its parameters inlined) pairs it executed.
+    """
+    statements = []
+    seen = set()
+    for url in urls:
+        route = url.split("?")[0]
+        traced = []
+        with app.test_request_context(url):
+            db = get_db()
+            db.set_trace_callback(traced.append)
+            try:
+                app.full_dispatch_request()
+            finally:
+                db.set_trace_callback(None)
+        for sql in traced:
+            if not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE) or _INTERNAL.search(sql):
+                continue
+            if (route, sql) not in seen:
+                seen.add((route, sql))
+                statements.append((route, sql))
+    return statements
+
+
+def explain(db, sql):
+    """
+    Returns the EXPLAIN QUERY PLAN steps of one statement.
+    """
+    # Materialized subqueries are numbered by position in the statement
+    return [re.sub(r"\(subquery-\d+\)", "(subquery)", row[3])
+            for row in db.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def review_plans(db, statements):
+    """
+    Flags the SCAN and TEMP B-TREE steps of every statement.
+    Returns a list of (route, sql, step, reason) where 'reason' is None
+    for steps that are not known to be acceptable.
+    """
+    findings = []
+    for route, sql in statements:
+        for step in explain(db, sql):
+            if not _FLAGGED.search(step):
+                continue
+            reason = next((why for (where, accepted), why in ACCEPTED.items()
+                           if where == route and (step + " ").startswith(accepted + " ")), None)
+            findings.append((route, sql, step, reason))
+    return findings
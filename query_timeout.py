@@ -0,0 +1,77 @@
+import sqlite3
+import time
+
+
+# WSGI environ key under which a server (see asgi.py) hands the app a
+# Deadline that started when the request arrived
+ENVIRON_KEY = "catalog.deadline"
+
+# SQLite virtual machine instructions run between two deadline checks
+# (about a third of a millisecond of work; checking more often than that
+# costs measurable time on long statements)
+PROGRESS_INTERVAL = 10000
+
+
+class QueryTimeout(Exception):
+    """
+    Raised when a statement is interrupted because its request ran out
+    of time.
+    """
+
+
+class Deadline:
+    """
+    Wall-clock budget of one request, shared with the threads running its
+    queries. 'cancel()' ends it early. A deadline with a 'parent' (a
+    tighter budget for part of a request) also expires with its parent.
+    """
+
+    def __init__(self, seconds, parent=None):
+        self.seconds = seconds
+        self.parent = parent
+        self.expires_at = time.monotonic() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Expires the deadline now.
+        """
+        self.cancelled = True
+
+    def expired(self):
+        """
+        Tells whether the budget is used up or was cancelled.
+        """
+        return (self.cancelled or time.monotonic() >= self.expires_at
+                or (self.parent is not None and self.parent.cancelled))
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, never negative.
+        """
+        if self.cancelled or (self.parent is not None and self.parent.cancelled):
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+def interrupt_after(conn, deadline):
+    """
+    Makes SQLite abort the statement running on 'conn' once 'deadline'
+    expires, through a progress handler. A deadline of None removes the
+    handler.
+    """
+    if deadline is None:
+        conn.set_progress_handler(None, 0)
+    else:
+        conn.set_progress_handler(deadline.expired, PROGRESS_INTERVAL)
+
+
+def check_interrupted(error, deadline):
+    """
+    Raises QueryTimeout when 'error' is SQLite aborting a statement
+    because 'deadline' expired; does nothing otherwise.
+    """
+    if deadline is not None and deadline.expired() and isinstance(error, sqlite3.OperationalError):
+        raise QueryTimeout(f"Query interrupted: the request ran for more than {deadline.seconds:g}s") from error
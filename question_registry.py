@@ -0,0 +1,102 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import tomllib
+
+
+# Seconds an answer is reused when its question sets no 'ttl'
+DEFAULT_TTL = 300
+
+# One Q&A question as defined in the questions file
+Question = namedtuple("Question", ["id", "question", "query", "ttl"])
+
+
+def load_questions(path):
+    """
+    Reads the questions file (TOML, one [[questions]] table per question)
+    and returns the questions in file order. Raises ValueError when a
+    question is incomplete or an id is used twice.
+    """
+    with open(path, "rb") as file:
+        entries = tomllib.load(file).get("questions", [])
+    questions = []
+    seen = set()
+    for position, entry in enumerate(entries, 1):
+        missing = {"id", "question", "query"} - entry.keys()
+        if missing:
+            raise ValueError(f"{path}: question {position} has no {', '.join(sorted(missing))}")
+        if entry["id"] in seen:
+            raise ValueError(f"{path}: question id {entry['id']} is used twice")
+        seen.add(entry["id"])
+        questions.append(Question(int(entry["id"]), entry["question"], entry["query"],
+                                  float(entry.get("ttl", DEFAULT_TTL))))
+    return questions
+
+
+class QuestionRegistry:
+    """
+    The Q&A questions with their cached answers.
+
+    An answer is reused until its question's TTL runs out or the database
+    version changes. Questions without a usable answer are run
+    concurrently on a small thread pool, each on its own connection.
+    """
+
+    def __init__(self, questions, workers=4):
+        self.questions = {question.id: question for question in questions}
+        self.workers = workers
+        self._answers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _fresh(self, question_id, version, now):
+        """
+        Returns the cached answer of a question if it can still be used.
+        """
+        cached = self._answers.get(question_id)
+        if cached is not None and cached[0] == version and cached[1] > now:
+            return cached[2]
+        return None
+
+    def answer(self, question_ids, run, version):
+        """
+        Returns the answers to the given questions, in the same order.
+        'run(question)' computes one answer and must be safe to call from
+        several threads at once; answers marked with an "error" are not
+        cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            answers = {question_id: self._fresh(question_id, version, now) for question_id in question_ids}
+        stale = [self.questions[question_id] for question_id, answer in answers.items() if answer is None]
+
+        if len(stale) == 1 or self.workers <= 1:
+            computed = [run(question) for question in stale]
+        elif stale:
+            computed = list(self._get_executor().map(run, stale))
+        else:
+            computed = []
+
+        with self._lock:
+            for question, answer in zip(stale, computed):
+                answers[question.id] = answer
+                if not answer.get("error"):
+                    self._answers[question.id] = (version, now + question.ttl, answer)
+        return [answers[question_id] for question_id in question_ids]
+
+    def _get_executor(self):
+        """
+        Returns the worker pool, starting it on first use.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="questions")
+            return self._executor
+
+    def clear(self):
+        """
+        Drops every cached answer.
+        """
+        with self._lock:
+            self._answers.clear()
@@ -0,0 +1,68 @@
+# Musicas.date holds DD/MM/YYYY text, which does not sort chronologically.
+# release_date keeps the same day as ISO text (YYYY-MM-DD) so the songs
+# list and date-range filters can use an index instead of computing the
+# conversion for every row.
+
+
+def iso_date_sql(column):
+    """
+    SQL expression converting a DD/MM/YYYY column to ISO text.
+    Evaluates to NULL when the value is not a valid date.
+    """
+    return (f"STRFTIME('%Y-%m-%d', SUBSTR({column}, 7, 4) || '-' || "
+            f"SUBSTR({column}, 4, 2) || '-' || SUBSTR({column}, 1, 2))")
+
+
+RELEASE_DATE_TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS Musicas_release_date_insert AFTER INSERT ON Musicas BEGIN
+        UPDATE Musicas SET release_date = {iso_date_sql("new.date")} WHERE song_id = new.song_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS Musicas_release_date_update AFTER UPDATE OF date, release_date ON Musicas
+    WHEN new.release_date IS NOT {iso_date_sql("new.date")} BEGIN
+        UPDATE Musicas SET release_date = {iso_date_sql("new.date")} WHERE song_id = new.song_id;
+    END;
+"""
+
+
+def create_release_date(conn):
+    """
+    Adds Musicas.release_date with its index and triggers, then fills it.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Musicas)")]
+    if "release_date" not in columns:
+        conn.execute("ALTER TABLE Musicas ADD COLUMN release_date TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_musicas_release_date ON Musicas (release_date, song_id)")
+    conn.executescript(RELEASE_DATE_TRIGGERS)
+    backfill_release_dates(conn)
+
+
+def backfill_release_dates(conn):
+    """
+    Recomputes release_date wherever it does not match Musicas.date.
+    Returns (rows updated, rows whose date could not be parsed).
+    """
+    expected = iso_date_sql("date")
+    updated = conn.execute(
+        f"UPDATE Musicas SET release_date = {expected} WHERE release_date IS NOT {expected}"
+    ).rowcount
+    unparsed = conn.execute(
+        f"SELECT COUNT(*) FROM Musicas WHERE {expected} IS NULL"
+    ).fetchone()[0]
+    return updated, unparsed
+
+
+# Sort key of the songs list. release_date is NULL for songs without a
+# valid date, and a cursor holding NULL would match no row, so they sort
+# first under '' instead.
+SONG_ORDER_KEY = "COALESCE(release_date, '')"
+
+
+def create_song_order_index(conn):
+    """
+    Replaces the index on (release_date, song_id) with one on the songs
+    list's sort key, which also serves its date-range filters.
+    """
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_musicas_song_order ON Musicas ({SONG_ORDER_KEY}, song_id)")
+    conn.execute("DROP INDEX IF EXISTS idx_musicas_release_date")
+    conn.execute("ANALYZE Musicas")
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+
+
+def cache_key(route, args):
+    """
+    Builds a cache key from a route name and its query arguments.
+    Whitespace in the search text ('q') is collapsed and ASCII text
+    lowercased, since the searches are case-insensitive for ASCII anyway.
+    Other arguments, such as page cursors, are kept as they are.
+    """
+    normalized = []
+    for name, value in sorted(args.items()):
+        value = "" if value is None else str(value)
+        if name == "q":
+            value = " ".join(value.split())
+            if value.isascii():
+                value = value.lower()
+        normalized.append((name, value))
+    return (route, tuple(normalized))
+
+
+class ResultCache:
+    """
+    LRU cache of query results shared by every request.
+
+    All entries are dropped as soon as the database changes, which is
+    detected through PRAGMA data_version on a long-lived watcher connection
+    (bumped by commits from any other connection), through the file's
+    mtime, size and inode (which change when the file is replaced) and
+    through the write-ahead log's mtime and size. A 'version_source'
+    callable replaces that detection when the data is not read from the
+    file directly (see memory_snapshot.py).
+    """
+
+    def __init__(self, path, max_entries=512, version_source=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.version_source = version_source
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._watcher = None
+        self._watched_inode = None
+
+    def _data_version(self):
+        """
+        Returns a token that changes whenever the database content changes.
+        """
+        if self.version_source is not None:
+            return self.version_source()
+        info = os.stat(self.path)
+        if self._watcher is None or info.st_ino != self._watched_inode:
+            if self._watcher is not None:
+                self._watcher.close()
+            self._watcher = sqlite3.connect(self.path, check_same_thread=False)
+            self._watched_inode = info.st_ino
+        data_version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+        try:
+            wal = os.stat(self.path + "-wal")
+            wal_version = (wal.st_mtime_ns, wal.st_size)
+        except FileNotFoundError:
+            wal_version = None
+        return (data_version, info.st_mtime_ns, info.st_size, info.st_ino, wal_version)
+
+    def version(self):
+        """
+        Returns the current database version token, which changes
+        whenever the database content changes.
+        """
+        with self._lock:
+            return self._data_version()
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for 'key', calling 'compute()' on a miss.
+        Exceptions raised by 'compute' are never cached.
+        """
+        if self.max_entries <= 0:
+            return compute()
+        with self._lock:
+            version = self._data_version()
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                    self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            # Skip storing if the data changed while we were computing
+            if version == self._version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        """
+        Drops every cached entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,56 @@
+import re
+
+
+# Shortest search text accepted, in characters: one letter matches most
+# of the catalog and costs as much as listing it
+MIN_QUERY_LENGTH = 2
+
+# Longest search text accepted, in characters
+MAX_QUERY_LENGTH = 100
+
+# Shortest prefix accepted before a '*' in lyrics searches ("a*" expands
+# to almost every word in the index)
+MIN_PREFIX_LENGTH = 3
+
+# People searched at most for one name query; more matches are reported
+# so the page can ask for a more specific name
+MAX_MATCHED_PEOPLE = 50
+
+_PREFIX_TERM = re.compile(r"(\S*?)\*")
+
+
+class RejectedSearch(ValueError):
+    """
+    Raised for search text that is too short or too long to run.
+    'reason' is the metrics label ("too_short" or "too_long").
+    """
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def check_search(text, prefixes=False):
+    """
+    Raises RejectedSearch unless 'text' (already stripped) has between
+    MIN_QUERY_LENGTH and MAX_QUERY_LENGTH characters. With 'prefixes',
+    every 'term*' must also have MIN_PREFIX_LENGTH characters.
+    """
+    if len(text) < MIN_QUERY_LENGTH:
+        raise RejectedSearch(f"Type at least {MIN_QUERY_LENGTH} characters to search", "too_short")
+    if len(text) > MAX_QUERY_LENGTH:
+        raise RejectedSearch(f"Searches are limited to {MAX_QUERY_LENGTH} characters", "too_long")
+    if prefixes:
+        for term in _PREFIX_TERM.findall(text):
+            if len(term.strip('"')) < MIN_PREFIX_LENGTH:
+                raise RejectedSearch(
+                    f"Type at least {MIN_PREFIX_LENGTH} characters before a *", "too_short"
+                )
+
+
+def escape_like(text, escape="\\"):
+    """
+    Escapes the LIKE wildcards ('%' and '_') and the escape character in
+    'text', for a pattern used with ESCAPE 'escape'.
+    """
+    return text.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
@@ -0,0 +1,284 @@
+from array import array
+from collections import Counter, defaultdict
+from heapq import nlargest
+import json
+import math
+import re
+import sys
+import time
+
+from collaboration_graph import CREDITS_QUERY
+import lyrics_storage
+
+
+# Neighbours kept per song
+DEFAULT_NEIGHBOURS = 10
+
+# Share of the similarity each kind of feature contributes. Every block of
+# a song's vector is normalized on its own and scaled by the square root
+# of its weight, so the dot product of two songs is the weighted sum of
+# the cosine similarities of their lyrics, tags and credits.
+BLOCK_WEIGHTS = {"lyrics": 0.5, "tags": 0.3, "credits": 0.2}
+
+# Lyric terms kept per song (those with the highest TF-IDF weight)
+TERMS_PER_SONG = 24
+
+# Songs scanned per feature when looking for neighbours: the ones the
+# feature weighs most in. Bounds the cost of features most songs share.
+MAX_POSTINGS = 64
+
+# Top-k neighbours of every song, as two arrays of the same length: the
+# neighbours' song ids (64-bit) and their scores (32-bit floats), packed
+# little-endian, best first
+SIMILAR_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS MusicasSemelhantes (
+        song_id INTEGER PRIMARY KEY,
+        neighbours BLOB NOT NULL,
+        scores BLOB NOT NULL
+    );
+"""
+
+TAGS_QUERY = "SELECT song_id, tag_id FROM Descricoes"
+
+SONG_QUERY = "SELECT neighbours, scores FROM MusicasSemelhantes WHERE song_id = ?"
+
+TITLES_QUERY = """
+    SELECT song_id, song_title, song_url FROM Musicas
+    WHERE song_id IN (SELECT value FROM json_each(?))
+"""
+
+# Section headers such as "[Chorus]" or "[Verse 1: Taylor Swift]"
+_SECTION = re.compile(r"\[[^\]]*\]")
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+
+def _pack(typecode, values):
+    """
+    Packs numbers into a little-endian blob.
+    """
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, blob):
+    """
+    Reads back a blob written by _pack().
+    """
+    unpacked = array(typecode)
+    unpacked.frombytes(blob)
+    if sys.byteorder != "little":
+        unpacked.byteswap()
+    return unpacked
+
+
+def lyric_terms(text):
+    """
+    Counts the words of a song's lyrics, lowercased, leaving out section
+    headers, numbers and one-letter words.
+    """
+    return Counter(_WORD.findall(_SECTION.sub(" ", text or "").lower()))
+
+
+def _weigh(features, frequencies, count, weight, keep=None):
+    """
+    TF-IDF weights of one block of a song's features ({feature: count}),
+    normalized and scaled by the square root of the block weight.
+    Features every song has weigh nothing and are dropped; 'keep' limits
+    the block to its heaviest features.
+    """
+    weighted = {}
+    for feature, times in features.items():
+        idf = math.log(count / frequencies[feature])
+        if idf > 0:
+            weighted[feature] = (1 + math.log(times)) * idf
+    if keep is not None and len(weighted) > keep:
+        weighted = dict(nlargest(keep, weighted.items(), key=lambda item: item[1]))
+    norm = math.sqrt(sum(value * value for value in weighted.values()))
+    scale = math.sqrt(weight) / norm if norm else 0
+    return {feature: value * scale for feature, value in weighted.items()}
+
+
+def song_vectors(conn):
+    """
+    Reads every song's lyrics, tags and credits and returns (song ids,
+    vectors), each vector a dict of feature -> weight. Features are
+    ("lyrics", word), ("tags", tag_id) and ("credits", person_id).
+    """
+    song_ids, blocks = [], {}
+    for song_id, lyrics in lyrics_storage.song_lyrics(conn):
+        song_ids.append(song_id)
+        blocks[song_id] = {
+            "lyrics": {("lyrics", word): times for word, times in lyric_terms(lyrics).items()},
+            "tags": {},
+            "credits": {},
+        }
+    for name, query in (("tags", TAGS_QUERY), ("credits", CREDITS_QUERY)):
+        for song_id, item_id in conn.execute(query):
+            if song_id in blocks:
+                blocks[song_id][name][(name, item_id)] = 1
+
+    # Songs each feature occurs in
+    frequencies = Counter()
+    for song in blocks.values():
+        for features in song.values():
+            frequencies.update(features.keys())
+    count = len(song_ids)
+    vectors = []
+    for song_id in song_ids:
+        vector = {}
+        for name, features in blocks.pop(song_id).items():
+            keep = TERMS_PER_SONG if name == "lyrics" else None
+            vector.update(_weigh(features, frequencies, count, BLOCK_WEIGHTS[name], keep))
+        vectors.append(vector)
+    return song_ids, vectors
+
+
+def _postings(vectors):
+    """
+    Inverted index of the vectors: feature -> [(weight, song index)],
+    heaviest first, cut to MAX_POSTINGS.
+    """
+    postings = defaultdict(list)
+    for index, vector in enumerate(vectors):
+        for feature, weight in vector.items():
+            postings[feature].append((weight, index))
+    for feature, songs in postings.items():
+        songs.sort(reverse=True)
+        del songs[MAX_POSTINGS:]
+    return postings
+
+
+def _scores(index, vectors, postings):
+    """
+    Similarity of song 'index' with every song sharing one of its
+    features, as {song index: score}, itself excluded.
+    """
+    scores = defaultdict(float)
+    for feature, weight in vectors[index].items():
+        for other_weight, other in postings[feature]:
+            scores[other] += weight * other_weight
+    scores.pop(index, None)
+    return scores
+
+
+def _top(scores, k):
+    """
+    The 'k' best (score, song id) pairs of {song id: score}, best first;
+    equal scores go to the lower id.
+    """
+    return [(score, song_id) for song_id, score in
+            nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
+
+
+def create_similar(conn):
+    """
+    Creates MusicasSemelhantes and fills it.
+    """
+    conn.executescript(SIMILAR_SCHEMA)
+    rebuild_similar(conn)
+
+
+def rebuild_similar(conn, k=DEFAULT_NEIGHBOURS):
+    """
+    Recomputes the neighbours of every song.
+    """
+    conn.execute("DELETE FROM MusicasSemelhantes")
+    return update_similar(conn, k)
+
+
+def plan_update(conn, k=DEFAULT_NEIGHBOURS):
+    """
+    Computes what update_similar() would change, reading only, and
+    returns a function 'store(conn)' writing it and returning (songs
+    indexed, lists updated, songs removed), or None when the index is up
+    to date. The reads should share one transaction, and 'store' is only
+    right as long as nothing was written since.
+    """
+    present = {song_id for (song_id,) in conn.execute("SELECT song_id FROM Musicas")}
+    stored = {
+        song_id: list(zip(_unpack("f", scores), _unpack("q", neighbours)))
+        for song_id, neighbours, scores in conn.execute("SELECT song_id, neighbours, scores FROM MusicasSemelhantes")
+    }
+    removed = [song_id for song_id in stored if song_id not in present]
+    if not removed and present.issubset(stored):
+        return None
+
+    changed = set()
+    if removed:
+        gone = set(removed)
+        for song_id in removed:
+            del stored[song_id]
+        for song_id, neighbours in stored.items():
+            kept = [pair for pair in neighbours if pair[1] not in gone]
+            if len(kept) != len(neighbours):
+                stored[song_id] = kept
+                changed.add(song_id)
+
+    song_ids, vectors = song_vectors(conn)
+    added = [index for index, song_id in enumerate(song_ids) if song_id not in stored]
+    added_ids = {song_ids[index] for index in added}
+    postings = _postings(vectors)
+    for index in added:
+        song_id = song_ids[index]
+        scores = {song_ids[other]: score for other, score in _scores(index, vectors, postings).items()}
+        stored[song_id] = _top(scores, k)
+        changed.add(song_id)
+        # Similarity is symmetric: the new song may belong in the others' lists
+        for other_id, score in scores.items():
+            if other_id in added_ids:
+                continue
+            neighbours = stored[other_id]
+            if len(neighbours) < k or (score, -song_id) > (neighbours[-1][0], -neighbours[-1][1]):
+                stored[other_id] = _top({**{n: s for s, n in neighbours}, song_id: score}, k)
+                changed.add(other_id)
+
+    rows = [(song_id, _pack("q", [n for _, n in stored[song_id]]), _pack("f", [s for s, _ in stored[song_id]]))
+            for song_id in sorted(changed)]
+
+    def store(conn):
+        conn.executemany("DELETE FROM MusicasSemelhantes WHERE song_id = ?", [(song_id,) for song_id in removed])
+        conn.executemany("INSERT OR REPLACE INTO MusicasSemelhantes (song_id, neighbours, scores) VALUES (?, ?, ?)",
+                         rows)
+        return len(added), len(changed) - len(added), len(removed)
+    return store
+
+
+def update_similar(conn, k=DEFAULT_NEIGHBOURS):
+    """
+    Brings MusicasSemelhantes up to date after songs were added, replaced
+    (their rows are deleted with them, see importer.py) or deleted.
+
+    Songs without a row get their neighbours computed, and are added to
+    the lists of existing songs they now outscore. Deleted songs lose
+    their row and are dropped from the lists naming them. Weights use the
+    current corpus, but the lists of other songs are not recomputed, so a
+    full rebuild_similar() is worth running after large changes.
+    Returns (songs indexed, lists updated, songs removed, seconds).
+    """
+    start = time.perf_counter()
+    store = plan_update(conn, k)
+    counts = (0, 0, 0) if store is None else store(conn)
+    return (*counts, time.perf_counter() - start)
+
+
+def find_similar(db, song_id, limit=DEFAULT_NEIGHBOURS):
+    """
+    Returns a song and its most similar songs, best first, as
+    {"song": {...}, "similar": [{..., "score"}]}, or None when there is no
+    such song. "similar" is empty for a song not indexed yet.
+    """
+    row = db.execute(SONG_QUERY, (song_id,)).fetchone()
+    neighbours, scores = ([], []) if row is None else (_unpack("q", row[0]), _unpack("f", row[1]))
+    neighbours, scores = neighbours[:limit], scores[:limit]
+    titles = {
+        found[0]: {"song_id": found[0], "song_title": found[1], "song_url": found[2]}
+        for found in db.execute(TITLES_QUERY, (json.dumps([song_id, *neighbours]),))
+    }
+    if song_id not in titles:
+        return None
+    similar = [{**titles[other], "score": round(score, 4)}
+               for other, score in zip(neighbours, scores) if other in titles]
+    return {"song": titles[song_id], "similar": similar}
+
@@ -0,0 +1,189 @@
+import json
+
+
+# One row per song holding everything its detail page shows: the song and
+# album columns, its track number and its credit and tag lists as JSON
+# arrays of {"person_id", "person"} / {"tag_id", "tag"} objects sorted by
+# name. Triggers on the base tables rewrite the rows of the songs a change
+# touches, so a page reads a single row by primary key.
+CREDITS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS CreditosMusicas (
+        song_id INTEGER PRIMARY KEY,
+        song_title TEXT,
+        song_url TEXT,
+        views INTEGER,
+        date TEXT,
+        album_id INTEGER,
+        album_title TEXT,
+        album_url TEXT,
+        category TEXT,
+        number INTEGER,
+        producers TEXT NOT NULL,
+        artists TEXT NOT NULL,
+        writers TEXT NOT NULL,
+        tags TEXT NOT NULL
+    );
+"""
+
+# JSON list columns of CreditosMusicas -> (junction table, id column,
+# name table, its id and name columns)
+LIST_COLUMNS = {
+    "producers": ("Produtores", "producer_id", "Pessoas", "person_id", "person"),
+    "artists": ("Artistas", "artist_id", "Pessoas", "person_id", "person"),
+    "writers": ("Escritores", "writer_id", "Pessoas", "person_id", "person"),
+    "tags": ("Descricoes", "tag_id", "Tags", "tag_id", "tag"),
+}
+
+_LIST = """(
+            SELECT json_group_array(json_object('{id_column}', item_id, '{name_column}', name))
+            FROM (
+                SELECT n.{id_column} AS item_id, n.{name_column} AS name
+                FROM {junction} j JOIN {names} n ON n.{id_column} = j.{junction_column}
+                WHERE j.song_id = m.song_id
+                ORDER BY n.{name_column}, n.{id_column}
+            )
+        )"""
+
+# Rows of CreditosMusicas for the songs matching {where} (a condition on
+# Musicas m)
+CREDITS_QUERY = """
+    SELECT m.song_id, m.song_title, m.song_url, m.views, m.date,
+           m.album_id, a.album_title, a.album_url, a.category, n.number,
+           {lists}
+    FROM Musicas m
+    LEFT JOIN Albuns a ON a.album_id = m.album_id
+    LEFT JOIN Numeros n ON n.song_id = m.song_id AND n.album_id = m.album_id
+    WHERE {where}
+""".replace("{lists}", ",\n           ".join(
+    _LIST.format(junction=junction, junction_column=junction_column, names=names,
+                 id_column=id_column, name_column=name_column)
+    for junction, junction_column, names, id_column, name_column in LIST_COLUMNS.values()
+))
+
+SONG_QUERY = "SELECT * FROM CreditosMusicas WHERE song_id = ?"
+
+# Columns of Musicas whose updates rewrite a song's row (release_date is
+# derived from date, see release_dates.py)
+SONG_COLUMNS = ["song_id", "song_title", "song_url", "album_id", "release_date", "date"]
+
+VIEWS_TRIGGER = """
+        CREATE TRIGGER IF NOT EXISTS Musicas_creditos_views AFTER UPDATE OF views ON Musicas BEGIN
+            UPDATE CreditosMusicas SET views = new.views WHERE song_id = new.song_id;
+        END;
+"""
+
+
+def _refresh(songs):
+    """
+    Trigger statements rewriting the rows of the songs in 'songs'.
+    """
+    return f"""
+            DELETE FROM CreditosMusicas WHERE song_id IN {songs};
+            INSERT INTO CreditosMusicas {CREDITS_QUERY.format(where=f"m.song_id IN {songs}")};
+    """
+
+
+def _person_songs(row):
+    """
+    Songs crediting the person in {row} (through the person-side indexes).
+    """
+    return f"""(
+        SELECT song_id FROM Produtores WHERE producer_id = {row}.person_id
+        UNION SELECT song_id FROM Artistas WHERE artist_id = {row}.person_id
+        UNION SELECT song_id FROM Escritores WHERE writer_id = {row}.person_id
+    )"""
+
+
+def _trigger(table, event, songs):
+    """
+    Builds the trigger refreshing the songs in 'songs' after 'event'.
+    """
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_creditos_{event.split()[0].lower()} AFTER {event} ON {table} BEGIN
+            {_refresh(songs)}
+        END;
+    """
+
+
+def credits_triggers():
+    """
+    Returns the SQL creating every trigger that maintains CreditosMusicas.
+    Each one rewrites only the rows of the songs its change touches.
+    """
+    triggers = [
+        _trigger("Musicas", "INSERT", "(new.song_id)"),
+        # Only the columns the rows project: view counts change far more
+        # often than anything else and only need their own column copied
+        _trigger("Musicas", f"UPDATE OF {', '.join(SONG_COLUMNS)}", "(old.song_id, new.song_id)"),
+        VIEWS_TRIGGER,
+        _trigger("Musicas", "DELETE", "(old.song_id)"),
+        # Songs of an album are found through idx_musicas_album
+        _trigger("Albuns", "UPDATE", "(SELECT song_id FROM Musicas WHERE album_id IN (old.album_id, new.album_id))"),
+        _trigger("Albuns", "DELETE", "(SELECT song_id FROM Musicas WHERE album_id = old.album_id)"),
+        _trigger("Pessoas", "INSERT", _person_songs("new")),
+        _trigger("Pessoas", "UPDATE", f"(SELECT * FROM {_person_songs('old')} UNION SELECT * FROM {_person_songs('new')})"),
+        _trigger("Pessoas", "DELETE", _person_songs("old")),
+        _trigger("Tags", "INSERT", "(SELECT song_id FROM Descricoes WHERE tag_id = new.tag_id)"),
+        _trigger("Tags", "UPDATE", "(SELECT song_id FROM Descricoes WHERE tag_id IN (old.tag_id, new.tag_id))"),
+        _trigger("Tags", "DELETE", "(SELECT song_id FROM Descricoes WHERE tag_id = old.tag_id)"),
+    ]
+    for table in ["Produtores", "Artistas", "Escritores", "Descricoes", "Numeros"]:
+        triggers += [
+            _trigger(table, "INSERT", "(new.song_id)"),
+            _trigger(table, "UPDATE", "(old.song_id, new.song_id)"),
+            _trigger(table, "DELETE", "(old.song_id)"),
+        ]
+    return "\n".join(triggers)
+
+
+def create_credits(conn):
+    """
+    Creates CreditosMusicas and its triggers, then fills the table.
+    """
+    conn.executescript(CREDITS_SCHEMA)
+    conn.executescript(credits_triggers())
+    rebuild_credits(conn)
+
+
+def narrow_song_trigger(conn):
+    """
+    Replaces the trigger rewriting a song's row after any update of
+    Musicas with one limited to the columns the row projects, plus one
+    copying view counts.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS Musicas_creditos_update")
+    conn.executescript(credits_triggers())
+
+
+def rebuild_credits(conn):
+    """
+    Refills CreditosMusicas from the base tables.
+    """
+    conn.execute("DELETE FROM CreditosMusicas")
+    conn.execute(f"INSERT INTO CreditosMusicas {CREDITS_QUERY.format(where='1')}")
+
+
+def check_credits(conn):
+    """
+    Compares CreditosMusicas with a fresh recomputation.
+    Returns a list of (table, row, problem) tuples; empty when consistent.
+    """
+    stored = {tuple(row) for row in conn.execute("SELECT * FROM CreditosMusicas")}
+    expected = {tuple(row) for row in conn.execute(CREDITS_QUERY.format(where="1"))}
+    problems = [("CreditosMusicas", row, "missing or stale") for row in sorted(expected - stored, key=repr)]
+    problems += [("CreditosMusicas", row, "unexpected") for row in sorted(stored - expected, key=repr)]
+    return problems
+
+
+def find_song(db, song_id):
+    """
+    Returns the detail of one song as a dict, with its credit and tag
+    lists decoded, or None when there is no such song.
+    """
+    row = db.execute(SONG_QUERY, (song_id,)).fetchone()
+    if row is None:
+        return None
+    song = dict(zip(row.keys(), row))
+    for column in LIST_COLUMNS:
+        song[column] = json.loads(song[column])
+    return song
@@ -0,0 +1,143 @@
+from importer import ROLE_COLUMNS
+import lyrics_index
+
+
+# Every write goes through UPSERT or UPDATE statements, never INSERT OR
+# REPLACE: a replaced row is deleted without firing its DELETE triggers,
+# which would leave the summaries (summaries.py), the song credits read
+# model (song_credits.py) and the lyrics index out of step.
+
+SONG_UPSERT = """
+    INSERT INTO Musicas (song_id, song_title, views, date, song_url, album_id, lyrics_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (song_id) DO UPDATE SET
+        song_title = excluded.song_title,
+        views = excluded.views,
+        date = excluded.date,
+        song_url = excluded.song_url,
+        album_id = excluded.album_id
+"""
+
+# Junction tables of the credits and tags, with the column naming the
+# person or tag
+LINK_TABLES = {**dict(ROLE_COLUMNS.values()), "Descricoes": "tag_id"}
+
+
+def _require_song(conn, song_id):
+    """
+    Returns the lyrics_id of a song, raising LookupError when there is no
+    such song.
+    """
+    row = conn.execute("SELECT lyrics_id FROM Musicas WHERE song_id = ?", (song_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"There is no song {song_id}")
+    return row[0]
+
+
+def _name_id(conn, table, id_column, key_column, key, **extra):
+    """
+    Returns the id of the row of a lookup table (people, tags, albums)
+    named 'key', the lowest one when there are several as in
+    importer.IdMap, inserting the row with the 'extra' columns when there
+    is none.
+    """
+    row = conn.execute(
+        f"SELECT {id_column} FROM {table} WHERE {key_column} = ? ORDER BY {id_column} LIMIT 1", (key,)
+    ).fetchone()
+    if row is not None:
+        return row[0]
+    columns = [key_column, *extra]
+    return conn.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        (key, *extra.values()),
+    ).lastrowid
+
+
+def _replace_links(conn, table, song_id, item_ids):
+    """
+    Makes 'item_ids' the people (or tags) linked to a song in a junction
+    table, touching only the rows that change. Returns whether any did.
+    """
+    column = LINK_TABLES[table]
+    current = {item_id for (item_id,) in conn.execute(f"SELECT {column} FROM {table} WHERE song_id = ?", (song_id,))}
+    wanted = set(item_ids)
+    conn.executemany(f"DELETE FROM {table} WHERE song_id = ? AND {column} = ?",
+                     [(song_id, item_id) for item_id in current - wanted])
+    conn.executemany(f"INSERT INTO {table} (song_id, {column}) VALUES (?, ?)",
+                     [(song_id, item_id) for item_id in wanted - current])
+    return current != wanted
+
+
+def _forget_similar(conn, song_id):
+    """
+    Drops a song's similar songs so the next similar_songs.update_similar()
+    computes them again from its new lyrics, tags and credits.
+    """
+    conn.execute("DELETE FROM MusicasSemelhantes WHERE song_id = ?", (song_id,))
+
+
+def upsert_song(conn, record):
+    """
+    Adds a song, or replaces every field of an existing one, from a record
+    parsed by importer.parse_record(). Albums, people and tags are matched
+    by name and created when new. Returns {"song_id", "created"}.
+    """
+    song_id = record["song_id"]
+    row = conn.execute("SELECT lyrics_id FROM Musicas WHERE song_id = ?", (song_id,)).fetchone()
+    lyrics_id = song_id if row is None else row[0]
+    album_id = _name_id(conn, "Albuns", "album_id", "album_title", record["album_title"],
+                        album_url=record["album_url"], category=record["category"])
+    conn.execute(SONG_UPSERT, (song_id, record["song_title"], record["views"], record["date"],
+                               record["song_url"], album_id, lyrics_id))
+    lyrics_index.update_lyrics(conn, [(lyrics_id, record["lyrics"])])
+    conn.execute("DELETE FROM Numeros WHERE song_id = ?", (song_id,))
+    if record["track_number"] is not None:
+        conn.execute("INSERT INTO Numeros (album_id, song_id, number) VALUES (?, ?, ?)",
+                     (album_id, song_id, record["track_number"]))
+    replace_credits(conn, song_id, {column: record[column] for column in ROLE_COLUMNS})
+    replace_tags(conn, song_id, record["tags"])
+    _forget_similar(conn, song_id)
+    return {"song_id": song_id, "created": row is None}
+
+
+def set_views(conn, song_id, views=None, add=None):
+    """
+    Sets a song's view count to 'views', or adds 'add' to it (which may be
+    negative). Returns {"song_id", "views"} with the new count.
+    """
+    if add is not None:
+        updated = conn.execute("UPDATE Musicas SET views = views + ? WHERE song_id = ?", (add, song_id))
+    else:
+        updated = conn.execute("UPDATE Musicas SET views = ? WHERE song_id = ?", (views, song_id))
+    if not updated.rowcount:
+        raise LookupError(f"There is no song {song_id}")
+    views = conn.execute("SELECT views FROM Musicas WHERE song_id = ?", (song_id,)).fetchone()[0]
+    return {"song_id": song_id, "views": views}
+
+
+def replace_credits(conn, song_id, credits):
+    """
+    Replaces the people credited on a song in the roles 'credits' names
+    ({"producers": [names], ...}, see importer.ROLE_COLUMNS); roles left
+    out keep their credits. Returns {"song_id", role: [names]}.
+    """
+    _require_song(conn, song_id)
+    changed = False
+    for column, names in credits.items():
+        table, _ = ROLE_COLUMNS[column]
+        people = [_name_id(conn, "Pessoas", "person_id", "person", name) for name in names]
+        changed |= _replace_links(conn, table, song_id, people)
+    if changed:
+        _forget_similar(conn, song_id)
+    return {"song_id": song_id, **credits}
+
+
+def replace_tags(conn, song_id, tags):
+    """
+    Replaces a song's tags, given by name. Returns {"song_id", "tags"}.
+    """
+    _require_song(conn, song_id)
+    tag_ids = [_name_id(conn, "Tags", "tag_id", "tag", tag) for tag in tags]
+    if _replace_links(conn, "Descricoes", song_id, tag_ids):
+        _forget_similar(conn, song_id)
+    return {"song_id": song_id, "tags": tags}
@@ -0,0 +1,121 @@
+from collections import namedtuple
+import hashlib
+import mimetypes
+import os
+import time
+
+import compression
+
+
+# Fingerprinted files never change under the same name, so clients may keep
+# them for a year without revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Hex digits of the content hash put in a fingerprinted name
+DIGEST_LENGTH = 12
+
+# File suffix of the precompressed variant for each content encoding
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# One static file: its name under the static folder, the fingerprinted name
+# it is served under, where it is on disk, its media type, content hash and
+# the paths of its precompressed variants by encoding
+Asset = namedtuple("Asset", ["name", "url_name", "path", "mimetype", "digest", "variants"])
+
+
+def fingerprint(name, digest):
+    """
+    Puts the start of a content hash in a file name, before its extension:
+    'css/site.css' becomes 'css/site.<digest>.css'.
+    """
+    root, extension = os.path.splitext(name)
+    return f"{root}.{digest[:DIGEST_LENGTH]}{extension}"
+
+
+def write_variant(path, data):
+    """
+    Writes a precompressed file through a temporary one, so a concurrent
+    reader never sees it half written.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+class AssetManifest:
+    """
+    The files of the static folder under content-hashed names, with
+    precompressed variants of the compressible ones. Variants are written
+    to 'cache_dir' under the fingerprinted name, so they are only built
+    again when a file's content changes.
+    """
+
+    def __init__(self, assets, build_seconds=0.0):
+        self.build_seconds = build_seconds
+        self.by_name = {asset.name: asset for asset in assets}
+        self.by_url_name = {asset.url_name: asset for asset in assets}
+
+    @classmethod
+    def build(cls, static_folder, cache_dir):
+        """
+        Hashes every file under 'static_folder' and compresses the ones
+        worth compressing with each available encoding, keeping a variant
+        only when it is smaller than the file.
+        """
+        start = time.perf_counter()
+        assets = []
+        for directory, subdirectories, files in os.walk(static_folder):
+            subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+            for file_name in sorted(files):
+                if file_name.startswith("."):
+                    continue
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, static_folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                url_name = fingerprint(name, digest)
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                variants = {}
+                if compression.compressible(mimetype):
+                    for encoding in compression.available_encodings():
+                        variant = os.path.join(cache_dir, url_name + VARIANT_SUFFIXES[encoding])
+                        if not os.path.exists(variant):
+                            write_variant(variant, compression.compress(
+                                data, encoding, compression.STATIC_LEVELS[encoding]))
+                        if os.path.getsize(variant) < len(data):
+                            variants[encoding] = variant
+                assets.append(Asset(name, url_name, path, mimetype, digest, variants))
+        return cls(assets, time.perf_counter() - start)
+
+    def url_name(self, name):
+        """
+        The fingerprinted name of a static file, raising KeyError for a
+        file that is not in the manifest.
+        """
+        return self.by_name[name].url_name
+
+    def find(self, url_name):
+        """
+        The asset served under a fingerprinted name, raising KeyError for
+        an unknown one.
+        """
+        return self.by_url_name[url_name]
+
+    def stats(self):
+        """
+        Number and size of the files, and the size of their precompressed
+        variants by encoding.
+        """
+        assets = self.by_name.values()
+        stats = {
+            "files": len(assets),
+            "bytes": sum(os.path.getsize(asset.path) for asset in assets),
+            "build_seconds": round(self.build_seconds, 6),
+        }
+        for encoding in compression.available_encodings():
+            stats[f"{encoding}_bytes"] = sum(os.path.getsize(asset.variants[encoding])
+                                             for asset in assets if encoding in asset.variants)
+        return stats
@@ -0,0 +1,282 @@
+"""
+Precomputed summary tables behind the home page and the Q&A page.
+
+The Resumo* tables hold the aggregates those pages used to recompute on
+every request (totals, per-album views, category views, tag counts and
+per-song credit counts). Triggers on the base tables keep them up to
+date, so the pages only read a handful of small rows.
+"""
+
+
+# Junction table -> (person column, ResumoTotais name, ResumoMusicas column)
+ROLE_TABLES = {
+    "Produtores": ("producer_id", "n_produtores", "producer_count"),
+    "Artistas": ("artist_id", "n_artistas", "artist_count"),
+    "Escritores": ("writer_id", "n_escritores", "writer_count"),
+}
+
+SUMMARY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ResumoTotais (
+        name VARCHAR(50) PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS ResumoAlbuns (
+        album_id INTEGER PRIMARY KEY,
+        song_count INTEGER NOT NULL,
+        total_views INTEGER NOT NULL,
+        max_views INTEGER
+    );
+
+    CREATE TABLE IF NOT EXISTS ResumoCategorias (
+        category VARCHAR(500) PRIMARY KEY,
+        song_count INTEGER NOT NULL,
+        total_views INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS ResumoTags (
+        tag_id INTEGER PRIMARY KEY,
+        song_count INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS ResumoMusicas (
+        song_id INTEGER PRIMARY KEY,
+        producer_count INTEGER NOT NULL DEFAULT 0,
+        artist_count INTEGER NOT NULL DEFAULT 0,
+        writer_count INTEGER NOT NULL DEFAULT 0,
+        tag_count INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS ResumoCreditos (
+        role VARCHAR(50),
+        person_id INTEGER,
+        credits INTEGER NOT NULL,
+        PRIMARY KEY (role, person_id)
+    );
+"""
+
+# Trigger bodies for a row entering ({row} = new) or leaving ({row} = old)
+# a table. An UPDATE trigger runs the "remove" body for the old row and the
+# "add" body for the new one.
+_MUSICAS_ADD = """
+    UPDATE ResumoTotais SET value = value + 1 WHERE name = 'songs';
+    INSERT INTO ResumoAlbuns (album_id, song_count, total_views, max_views)
+    VALUES ({row}.album_id, 1, COALESCE({row}.views, 0), {row}.views)
+    ON CONFLICT (album_id) DO UPDATE SET
+        song_count = song_count + 1,
+        total_views = total_views + excluded.total_views,
+        max_views = CASE WHEN max_views IS NULL OR excluded.max_views > max_views
+                         THEN excluded.max_views ELSE max_views END;
+    INSERT INTO ResumoCategorias (category, song_count, total_views)
+    SELECT category, 1, COALESCE({row}.views, 0) FROM Albuns WHERE album_id = {row}.album_id
+    ON CONFLICT (category) DO UPDATE SET
+        song_count = song_count + 1,
+        total_views = total_views + excluded.total_views;
+"""
+
+_MUSICAS_REMOVE = """
+    UPDATE ResumoTotais SET value = value - 1 WHERE name = 'songs';
+    UPDATE ResumoAlbuns SET
+        song_count = song_count - 1,
+        total_views = total_views - COALESCE({row}.views, 0)
+    WHERE album_id = {row}.album_id;
+    UPDATE ResumoAlbuns SET
+        max_views = (SELECT MAX(views) FROM Musicas WHERE album_id = {row}.album_id)
+    WHERE album_id = {row}.album_id AND max_views <= {row}.views;
+    UPDATE ResumoCategorias SET
+        song_count = song_count - 1,
+        total_views = total_views - COALESCE({row}.views, 0)
+    WHERE category = (SELECT category FROM Albuns WHERE album_id = {row}.album_id);
+"""
+
+_ALBUNS_ADD = """
+    UPDATE ResumoTotais SET value = value + 1 WHERE name = 'albums';
+    INSERT INTO ResumoAlbuns (album_id, song_count, total_views, max_views)
+    VALUES ({row}.album_id, 0, 0, NULL)
+    ON CONFLICT (album_id) DO NOTHING;
+    INSERT INTO ResumoCategorias (category, song_count, total_views)
+    SELECT {row}.category, song_count, total_views FROM ResumoAlbuns WHERE album_id = {row}.album_id
+    ON CONFLICT (category) DO UPDATE SET
+        song_count = song_count + excluded.song_count,
+        total_views = total_views + excluded.total_views;
+"""
+
+_ALBUNS_REMOVE = """
+    UPDATE ResumoTotais SET value = value - 1 WHERE name = 'albums';
+    UPDATE ResumoCategorias SET
+        song_count = song_count - (SELECT song_count FROM ResumoAlbuns WHERE album_id = {row}.album_id),
+        total_views = total_views - (SELECT total_views FROM ResumoAlbuns WHERE album_id = {row}.album_id)
+    WHERE category = {row}.category;
+    DELETE FROM ResumoAlbuns WHERE album_id = {row}.album_id AND song_count = 0;
+"""
+
+_TAGS_ADD = "UPDATE ResumoTotais SET value = value + 1 WHERE name = 'tags';"
+_TAGS_REMOVE = "UPDATE ResumoTotais SET value = value - 1 WHERE name = 'tags';"
+
+_DESCRICOES_ADD = """
+    INSERT INTO ResumoTags (tag_id, song_count) VALUES ({row}.tag_id, 1)
+    ON CONFLICT (tag_id) DO UPDATE SET song_count = song_count + 1;
+    INSERT INTO ResumoMusicas (song_id, tag_count) VALUES ({row}.song_id, 1)
+    ON CONFLICT (song_id) DO UPDATE SET tag_count = tag_count + 1;
+"""
+
+_DESCRICOES_REMOVE = """
+    UPDATE ResumoTags SET song_count = song_count - 1 WHERE tag_id = {row}.tag_id;
+    UPDATE ResumoMusicas SET tag_count = tag_count - 1 WHERE song_id = {row}.song_id;
+"""
+
+_ROLE_ADD = """
+    INSERT INTO ResumoCreditos (role, person_id, credits) VALUES ('{role}', {row}.{person_column}, 1)
+    ON CONFLICT (role, person_id) DO UPDATE SET credits = credits + 1;
+    INSERT INTO ResumoMusicas (song_id, {count_column}) VALUES ({row}.song_id, 1)
+    ON CONFLICT (song_id) DO UPDATE SET {count_column} = {count_column} + 1;
+"""
+
+_ROLE_REMOVE = """
+    UPDATE ResumoCreditos SET credits = credits - 1
+    WHERE role = '{role}' AND person_id = {row}.{person_column};
+    DELETE FROM ResumoCreditos
+    WHERE role = '{role}' AND person_id = {row}.{person_column} AND credits <= 0;
+    UPDATE ResumoMusicas SET {count_column} = {count_column} - 1 WHERE song_id = {row}.song_id;
+"""
+
+# ResumoCreditos has one row per (role, person), so its size is the
+# number of distinct people credited in each role
+_CREDITOS_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS ResumoCreditos_insert AFTER INSERT ON ResumoCreditos BEGIN
+        UPDATE ResumoTotais SET value = value + 1 WHERE name = new.role;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS ResumoCreditos_delete AFTER DELETE ON ResumoCreditos BEGIN
+        UPDATE ResumoTotais SET value = value - 1 WHERE name = old.role;
+    END;
+"""
+
+
+def _table_triggers(table, add, remove):
+    """
+    Builds the INSERT, DELETE and UPDATE triggers of one base table.
+    """
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_resumo_insert AFTER INSERT ON {table} BEGIN
+            {add.format(row="new")}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {table}_resumo_delete AFTER DELETE ON {table} BEGIN
+            {remove.format(row="old")}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {table}_resumo_update AFTER UPDATE ON {table} BEGIN
+            {remove.format(row="old")}
+            {add.format(row="new")}
+        END;
+    """
+
+
+def summary_triggers():
+    """
+    Returns the SQL creating every trigger that maintains the summaries.
+    """
+    triggers = [
+        _table_triggers("Musicas", _MUSICAS_ADD, _MUSICAS_REMOVE),
+        _table_triggers("Albuns", _ALBUNS_ADD, _ALBUNS_REMOVE),
+        _table_triggers("Tags", _TAGS_ADD, _TAGS_REMOVE),
+        _table_triggers("Descricoes", _DESCRICOES_ADD, _DESCRICOES_REMOVE),
+        _CREDITOS_TRIGGERS,
+    ]
+    for table, (person_column, role, count_column) in ROLE_TABLES.items():
+        names = {"row": "{row}", "role": role, "person_column": person_column, "count_column": count_column}
+        triggers.append(_table_triggers(table, _ROLE_ADD.format(**names), _ROLE_REMOVE.format(**names)))
+    return "\n".join(triggers)
+
+
+# Fresh recomputations of every summary, used to (re)build the tables and
+# by the consistency checker. Each one returns rows in the table's layout.
+# ResumoTotais comes last: refilling ResumoCreditos fires its triggers,
+# which would otherwise count the same people twice.
+RECOMPUTE = {
+    "ResumoAlbuns": """
+        SELECT album_id, COUNT(song_id), COALESCE(SUM(views), 0), MAX(views)
+        FROM (
+            SELECT album_id, song_id, views FROM Musicas
+            UNION ALL SELECT album_id, NULL, NULL FROM Albuns
+        )
+        GROUP BY album_id
+    """,
+    "ResumoCategorias": """
+        SELECT a.category, COUNT(m.song_id), COALESCE(SUM(m.views), 0)
+        FROM Albuns a
+        LEFT JOIN Musicas m ON a.album_id = m.album_id
+        GROUP BY a.category
+    """,
+    "ResumoTags": """
+        SELECT tag_id, COUNT(*) FROM Descricoes GROUP BY tag_id
+    """,
+    "ResumoMusicas": """
+        SELECT song_id,
+               SUM(role = 'p'), SUM(role = 'a'), SUM(role = 'w'), SUM(role = 't')
+        FROM (
+            SELECT song_id, 'p' AS role FROM Produtores
+            UNION ALL SELECT song_id, 'a' FROM Artistas
+            UNION ALL SELECT song_id, 'w' FROM Escritores
+            UNION ALL SELECT song_id, 't' FROM Descricoes
+        )
+        GROUP BY song_id
+    """,
+    "ResumoCreditos": """
+        SELECT 'n_produtores', producer_id, COUNT(*) FROM Produtores GROUP BY producer_id
+        UNION ALL SELECT 'n_artistas', artist_id, COUNT(*) FROM Artistas GROUP BY artist_id
+        UNION ALL SELECT 'n_escritores', writer_id, COUNT(*) FROM Escritores GROUP BY writer_id
+    """,
+    "ResumoTotais": """
+        SELECT 'albums', COUNT(*) FROM Albuns
+        UNION ALL SELECT 'songs', COUNT(*) FROM Musicas
+        UNION ALL SELECT 'tags', COUNT(*) FROM Tags
+        UNION ALL SELECT 'n_produtores', COUNT(DISTINCT producer_id) FROM Produtores
+        UNION ALL SELECT 'n_artistas', COUNT(DISTINCT artist_id) FROM Artistas
+        UNION ALL SELECT 'n_escritores', COUNT(DISTINCT writer_id) FROM Escritores
+    """,
+}
+
+# Rows whose counters dropped to zero are kept by the triggers but are
+# never produced by a recomputation, so they are ignored when comparing
+_LIVE_ROWS = {
+    "ResumoAlbuns": "song_count > 0 OR album_id IN (SELECT album_id FROM Albuns)",
+    "ResumoCategorias": "category IN (SELECT category FROM Albuns)",
+    "ResumoTags": "song_count > 0",
+    "ResumoMusicas": "producer_count + artist_count + writer_count + tag_count > 0",
+}
+
+
+def create_summaries(conn):
+    """
+    Creates the summary tables and triggers, then fills the tables.
+    """
+    conn.executescript(SUMMARY_SCHEMA)
+    conn.executescript(summary_triggers())
+    rebuild_summaries(conn)
+
+
+def rebuild_summaries(conn):
+    """
+    Refills every summary table from a fresh recomputation.
+    """
+    for table, query in RECOMPUTE.items():
+        conn.execute(f"DELETE FROM {table}")
+        # Filled inside SQLite so large catalogs never pass through Python
+        conn.execute(f"INSERT INTO {table} {query}")
+
+
+def check_summaries(conn):
+    """
+    Compares every summary table with a fresh recomputation.
+    Returns a list of (table, row, problem) tuples; empty when consistent.
+    """
+    problems = []
+    for table, query in RECOMPUTE.items():
+        where = f"WHERE {_LIVE_ROWS[table]}" if table in _LIVE_ROWS else ""
+        stored = {tuple(row) for row in conn.execute(f"SELECT * FROM {table} {where}")}
+        expected = {tuple(row) for row in conn.execute(query)}
+        problems += [(table, row, "missing or stale") for row in sorted(expected - stored, key=repr)]
+        problems += [(table, row, "unexpected") for row in sorted(stored - expected, key=repr)]
+    return problems
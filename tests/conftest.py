@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Let the tests import the app modules when pytest runs from the
+# repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    The app serving a fresh copy of dbfinal.db, with the write API on.
+    """
+    path = str(tmp_path / "catalog.db")
+    shutil.copyfile(os.path.join(ROOT, "dbfinal.db"), path)
+    flask_app.config.update(DATABASE=path, WRITE_API_TOKEN="test-token", TESTING=True)
+    yield flask_app
+    writer = flask_app.extensions.pop("write_queue", None)
+    if writer is not None:
+        writer.close()
+    pool = flask_app.extensions.pop("db_pool", None)
+    if pool is not None:
+        pool.close_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
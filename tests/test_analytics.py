@@ -0,0 +1,29 @@
+import pytest
+
+import analytics
+
+
+@pytest.mark.parametrize("text, percentile", [("0", 0), ("25", 25), ("99.9", 99.9), ("100", 100), ("100.0", 100)])
+def test_percentiles_are_parsed(text, percentile):
+    assert analytics.parse_percentile(text) == percentile
+    assert analytics.parse_aggregate(f"p{text}") == percentile
+
+
+@pytest.mark.parametrize("text", ["", "-1", "101", "100.5", "1e1", "nan", "inf", "0x10", " 5", "5%", "007"])
+def test_invalid_percentiles_are_rejected(text):
+    with pytest.raises(ValueError):
+        analytics.parse_percentile(text)
+    with pytest.raises(ValueError):
+        analytics.parse_aggregate(f"p{text}")
+
+
+@pytest.mark.parametrize("query", ["p=abc", "p=50&p=abc", "p=-5", "p=150", "p=1e1", "p=nan", "p="])
+def test_distribution_rejects_invalid_percentiles(client, query):
+    response = client.get(f"/api/v1/analytics/year/distribution?{query}")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("agg", ["p1e1", "p101", "p-1", "pnan", "p", "avg", "SUM"])
+def test_group_by_rejects_invalid_aggregates(client, agg):
+    response = client.get(f"/api/v1/analytics/year?agg={agg}")
+    assert response.status_code == 400
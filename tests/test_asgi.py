@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import asgi
+
+
+def call(application, path="/", timeout=5):
+    """
+    Runs one GET request through an ASGI app and returns the messages it
+    sent, each with the seconds since the request started.
+    """
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+             "http_version": "1.1"}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def send(message):
+            messages.append((message, loop.time() - start))
+        await asyncio.wait_for(application(scope, receive, send), timeout)
+    asyncio.run(run())
+    return messages
+
+
+def test_streamed_chunks_are_sent_as_produced():
+    release = threading.Event()
+
+    def wsgi_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        yield b"first "
+        release.wait(5)
+        yield b"second"
+
+    application = asgi.AsyncApp(wsgi_app, workers=1, timeout=5)
+    threading.Timer(0.3, release.set).start()
+    messages = call(application)
+    bodies = [(message.get("body"), message.get("more_body", False), seconds)
+              for message, seconds in messages if message["type"] == "http.response.body"]
+    assert messages[0][0]["status"] == 200
+    assert [body for body, _, _ in bodies] == [b"first ", b"second", b""]
+    assert [more for _, more, _ in bodies] == [True, True, False]
+    # The first chunk went out before the app had produced the second
+    assert bodies[0][2] < 0.3 <= bodies[1][2]
+
+
+def test_slow_start_is_answered_504(monkeypatch):
+    def wsgi_app(environ, start_response):
+        threading.Event().wait(1)
+        start_response("200 OK", [])
+        return [b"late"]
+
+    monkeypatch.setattr(asgi, "TIMEOUT_GRACE", 0.1)
+    messages = call(asgi.AsyncApp(wsgi_app, workers=1, timeout=0.1))
+    assert messages[0][0]["status"] == 504
+
+
+def test_app_pages_stream_through(app):
+    messages = call(asgi.AsyncApp(app, workers=1, timeout=5), "/songs")
+    body = b"".join(message.get("body", b"") for message, _ in messages if message["type"] == "http.response.body")
+    assert messages[0][0]["status"] == 200
+    assert len(messages) > 2 and b"</html>" in body
@@ -0,0 +1,74 @@
+import base64
+import json
+import sqlite3
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def forge(value):
+    """
+    A cursor token holding any JSON value.
+    """
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+TAMPERED = [
+    "not base64!",
+    forge({"a": 1}),
+    forge([{}, {}]),
+    forge([[1], 2]),
+    forge([True, 1]),
+    forge([2**64, 1]),
+    forge(["x"]),
+    forge(["x", 1, 2]),
+]
+
+
+def test_round_trip():
+    values = ["2020-01-01", 42]
+    assert decode_cursor(encode_cursor(values), 2) == values
+    assert decode_cursor(encode_cursor([None, 1.5]), 2) == [None, 1.5]
+
+
+@pytest.mark.parametrize("token", TAMPERED)
+def test_tampered_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, 2)
+
+
+@pytest.mark.parametrize("token", TAMPERED)
+@pytest.mark.parametrize("url", [
+    "/songs?after={}",
+    "/api/v1/songs?after={}",
+    "/api/v1/person_search?q=Taylor&produtor_after={}",
+    "/api/v1/lyrics_search?q=love&after={}",
+])
+def test_tampered_cursor_gets_400(client, url, token):
+    assert client.get(url.format(token)).status_code == 400
+
+
+def test_person_search_pages_past_untitled_songs(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "RESULT_CACHE_SIZE", 0)
+    monkeypatch.delitem(app.extensions, "result_cache", raising=False)
+    conn = sqlite3.connect(app.config["DATABASE"])
+    credited = [song_id for (song_id,) in conn.execute(
+        "SELECT DISTINCT song_id FROM Produtores JOIN Pessoas ON person_id = producer_id"
+        " WHERE person LIKE '%Jack Antonoff%' ORDER BY song_id"
+    )]
+    conn.executemany("UPDATE Musicas SET song_title = NULL WHERE song_id = ?", [(song_id,) for song_id in credited[:5]])
+    conn.commit()
+    conn.close()
+
+    songs, after = [], ""
+    while True:
+        url = "/api/v1/person_search?q=Jack%20Antonoff&limit=5" + (f"&produtor_after={after}" if after else "")
+        page = client.get(url).json["results"]["produtor"]
+        songs += [song["song_id"] for song in page["items"]]
+        after = page["next_cursor"]
+        if not after:
+            break
+    assert len(credited) > 10
+    assert sorted(songs) == credited
+    assert songs[:5] == credited[:5]
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+
+import person_credits
+from pagination import decode_cursor
+
+
+ROLE_TABLES = {
+    "produtor": ("Produtores", "producer_id"),
+    "artista": ("Artistas", "artist_id"),
+    "escritor": ("Escritores", "writer_id"),
+}
+
+
+@pytest.fixture
+def db(app):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def matched_people(db, text):
+    return [row[0] for row in db.execute("SELECT person_id FROM Pessoas WHERE person LIKE ? ORDER BY person_id",
+                                         (f"%{text}%",))]
+
+
+def credited(db, people):
+    """
+    Song ids credited to 'people' in each role, in page order (title,
+    then id).
+    """
+    marks = ", ".join("?" * len(people))
+    return {
+        role: [row[0] for row in db.execute(
+            f"SELECT DISTINCT m.song_id, m.song_title FROM {table} r JOIN Musicas m ON m.song_id = r.song_id"
+            f" WHERE r.{column} IN ({marks}) ORDER BY m.song_title, m.song_id", people
+        )]
+        for role, (table, column) in ROLE_TABLES.items()
+    }
+
+
+def walk(db, text, limit, max_people=person_credits.MAX_MATCHED_PEOPLE):
+    """
+    Follows every role's next-page cursor until each role is exhausted,
+    returning the song ids listed per role.
+    """
+    songs = {role: [] for role in person_credits.ROLES}
+    after = {}
+    pending = set(person_credits.ROLES)
+    while pending:
+        pages, _ = person_credits.find_person_credits(db, text, after, limit, max_people)
+        for role in list(pending):
+            page = pages[role]
+            assert len(page.rows) <= limit
+            songs[role] += [row["song_id"] for row in page.rows]
+            if page.next_cursor:
+                after[role] = decode_cursor(page.next_cursor, 2)
+            else:
+                pending.discard(role)
+    return songs
+
+
+def test_every_role_is_paged_to_the_end(db):
+    expected = credited(db, matched_people(db, "Taylor"))
+    assert all(len(songs) > 7 for songs in expected.values())
+    assert walk(db, "Taylor", limit=7) == expected
+
+
+def test_roles_page_independently(db):
+    first, _ = person_credits.find_person_credits(db, "Taylor", limit=5)
+    after = {"produtor": decode_cursor(first["produtor"].next_cursor, 2)}
+    second, _ = person_credits.find_person_credits(db, "Taylor", after, limit=5)
+    assert [row["song_id"] for row in second["artista"].rows] == [row["song_id"] for row in first["artista"].rows]
+    assert not {row["song_id"] for row in second["produtor"].rows} & {row["song_id"] for row in first["produtor"].rows}
+
+
+def test_only_the_first_people_are_searched(db):
+    people = matched_people(db, "a")
+    assert len(people) > 3
+    pages, more_people = person_credits.find_person_credits(db, "a", limit=1000, max_people=3)
+    assert more_people
+    expected = credited(db, people[:3])
+    assert {role: [row["song_id"] for row in page.rows] for role, page in pages.items()} == expected
+
+    _, more_people = person_credits.find_person_credits(db, "a", limit=1000, max_people=len(people))
+    assert not more_people
+
+
+def test_no_match_gives_empty_pages(db):
+    pages, more_people = person_credits.find_person_credits(db, "no such person at all")
+    assert not more_people
+    assert all(page.rows == [] and page.next_cursor is None for page in pages.values())
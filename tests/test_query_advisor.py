@@ -0,0 +1,22 @@
+import app as app_module
+import query_advisor
+
+
+def test_accepted_steps_match_the_plans(app, monkeypatch):
+    """
+    Every flagged step is accepted, and every accepted step still shows
+    up in a plan, so no reason outlives the query it explains.
+    """
+    monkeypatch.setitem(app.config, "RESULT_CACHE_SIZE", 0)
+    monkeypatch.delitem(app.extensions, "result_cache", raising=False)
+    statements = query_advisor.collect_statements(app, app_module.get_db, query_advisor.ADVISOR_URLS)
+    statements += [("/questions", question.query) for question in app.extensions["questions"].questions.values()]
+    db = app_module.connect_db()
+    findings = query_advisor.review_plans(db, statements)
+    db.close()
+
+    assert [(route, step) for route, _sql, step, reason in findings if reason is None] == []
+    used = {(route, accepted) for route, _sql, step, _reason in findings
+            for where, accepted in query_advisor.ACCEPTED
+            if where == route and (step + " ").startswith(accepted + " ")}
+    assert set(query_advisor.ACCEPTED) - used == set()
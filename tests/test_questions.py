@@ -0,0 +1,20 @@
+import question_registry
+
+
+def test_questions_page_shows_empty_and_failed_answers(app, client, monkeypatch):
+    registry = app.extensions["questions"]
+    monkeypatch.setitem(app.extensions, "questions", question_registry.QuestionRegistry([
+        question_registry.Question(1, "Which songs have no title?", "SELECT song_title FROM Musicas WHERE 0", 0),
+        question_registry.Question(2, "Which songs are missing?", "SELECT song_title FROM NoSuchTable", 0),
+        question_registry.Question(3, "How many songs are there?", "SELECT COUNT(*) AS Songs FROM Musicas", 0),
+    ], registry.workers))
+    monkeypatch.setitem(app.config, "RESULT_CACHE_SIZE", 0)
+
+    response = client.get("/questions")
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert "No results found." in page
+    assert "no such table: NoSuchTable" in page
+    assert "<th>Songs</th>" in page
+    for question_id in (1, 2):
+        assert client.get(f"/questions/{question_id}").status_code == 200
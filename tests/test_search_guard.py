@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from search_guard import MAX_QUERY_LENGTH, MIN_QUERY_LENGTH, RejectedSearch, check_search, escape_like
+
+
+TOO_LONG = "x" * (MAX_QUERY_LENGTH + 1)
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("a" * (MIN_QUERY_LENGTH - 1), "too_short"),
+    (TOO_LONG, "too_long"),
+])
+def test_length_limits(text, reason):
+    with pytest.raises(RejectedSearch) as raised:
+        check_search(text)
+    assert raised.value.reason == reason
+
+
+def test_lengths_within_limits_pass():
+    check_search("a" * MIN_QUERY_LENGTH)
+    check_search("a" * MAX_QUERY_LENGTH)
+
+
+@pytest.mark.parametrize("text", ["ab*", "love a*", '"ab"*'])
+def test_short_prefixes_are_rejected(text):
+    with pytest.raises(RejectedSearch):
+        check_search(text, prefixes=True)
+    check_search(text)
+
+
+@pytest.mark.parametrize("text", ["abc*", "love abc*", "no prefix"])
+def test_long_prefixes_pass(text):
+    check_search(text, prefixes=True)
+
+
+@pytest.mark.parametrize("text, escaped", [
+    ("100%", "100\\%"),
+    ("a_b", "a\\_b"),
+    ("back\\slash", "back\\\\slash"),
+    ("plain", "plain"),
+])
+def test_like_wildcards_are_escaped(text, escaped):
+    assert escape_like(text) == escaped
+
+
+def test_wildcards_match_themselves(app, client):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    songs = [song_id for (song_id,) in conn.execute("SELECT song_id FROM Musicas ORDER BY song_id LIMIT 2")]
+    for name, song_id in zip(["100%_Real", "100xxReal"], songs):
+        person_id = conn.execute("INSERT INTO Pessoas (person) VALUES (?)", (name,)).lastrowid
+        conn.execute("INSERT INTO Produtores (song_id, producer_id) VALUES (?, ?)", (song_id, person_id))
+    conn.commit()
+    conn.close()
+    items = client.get("/api/v1/person_search?q=0%25_R").json["results"]["produtor"]["items"]
+    assert [item["song_id"] for item in items] == songs[:1]
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/search?q=a",
+    f"/api/v1/search?q={TOO_LONG}",
+    "/api/v1/person_search?q=a",
+    f"/api/v1/person_search?q={TOO_LONG}",
+    "/api/v1/lyrics_search?q=a",
+    "/api/v1/lyrics_search?q=lo*",
+])
+def test_rejected_searches_get_400(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.json["error"]
+
+
+@pytest.mark.parametrize("url", ["/search?q=a", "/person_search?q=a", "/lyrics_search?q=lo*"])
+def test_pages_show_the_reason(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "alert-danger" in response.get_data(as_text=True)
+
+
+def test_rejections_are_counted(client):
+    client.get("/api/v1/search?q=a")
+    assert 'outcome="too_short"' in client.get("/metrics").get_data(as_text=True)
+
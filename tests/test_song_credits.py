@@ -0,0 +1,26 @@
+import sqlite3
+
+import migrations
+import song_credits
+
+
+def test_view_updates_copy_only_the_count(app):
+    path = app.config["DATABASE"]
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    song_id = conn.execute("SELECT song_id FROM Produtores LIMIT 1").fetchone()[0]
+    # Mark the row so a full rewrite would show
+    conn.execute("UPDATE CreditosMusicas SET producers = '[]' WHERE song_id = ?", (song_id,))
+
+    conn.execute("UPDATE Musicas SET views = views + 5 WHERE song_id = ?", (song_id,))
+    views, producers = conn.execute("SELECT views, producers FROM CreditosMusicas WHERE song_id = ?",
+                                    (song_id,)).fetchone()
+    assert views == conn.execute("SELECT views FROM Musicas WHERE song_id = ?", (song_id,)).fetchone()[0]
+    assert producers == "[]"
+
+    conn.execute("UPDATE Musicas SET song_title = 'Renamed' WHERE song_id = ?", (song_id,))
+    title, producers = conn.execute("SELECT song_title, producers FROM CreditosMusicas WHERE song_id = ?",
+                                    (song_id,)).fetchone()
+    assert title == "Renamed" and producers != "[]"
+    assert song_credits.check_credits(conn) == []
+    conn.close()
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+def song_count(app):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    count = conn.execute("SELECT COUNT(*) FROM Musicas").fetchone()[0]
+    conn.close()
+    return count
+
+
+def walk_pages(client, url):
+    """
+    Follows the next-page cursors of /api/v1/songs, returning every song
+    listed, in order.
+    """
+    songs, after = [], ""
+    while True:
+        page = client.get(f"{url}&after={after}" if after else url).json["songs"]
+        songs += page["items"]
+        after = page["next_cursor"]
+        if not after:
+            return songs
+
+
+@pytest.mark.parametrize("limit", [1, 2, 7, 50])
+def test_every_song_is_listed_with_dateless_songs(app, client, limit):
+    for song_id, date in [(900001, None), (900002, "not a date"), (900003, None)]:
+        response = client.put(f"/api/v1/songs/{song_id}", json={"song_title": f"No date {song_id}", "date": date},
+                              headers=AUTH)
+        assert response.status_code == 201
+    songs = walk_pages(client, f"/api/v1/songs?limit={limit}")
+    assert len(songs) == song_count(app)
+    assert [song["song_title"] for song in songs[:3]] == ["No date 900001", "No date 900002", "No date 900003"]
+
+
+def test_date_range_leaves_out_dateless_songs(client):
+    client.put("/api/v1/songs/900001", json={"song_title": "No date"}, headers=AUTH)
+    for url in ["/api/v1/songs?limit=500&to=2010-12-31", "/api/v1/songs?limit=500&from=2000-01-01"]:
+        titles = [song["song_title"] for song in walk_pages(client, url)]
+        assert titles and "No date" not in titles
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import write_queue
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "queue.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE Valores (value INTEGER)")
+    conn.close()
+    return path
+
+
+def insert(conn, value):
+    conn.execute("INSERT INTO Valores (value) VALUES (?)", (value,))
+    return value
+
+
+def stored(path):
+    conn = sqlite3.connect(path)
+    values = [value for (value,) in conn.execute("SELECT value FROM Valores ORDER BY value")]
+    conn.close()
+    return values
+
+
+def test_failing_on_batch_keeps_the_writer_running(path):
+    def on_batch(*_):
+        raise RuntimeError("metrics are down")
+
+    writer = write_queue.WriteQueue(path, on_batch=on_batch)
+    try:
+        assert writer.submit(insert, 1).result(5) == 1
+        assert writer.submit(insert, 2).result(5) == 2
+        assert writer.running
+        assert writer.stats()["batch_errors"] == 2
+    finally:
+        writer.close(5)
+    assert stored(path) == [1, 2]
+
+
+def test_failing_transaction_fails_its_batch_only(path):
+    writer = write_queue.WriteQueue(path)
+    try:
+        writer.submit(insert, 1).result(5)
+        conn = sqlite3.connect(path)
+        conn.execute("DROP TABLE Valores")
+        conn.commit()
+        with pytest.raises(sqlite3.Error):
+            writer.submit(insert, 2).result(5)
+        conn.execute("CREATE TABLE Valores (value INTEGER)")
+        conn.commit()
+        conn.close()
+        assert writer.submit(insert, 3).result(5) == 3
+        assert writer.running
+    finally:
+        writer.close(5)
+    assert stored(path) == [3]
+
+
+def test_stopped_writer_refuses_writes(path):
+    writer = write_queue.WriteQueue(path)
+    writer.close(5)
+    assert not writer.running
+    with pytest.raises(write_queue.WriterStopped):
+        writer.submit(insert, 1)
+
+
+def test_idle_task_does_not_hold_up_writes(path):
+    computing = threading.Event()
+    release = threading.Event()
+
+    def idle_task(conn):
+        # A long computation on the snapshot
+        computing.set()
+        release.wait(5)
+        count = conn.execute("SELECT COUNT(*) FROM Valores").fetchone()[0]
+        return lambda conn: insert(conn, 100 + count)
+
+    writer = write_queue.WriteQueue(path, idle_task=idle_task, idle_interval=0)
+    try:
+        writer.submit(insert, 1).result(5)
+        assert computing.wait(5)
+        # Committed while the idle task computes: its result is dropped
+        assert writer.submit(insert, 2).result(5) == 2
+        release.set()
+        deadline = time.monotonic() + 5
+        while writer.idle_runs < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        writer.close(5)
+    assert writer.idle_dropped == 1
+    assert stored(path) == [1, 2, 102]
@@ -0,0 +1,186 @@
+from collections import Counter, namedtuple
+from itertools import islice
+import re
+import unicodedata
+
+from pagination import DEFAULT_PAGE_SIZE, Page, encode_cursor
+
+
+# Share of the query's trigrams a title must contain to be a match
+MIN_SIMILARITY = 0.6
+
+# Suggestions returned by the typeahead when no limit is given
+TYPEAHEAD_LIMIT = 10
+
+# Shorthand fans use for words that appear in many titles
+SYNONYMS = {
+    "tv": "taylors version",
+}
+
+# Title columns of each kind of item, as the search page expects them
+KINDS = {
+    "song": ("Musicas", "song_id", "song_title", "song_url"),
+    "album": ("Albuns", "album_id", "album_title", "album_url"),
+}
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# One searchable title; 'trigrams' is the set computed from 'folded'
+Title = namedtuple("Title", ["kind", "item_id", "title", "url", "folded", "trigrams"])
+
+
+def fold(text):
+    """
+    Normalizes text for matching: accents removed, case folded, apostrophes
+    dropped ("Taylor's" -> "taylors") and any other punctuation turned into
+    spaces.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold().replace("'", "").replace("’", "")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def expand_synonyms(folded):
+    """
+    Replaces shorthand words ("tv") with what they stand for.
+    """
+    return " ".join(SYNONYMS.get(word, word) for word in folded.split())
+
+
+def trigrams(folded, prefix=False):
+    """
+    Returns the set of trigrams of every word, each word padded with two
+    spaces in front and one behind so that short words and word starts
+    still produce trigrams. With 'prefix', the last word is treated as
+    unfinished and gets no trailing pad.
+    """
+    words = folded.split()
+    result = set()
+    for position, word in enumerate(words):
+        padded = "  " + word
+        if not (prefix and position == len(words) - 1):
+            padded += " "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TitleIndex:
+    """
+    In-memory trigram index over song and album titles.
+
+    Titles that fold to the same text (re-releases, duplicates) share one
+    entry, so a query scores each distinct title once. The index is tagged
+    with the database version it was built from, so callers can rebuild it
+    when that changes.
+    """
+
+    def __init__(self, titles, version=None):
+        self.version = version
+        self.titles = titles
+        # Distinct folded titles, their trigrams, and the titles behind
+        # each one by kind (None for every kind), in id order
+        self.terms = []
+        self.term_trigrams = []
+        self.groups = {}
+        self.postings = {}
+        positions = {}
+        for title in sorted(titles, key=lambda title: title.item_id):
+            position = positions.get(title.folded)
+            if position is None:
+                position = positions[title.folded] = len(self.terms)
+                self.terms.append(title.folded)
+                self.term_trigrams.append(title.trigrams)
+                for trigram in title.trigrams:
+                    self.postings.setdefault(trigram, []).append(position)
+            self.groups.setdefault((position, title.kind), []).append(title)
+            self.groups.setdefault((position, None), []).append(title)
+
+    @classmethod
+    def build(cls, db, version=None):
+        """
+        Reads every song and album title from the database.
+        """
+        titles = []
+        folded_titles = {}
+        for kind, (table, id_column, title_column, url_column) in KINDS.items():
+            for item_id, title, url in db.execute(
+                f"SELECT {id_column}, {title_column}, {url_column} FROM {table}"
+            ):
+                if title not in folded_titles:
+                    folded = fold(title)
+                    folded_titles[title] = (folded, frozenset(trigrams(folded)))
+                titles.append(Title(kind, item_id, title, url, *folded_titles[title]))
+        return cls(titles, version)
+
+    def rank(self, text, prefix=False):
+        """
+        Returns the distinct folded titles similar to 'text' as
+        (sort key, term position) pairs, best match first. The sort key is
+        (-coverage, -jaccard, folded title): coverage is the share of the
+        query's trigrams found in the title (1 when the title contains the
+        query outright) and the Jaccard similarity of both trigram sets
+        favours closer lengths.
+        """
+        query = expand_synonyms(fold(text))
+        query_trigrams = trigrams(query, prefix)
+        if not query_trigrams:
+            return []
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.postings.get(trigram, ()))
+
+        ranked = []
+        for position, count in shared.items():
+            folded = self.terms[position]
+            coverage = 1.0 if query in folded else count / len(query_trigrams)
+            if coverage < MIN_SIMILARITY:
+                continue
+            jaccard = count / (len(query_trigrams) + len(self.term_trigrams[position]) - count)
+            ranked.append(((-round(coverage, 6), -round(jaccard, 6), folded), position))
+        ranked.sort()
+        return ranked
+
+    def matches(self, text, kind=None, after=None, prefix=False):
+        """
+        Yields (sort key, title) for the titles of 'kind' (every kind when
+        None) similar to 'text', best match first. Sort keys extend the
+        rank() key with the title's id; with 'after', matching starts right
+        after that sort key.
+        """
+        for term_key, position in self.rank(text, prefix):
+            if after is not None and term_key < after[:3]:
+                continue
+            for title in self.groups.get((position, kind), ()):
+                key = term_key + (title.item_id,)
+                if after is None or key > after:
+                    yield key, title
+
+    def search(self, text, kind, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns a page of the titles of one kind ('song' or 'album') most
+        similar to 'text', starting after the sort key 'after'. Rows use
+        the column names of the search page ('song_title', 'song_url', ...)
+        plus the match 'similarity'. Raises ValueError for a cursor that is
+        not a sort key of this index.
+        """
+        if after is not None:
+            try:
+                after = (float(after[0]), float(after[1]), str(after[2]), int(after[3]))
+            except (TypeError, ValueError, IndexError) as e:
+                raise ValueError("Page cursor does not match this listing") from e
+        page = list(islice(self.matches(text, kind, after), limit + 1))
+
+        _, _, title_column, url_column = KINDS[kind]
+        rows = [{title_column: title.title, url_column: title.url, "similarity": -key[0]}
+                for key, title in page[:limit]]
+        next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+        return Page(rows, next_cursor)
+
+    def suggest(self, text, limit=TYPEAHEAD_LIMIT):
+        """
+        Returns the best songs and albums for a query that is still being
+        typed, its last word taken as a prefix.
+        """
+        return [{"kind": title.kind, "title": title.title, "url": title.url}
+                for _, title in islice(self.matches(text, prefix=True), limit)]
@@ -0,0 +1,346 @@
+from collections import namedtuple
+from concurrent.futures import Future
+import queue
+import sqlite3
+import threading
+import time
+
+import db_pool
+
+
+# Writes that may wait for the writer; any more are turned away
+DEFAULT_QUEUE_SIZE = 1000
+
+# Writes committed together in one transaction at most
+DEFAULT_BATCH_SIZE = 200
+
+# Milliseconds the writer waits for a lock held by another process (an
+# import or a CLI command) before failing the batch
+BUSY_TIMEOUT_MS = 5000
+
+# Put on the queue by close() to stop the writer
+_STOP = object()
+
+# Put on the queue by the idle task's thread: the function writing its
+# result (or the exception it raised) and the writer's state it was
+# computed from
+_IdleResult = namedtuple("_IdleResult", ["store", "error", "state"])
+
+
+class WriteQueueFull(Exception):
+    """
+    Raised when a write is submitted while the queue is full.
+    """
+
+
+class WriterStopped(Exception):
+    """
+    Raised when a write is submitted to a writer that was closed or whose
+    thread has died.
+    """
+
+
+def connect_writer(path):
+    """
+    Opens the writer's connection. Transactions are managed by hand
+    (isolation_level=None). The database is already in WAL mode (see
+    db_pool.enable_wal), where synchronous=NORMAL syncs only at
+    checkpoints: a power loss can lose the last commits, never corrupt
+    the file.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+class WriteQueue:
+    """
+    Applies database writes on one dedicated thread, the only writer the
+    app has, so writes never wait on each other for SQLite's lock.
+
+    A write is a function 'write(conn, *args)' submitted with submit(),
+    which returns a Future of its result. The writer takes every write
+    waiting (up to 'batch_size') and runs them in one transaction, each
+    inside its own savepoint so a failing write is rolled back alone and
+    its Future gets the exception. Futures are resolved once the batch
+    has committed. Readers on other connections see either none or all
+    of a batch.
+
+    At most 'size' writes wait in the queue; submit() raises
+    WriteQueueFull beyond that, and WriterStopped once the writer is
+    closed or its thread has died. Whatever goes wrong in a batch fails
+    that batch's Futures only; the writer carries on. After every batch,
+    'on_batch(size, failed, latencies, seconds)' gets the number of
+    writes, how many failed, each write's seconds from submit() to commit
+    and the transaction's seconds.
+
+    'idle_task(conn)', if given, runs once the queue is empty and at least
+    'idle_interval' seconds after its last run, when anything was written
+    since. It runs on a thread of its own, reading a snapshot through a
+    read-only connection, while the writer goes on with the queue. It
+    returns None or a function 'store(conn)', which the writer then runs
+    in a short transaction of its own, unless something was committed
+    since the snapshot: then the result is dropped and the task runs
+    again after the next interval.
+    """
+
+    def __init__(self, path, size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE, on_batch=None,
+                 idle_task=None, idle_interval=30.0):
+        self.path = path
+        self.size = size
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.idle_task = idle_task
+        self.idle_interval = idle_interval
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.idle_runs = 0
+        self.idle_failures = 0
+        self.idle_dropped = 0
+        self.batch_errors = 0
+        self._queue = queue.Queue(size)
+        self._pending_idle = False
+        self._idle_running = False
+        self._last_idle = time.monotonic()
+        # Transactions committed with at least one write, to tell whether
+        # an idle task's snapshot is still current
+        self._commits = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        """
+        Whether the writer thread still takes writes.
+        """
+        return not self._stopped and self._thread.is_alive()
+
+    def submit(self, write, *args):
+        """
+        Queues 'write(conn, *args)' and returns a Future of its result.
+        """
+        if not self.running:
+            raise WriterStopped("The database writer has stopped")
+        future = Future()
+        try:
+            self._queue.put_nowait((write, args, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            raise WriteQueueFull(f"{self.size} writes are already waiting, try again shortly") from None
+        if self._stopped:
+            # The writer stopped while this write was queued
+            self._drain()
+        return future
+
+    def close(self, timeout=None):
+        """
+        Stops the writer once the writes already queued are committed.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = connect_writer(self.path)
+        except Exception:
+            self._stopped = True
+            self._drain()
+            raise
+        try:
+            while True:
+                timeout = None
+                if self.idle_task is not None and self._pending_idle and not self._idle_running:
+                    timeout = max(0.0, self._last_idle + self.idle_interval - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._start_idle(conn)
+                    continue
+                batch = []
+                while item is not _STOP and not isinstance(item, _IdleResult):
+                    batch.append(item)
+                    item = None
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        self._apply(conn, batch)
+                    except Exception as e:
+                        # e.g. on_batch failed: the writes are settled or fail
+                        self.batch_errors += 1
+                        _fail(batch, e)
+                if isinstance(item, _IdleResult):
+                    self._finish_idle(conn, item)
+                elif item is _STOP:
+                    return
+        finally:
+            self._stopped = True
+            conn.close()
+            self._drain()
+
+    def _drain(self):
+        """
+        Fails the writes left in the queue once the writer has stopped.
+        """
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and not isinstance(item, _IdleResult):
+                _fail([item], WriterStopped("The database writer has stopped"))
+
+    def _apply(self, conn, batch):
+        """
+        Runs a batch of writes in one transaction and resolves their
+        Futures.
+        """
+        start = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write, args, future, _submitted in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    outcomes.append((future, write(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    outcomes.append((future, None, e))
+                conn.execute("RELEASE write")
+            conn.execute("COMMIT")
+        except Exception as e:
+            # The transaction itself failed (e.g. the lock stayed busy):
+            # nothing in the batch was written
+            self.batch_errors += 1
+            _rollback(conn)
+            outcomes = [(future, None, e) for _write, _args, future, _submitted in batch]
+        committed = time.perf_counter()
+
+        failed = 0
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+                failed += 1
+        self.batches += 1
+        self.writes += len(batch)
+        self.failed += failed
+        self.last_batch_size = len(batch)
+        if failed < len(batch):
+            self._commits += 1
+            self._pending_idle = True
+        if self.on_batch is not None:
+            self.on_batch(len(batch), failed, [committed - submitted for *_, submitted in batch], committed - start)
+
+    def _state(self, conn):
+        """
+        What an idle task's result depends on: the writer's commits and
+        SQLite's data_version, which changes when another process commits.
+        """
+        return self._commits, conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _start_idle(self, conn):
+        """
+        Starts the idle task on a thread of its own.
+        """
+        self._pending_idle = False
+        self._idle_running = True
+        self._last_idle = time.monotonic()
+        try:
+            state = self._state(conn)
+        except sqlite3.Error as e:
+            self._finish_idle(conn, _IdleResult(None, e, None))
+            return
+        threading.Thread(target=self._compute_idle, args=(state,), name="db-writer-idle", daemon=True).start()
+
+    def _compute_idle(self, state):
+        """
+        Runs the idle task on a read-only snapshot and hands its result to
+        the writer.
+        """
+        try:
+            conn = db_pool.connect_readonly(self.path)
+            try:
+                conn.execute("BEGIN")
+                result = _IdleResult(self.idle_task(conn), None, state)
+            finally:
+                conn.close()
+        except Exception as e:
+            result = _IdleResult(None, e, state)
+        self._queue.put(result)
+
+    def _finish_idle(self, conn, result):
+        """
+        Writes an idle task's result in its own transaction. A failed or
+        outdated run is counted and retried after the next interval.
+        """
+        self._idle_running = False
+        if result.error is None and result.store is not None:
+            try:
+                if self._state(conn) != result.state:
+                    self.idle_dropped += 1
+                    self._pending_idle = True
+                    return
+                conn.execute("BEGIN IMMEDIATE")
+                result.store(conn)
+                conn.execute("COMMIT")
+            except Exception as e:
+                _rollback(conn)
+                result = result._replace(error=e)
+        if result.error is not None:
+            self.idle_failures += 1
+            self._pending_idle = True
+        else:
+            self.idle_runs += 1
+
+    def stats(self):
+        """
+        Returns the queue counters.
+        """
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self.size,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "last_batch_size": self.last_batch_size,
+            "idle_runs": self.idle_runs,
+            "idle_failures": self.idle_failures,
+            "idle_dropped": self.idle_dropped,
+            "batch_errors": self.batch_errors,
+            "running": int(self.running),
+        }
+
+
+def _fail(batch, error):
+    """
+    Fails the Futures of a batch's writes that are not resolved yet.
+    """
+    for _write, _args, future, _submitted in batch:
+        if not future.done():
+            future.set_exception(error)
+
+
+def _rollback(conn):
+    """
+    Rolls back the open transaction, if any. A failing rollback is left
+    to SQLite, which ends the transaction itself when it cannot go on.
+    """
+    try:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+    except sqlite3.Error:
+        pass